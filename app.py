@@ -1,61 +1,37 @@
 import streamlit as st
-import cloudscraper
 import time
-import random
+SCRIPT_STARTED = time.perf_counter()
 import re
 import urllib.parse
 import json
-import requests
-import base64
-from bs4 import BeautifulSoup
-import google.generativeai as genai
-from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, NotFound, InvalidArgument
-from datetime import datetime
+import hashlib
 import sys
 import io
-import zipfile
-import ssl
+import csv
 import unicodedata
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
-
-# --- NEW IMPORT FOR MERCHANT VALIDATION ---
-try:
-    import whois
-    HAS_WHOIS = True
-except ImportError:
-    HAS_WHOIS = False
-
-# --- TRY IMPORTING LIBRARIES ---
-try:
-    from PIL import Image, ImageOps
-except ImportError:
-    Image = None
-
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib import colors
-    HAS_REPORTLAB = True
-except ImportError:
-    HAS_REPORTLAB = False
-
-# --- PDF LIBRARY LOADER ---
-HAS_PYPDF = False
-HAS_PDFPLUMBER = False
-
-try:
-    import pdfplumber
-    HAS_PDFPLUMBER = True
-except ImportError:
-    pass
-
-try:
-    from pypdf import PdfReader
-    HAS_PYPDF = True
-except ImportError:
-    pass
+import uuid
+import hmac
+import threading
+from batch import BatchJob, parse_url_list, host_of
+from image_pipeline import PhotoPipeline, ENCODE_PROFILES, DEFAULT_PROFILE
+from image_store import ImageStore
+from image_probe import summarize_report, drop_duplicates
+from structured_data import prefill_summary
+from summary_schema import rule_violations
+from pdf_export import create_pdf, HAS_REPORTLAB
+import tour_engine
+from tour_engine import (
+    get_all_keys, get_response_cache, get_thumb_cache, run_scheduled,
+    validate_merchant_risk, extract_text_from_pdf, regenerate_description_only, fix_grammar_american,
+    call_gemini_email_draft, call_gemini_caption, plan_summary, describe_plan, summarize_document, summarize_link_job,
+    SELLING_POINTS,
+)
+
+from lazy_deps import import_report
+import perf
+
+# Heavy libraries (PIL, reportlab, pdfplumber...) load on first use through lazy_deps
+IMPORTS_MS = (time.perf_counter() - SCRIPT_STARTED) * 1000
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="Klook Magic Tool", page_icon="⭐", layout="wide")
@@ -100,6 +76,8 @@ if 'url_input' not in st.session_state:
     st.session_state['url_input'] = None
 if 'scraped_images' not in st.session_state:
     st.session_state['scraped_images'] = []
+if 'scraped_image_report' not in st.session_state:
+    st.session_state['scraped_image_report'] = []
 if 'product_context' not in st.session_state:
     st.session_state['product_context'] = ""
 if 'raw_text_content' not in st.session_state:
@@ -108,15 +86,48 @@ if 'merchant_result' not in st.session_state:
     st.session_state['merchant_result'] = None
 if 'processed_images_data' not in st.session_state:
     st.session_state['processed_images_data'] = []
-
-# --- LOAD KEYS ---
-def get_all_keys():
-    if "GEMINI_KEYS" in st.secrets:
-        return st.secrets["GEMINI_KEYS"]
-    elif "GEMINI_API_KEY" in st.secrets:
-        return [st.secrets["GEMINI_API_KEY"]]
-    else:
-        return []
+if 'batch_results' not in st.session_state:
+    st.session_state['batch_results'] = []
+if 'merchant_batch_results' not in st.session_state:
+    st.session_state['merchant_batch_results'] = []
+if 'image_session' not in st.session_state:
+    st.session_state['image_session'] = uuid.uuid4().hex
+
+# --- ENGINE SETUP (KEYS & SETTINGS FROM st.secrets) ---
+# Scrape / PDF / Gemini logic lives in tour_engine so cli.py can run it
+# headless; the app only adds Streamlit's per-URL result cache on top.
+tour_engine.configure(st.secrets)
+extract_data_from_url = st.cache_data(ttl=3600, show_spinner=False)(tour_engine.extract_data_from_url)
+
+# --- SHARED IMAGE STORE (PROCESSED PHOTOS, ONE COPY PER DISTINCT IMAGE) ---
+@st.cache_resource(show_spinner=False)
+def get_image_store():
+    return ImageStore(memory_budget=int(tour_engine.get_setting("IMAGE_STORE_MEMORY_MB", 256)) * 1024 * 1024)
+
+# --- PERFORMANCE METRICS (ADMIN PANEL, OPTIONAL /metrics ENDPOINT, SPAN LOGS) ---
+# PERF_METRICS_HOST opts in to a non-loopback bind (e.g. "0.0.0.0" for an external scraper)
+@st.cache_resource(show_spinner=False)
+def start_perf_outputs(port, log_spans, host="127.0.0.1"):
+    if log_spans:
+        perf.enable_logging()
+    if port:
+        perf.start_metrics_server(int(port), host)
+    return True
+
+start_perf_outputs(tour_engine.get_setting("PERF_METRICS_PORT"), bool(tour_engine.get_setting("PERF_LOG_SPANS", False)),
+                   tour_engine.get_setting("PERF_METRICS_HOST", "127.0.0.1"))
+
+# --- GEMINI KEY WARM-UP (MODEL LISTS FOR ALL KEYS, IN THE BACKGROUND) ---
+@st.cache_resource(show_spinner=False)
+def warm_up_gemini(keys):
+    thread = threading.Thread(target=tour_engine.warm_up_keys, args=(list(keys),), name="gemini-warmup", daemon=True)
+    thread.start()
+    return thread
+
+warm_up_gemini(tuple(get_all_keys()))
+
+def format_mb(n):
+    return f"{n / 1024 / 1024:.1f} MB"
 
 # --- HELPER: ROMANIZE TEXT ---
 def romanize_text(text):
@@ -124,569 +135,6 @@ def romanize_text(text):
     normalized = unicodedata.normalize('NFKD', text)
     return normalized.encode('ascii', 'ignore').decode('ascii')
 
-# --- IMPROVED MERCHANT RISK LOGIC (V5 - AUTO-RETRY & MATH RULES) ---
-def validate_merchant_risk(text, url, keys):
-    if not keys: return {"error": "No API keys found."}
-    
-    scraped_content = text
-    inferred_name = ""
-    
-    # 1. Automatic "About Us" and Merchant Name Hunting
-    if url:
-        try:
-            scraper = cloudscraper.create_scraper()
-            base_res = scraper.get(url, timeout=15)
-            soup = BeautifulSoup(base_res.content, 'html.parser')
-            
-            title = soup.find('title')
-            if title:
-                inferred_name = title.get_text().split('|')[0].split('-')[0].strip()
-            else:
-                inferred_name = urllib.parse.urlparse(url).netloc.replace("www.", "").split('.')[0].capitalize()
-
-            if not text:
-                target_url = url
-                for link in soup.find_all('a', href=True):
-                    href = link['href'].lower()
-                    if any(w in href for w in ['about', 'company', 'story', 'legal', 'who-we-are']):
-                        target_url = urllib.parse.urljoin(url, link['href'])
-                        break
-                
-                final_res = scraper.get(target_url, timeout=15)
-                final_soup = BeautifulSoup(final_res.content, 'html.parser')
-                for s in final_soup(["script", "style", "noscript"]): s.extract()
-                scraped_content = final_soup.get_text(separator=' ')[:15000]
-        except:
-            pass
-
-    # 2. Whois Check
-    domain_years = "Unknown"
-    if HAS_WHOIS and url:
-        try:
-            domain_name = urllib.parse.urlparse(url).netloc
-            w = whois.whois(domain_name)
-            c_date = w.creation_date[0] if isinstance(w.creation_date, list) else w.creation_date
-            domain_years = (datetime.now() - c_date).days // 365
-        except: pass
-
-    # 3. Gemini Prompt with Advanced Vetting Logic
-    prompt = f"""
-    Analyze this merchant for Klook/GYG onboarding.
-    URL: {url}
-    CONTENT: {scraped_content[:10000]}
-    
-    TASK:
-    1. Categories - Find ALL offerings and classify them STRICTLY into:
-       - 'approve_categories_found': Only use "Attraction tickets", "Recurring shows", "Theme park", "Water park", "Transportation pass".
-       - 'red_flag_categories_found': Only use "Food tours", "Dining experiences", "Private tours", "Walking tours", "Bus/Car/Boat tours", "Hiking & trekking", "ATV & All Wheel Drive", "Air tours", "ATV/All Wheel Drive tours", "Bicycle tours", "Food tours", "Food coupons", "Hop-on Hop-off bus", "Kayaking tours", "Multiday tours", "Outlet tours", "Private transfers", "Railway tours", "Shore excursions", "Ski tours", "Spa/Beauty", "Wifi & SIM".
-       - 'other_categories_found': List ANY other activities they offer not listed above.
-    2. Assess legitimacy (1-100) and provide a 'score_reason'.
-    3. Make a final decision ('Approved' or 'Rejected').
-    4. Provide a 'status_reason' explaining the Approved/Rejected decision.
-    
-    Return JSON:
-    {{
-        "merchant_name": "Extracted Name",
-        "legitimacy_score": 1-100,
-        "score_reason": "Explain why this score was given...",
-        "preferred_categories_found": ["Category 1"],
-        "red_flag_categories_found": ["Category 2"],
-        "other_categories_found": ["Category 3"],
-        "status": "Approved" or "Rejected",
-        "status_reason": "Explain why approved or rejected based on categories...",
-        "red_flags": ["General concern 1"],
-        "strengths": ["Positive 1"],
-        "summary": "Overview"
-    }}
-    """
-    
-    # 4. ROTATION LOOP (Tries keys until one works)
-    shuffled_keys = list(keys)
-    random.shuffle(shuffled_keys)
-    last_error = ""
-
-    for key in shuffled_keys:
-        try:
-            model_name = get_working_model_name(key)
-            genai.configure(api_key=key)
-            model = genai.GenerativeModel(model_name, generation_config={"response_mime_type": "application/json"})
-            
-            response = model.generate_content(prompt)
-            
-            # Bulletproof JSON Parsing
-            clean_json = response.text.strip()
-            if clean_json.startswith("```json"): clean_json = clean_json[7:]
-            if clean_json.endswith("```"): clean_json = clean_json[:-3]
-            
-            res_data = json.loads(clean_json.strip())
-            res_data["domain_age"] = domain_years
-            
-            if not res_data.get("merchant_name"): 
-                res_data["merchant_name"] = inferred_name
-                
-            # --- STRICT RULE: MATH-BASED APPROVAL ---
-            pref_list = res_data.get("preferred_categories_found", [])
-            red_list = res_data.get("red_flag_categories_found", [])
-            
-            if not isinstance(pref_list, list): pref_list = []
-            if not isinstance(red_list, list): red_list = []
-            
-            pref_count = len(pref_list)
-            red_count = len(red_list)
-            ai_reason = res_data.get("status_reason", "")
-            
-            if pref_count > red_count:
-                res_data["status"] = "Approved"
-                res_data["status_reason"] = f"Rule Auto-Approval: Found {pref_count} preferred vs {red_count} red-flag verticals. (AI notes: {ai_reason})"
-            elif red_count > pref_count:
-                res_data["status"] = "Rejected"
-                res_data["status_reason"] = f"Rule Auto-Rejection: Found {red_count} red-flag vs {pref_count} preferred verticals. (AI notes: {ai_reason})"
-            else:
-                res_data["status_reason"] = f"Tie-Breaker (AI Decision): Equal categories found ({pref_count}). Reason: {ai_reason}"
-
-            return res_data # Success! Break the loop.
-
-        except Exception as e:
-            last_error = str(e)
-            time.sleep(0.5) # Wait half a second, then try the next key
-            continue 
-            
-    return {"error": f"AI Audit Failed on all keys. Last Error: {last_error}", "merchant_name": inferred_name}
-
-# --- IMAGE RESIZING LOGIC (ENHANCED FOR QUALITY DIAGNOSTICS & BASE64) ---
-def resize_image_klook_standard(image_input, alignment=(0.5, 0.5)):
-    if Image is None: return None, 0, 0, "⚠️ Error: 'Pillow' library missing.", None
-    try:
-        if isinstance(image_input, bytes):
-            img = Image.open(io.BytesIO(image_input))
-        else:
-            img = Image.open(image_input)
-            
-        orig_w, orig_h = img.size
-            
-        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[3]) 
-            img = background
-        else:
-            img = img.convert('RGB')
-
-        target_width = 1280
-        target_height = 800
-        img_resized = ImageOps.fit(img, (target_width, target_height), method=Image.Resampling.LANCZOS, centering=alignment)
-        
-        buf = io.BytesIO()
-        img_resized.save(
-            buf, 
-            format='JPEG', 
-            quality=95,            
-            subsampling=0,        
-            optimize=True         
-        )
-        
-        # 💥 NEW: Convert to Base64 for the Extension 💥
-        image_bytes = buf.getvalue()
-        b64_encoded = base64.b64encode(image_bytes).decode('utf-8')
-        b64_string = f"data:image/jpeg;base64,{b64_encoded}"
-
-        return image_bytes, orig_w, orig_h, None, b64_string
-    except Exception as e:
-        return None, 0, 0, f"Error processing image: {e}", None
-
-# --- CUSTOM SSL ADAPTER ---
-class LegacySSLAdapter(HTTPAdapter):
-    def init_poolmanager(self, connections, maxsize, block=False):
-        ctx = ssl.create_default_context()
-        ctx.set_ciphers('DEFAULT@SECLEVEL=1') 
-        self.poolmanager = PoolManager(
-            num_pools=connections,
-            maxsize=maxsize,
-            block=block,
-            ssl_context=ctx
-        )
-
-# --- SCRAPER (ROBUST + HIGH RES IMAGES) ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def extract_data_from_url(url):
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0'
-    ]
-    
-    headers = {
-        'User-Agent': random.choice(user_agents),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Referer': 'https://www.google.com/'
-    }
-
-    try:
-        try:
-            scraper = cloudscraper.create_scraper(
-                browser={'browser': 'chrome','platform': 'windows','desktop': True}
-            )
-            scraper.mount('https://', LegacySSLAdapter())
-            response = scraper.get(url, headers=headers, timeout=30) 
-        except Exception:
-            response = requests.get(url, headers=headers, timeout=30, verify=False) 
-
-        if response.status_code == 403:
-            return None, "⛔ **Access Denied (403):** This website has a strong firewall. Please copy the text manually and use the **'✍🏻 Text Summary'** tab."
-            
-        if response.status_code != 200: 
-            return None, f"ERROR: Status Code {response.status_code}"
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        found_images = []
-        for img in soup.find_all('img'):
-            src = img.get('data-src') or img.get('data-original') or img.get('src')
-            if img.get('srcset'):
-                try:
-                    src = img.get('srcset').split(',')[-1].strip().split(' ')[0]
-                except: pass
-            
-            if src:
-                if src.startswith('//'): src = 'https:' + src
-                elif src.startswith('/'): src = urllib.parse.urljoin(url, src)
-                if not any(x in src.lower() for x in ['logo', 'icon', 'avatar', 'svg', 'blank', 'transparent']):
-                    if src not in found_images:
-                        found_images.append(src)
-        found_images = found_images[:15]
-
-        for script in soup(["script", "style", "noscript", "svg"]): 
-            script.extract()
-        text = soup.get_text(separator=' \n ')
-        lines = (line.strip() for line in text.splitlines())
-        clean_text = '\n'.join(line for line in lines if line)[:100000] 
-        
-        return {"text": clean_text, "images": found_images}, None
-
-    except Exception as e: 
-        return None, f"CONNECTION ERROR: {str(e)}\n\n💡 Tip: This site might be blocking bots. Try pasting the text manually in the 'Text Summary' tab."
-
-# --- ROBUST PDF READER ---
-def extract_text_from_pdf(uploaded_file):
-    text = ""
-    error_log = ""
-    
-    if HAS_PDFPLUMBER:
-        try:
-            with pdfplumber.open(uploaded_file) as pdf:
-                for page in pdf.pages:
-                    extracted = page.extract_text()
-                    if extracted: text += extracted + "\n"
-            if len(text) > 10: return text[:100000]
-        except Exception as e:
-            error_log += f"Plumber failed: {str(e)}. "
-
-    if HAS_PYPDF:
-        try:
-            uploaded_file.seek(0)
-            reader = PdfReader(uploaded_file)
-            for page in reader.pages:
-                try: text += page.extract_text() + "\n"
-                except: pass 
-            if len(text) > 10: return text[:100000]
-        except Exception as e:
-            error_log += f"PyPDF failed: {str(e)}."
-            
-    if not text:
-        return f"⚠️ Error reading PDF. Please install 'pdfplumber' for better support.\nDetails: {error_log}"
-    
-    return text[:100000]
-
-# --- PDF GENERATOR ---
-def create_pdf(data):
-    if not HAS_REPORTLAB:
-        return None
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=12, textColor=colors.darkorange)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=12, spaceBefore=10, spaceAfter=6, textColor=colors.black)
-    body_style = styles['BodyText']
-    bullet_style = ParagraphStyle('Bullet', parent=styles['BodyText'], leftIndent=20)
-
-    info = data.get('basic_info', {})
-    story.append(Paragraph(f"{info.get('main_attractions', 'Tour Summary')}", title_style))
-    story.append(Paragraph(f"<b>Location:</b> {info.get('city_country')} | <b>Duration:</b> {info.get('duration')}", body_style))
-    story.append(Spacer(1, 12))
-
-    story.append(Paragraph("✨ Highlights", heading_style))
-    highlights = info.get('highlights', [])
-    if highlights:
-        bullets = [ListItem(Paragraph(h, body_style)) for h in highlights]
-        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
-
-    story.append(Paragraph("📝 What to Expect", heading_style))
-    story.append(Paragraph(info.get('what_to_expect', ''), body_style))
-
-    story.append(Paragraph("🗺️ Itinerary", heading_style))
-    itin = data.get('klook_itinerary', {})
-    segments = itin.get('segments', [])
-    start = itin.get('start', {})
-    story.append(Paragraph(f"<b>{start.get('time', '')}</b> - Start at {start.get('location', '')}", body_style))
-    for seg in segments:
-        text = f"<b>{seg.get('time', '')}</b> - {seg.get('type')}: {seg.get('name')}"
-        if seg.get('details'): text += f"<br/><i>{seg.get('details')}</i>"
-        story.append(Paragraph(text, bullet_style))
-    end = itin.get('end', {})
-    story.append(Paragraph(f"<b>{end.get('time', '')}</b> - End at {end.get('location', '')}", body_style))
-
-    inc = data.get('inclusions', {})
-    story.append(Paragraph("✅ Included", heading_style))
-    if inc.get('included'):
-        bullets = [ListItem(Paragraph(x, body_style)) for x in inc.get('included', [])]
-        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
-    story.append(Paragraph("❌ Excluded", heading_style))
-    if inc.get('excluded'):
-        bullets = [ListItem(Paragraph(x, body_style)) for x in inc.get('excluded', [])]
-        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
-
-    doc.build(story)
-    return buffer.getvalue()
-
-
-# --- SMART MODEL FINDER (FIXED WITH MEMORY CACHE) ---
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_working_model_name(api_key):
-    genai.configure(api_key=api_key)
-    try:
-        models = genai.list_models()
-        available_models = [m.name for m in models if 'generateContent' in m.supported_generation_methods]
-        
-        # Completely removed the dead 1.5 model. Prioritizing 2.5!
-        priority_list = ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-pro"]
-        for pref in priority_list:
-            for model in available_models:
-                if pref in model: return model
-                
-        return available_models[0] if available_models else "gemini-2.5-flash"
-    except: 
-        return "gemini-2.5-flash"
-        
-def sanitize_text(text):
-    if not text: return ""
-    text = text.encode('utf-8', 'ignore').decode('utf-8')
-    return text.replace("\\", "\\\\")[:95000]
-
-# --- KLOOK SELLING POINTS LIST ---
-SELLING_POINTS_LIST = """
-Interactive, Romantic, Customizable, Guided, Private, Skip-the-line, Small Group, VIP, All Inclusive, 
-Architecture, Canal, Cultural, Historical, Movie, Museum, Music, Religious Site, Pilgrimage, Spiritual, Temple, UNESCO site, Local Village, Old Town, 
-TV, Movie and TV, Heritage, Downtown, City Highlights, Downtown Highlights, 
-Alpine Route, Coral Reef, Desert, Glacier, Mangrove, Marine Life, Mountain, Rainforest, Safari, Sand Dune, Volcano, Waterfall, River, 
-Cherry Blossom, Fireflies, Maple Leaf, Northern Lights, Stargazing, National Park, Nature, Wildlife, Sunrise, Sunset, 
-Dolphin Watching, Whale Watching, Canyon, Flower Viewing, Tulip, Lavender, Spring, Summer, Autumn, Winter, Coastal, Beachfront, 
-Bar Hopping, Dining, Wine Tasting, Cheese, Chocolate, Food, Gourmet, Street Food, Brewery, Distillery, Whiskey, Seafood, Local Food, Late Night Food, 
-ATV, Bouldering, Diving, Fishing, Fruit Picking, Hiking, Island Hopping, Kayaking, Night Fishing, Ski, Snorkeling, Trekking, Caving, 
-Sports, Stadium, Horse Riding, Parasailing, 
-Transfers, Transfers With Tickets, Boat, Catamaran, Charter, Cruise, Ferry, Helicopter, Hop-On Hop-Off Bus, Limousine, Open-top Bus, Speedboat, Yacht, Walking, Bus, Bike, Electric Bike, River Cruise, Longtail Boat, Hot Air Balloon, 
-Hot Spring, Beach, Yoga, Meditation, 
-City, Countryside, Night, Shopping, Sightseeing, Photography, Self-guided, Shore Excursion, Adventure, Discovery, Backstreets, Hidden Gems
-"""
-
-# --- GEMINI CALLS (UPDATED PROMPT) ---
-def call_gemini_json_summary(text, api_key, target_lang="English"):
-    model_name = get_working_model_name(api_key)
-    if not model_name: return "Error: No available Gemini models found."
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name, generation_config={"response_mime_type": "application/json"})
-    
-    intro_prompt = f"""
-    You are a content specialist for Klook.
-    **TASK:** Convert tour text into strict JSON.
-    **OUTPUT LANGUAGE:** {target_lang}
-    
-    **CRITICAL RULE - ROMAN CHARACTERS ONLY:**
-    If translating to English, you MUST use strict ASCII/Roman characters (A-Z).
-    - Remove accents: 'ñ' -> 'n', 'é' -> 'e'.
-    
-    **CRITICAL ACCURACY RULES:**
-    1. **NO HALLUCINATION:** If pickup info or duration is not in the text, return "To be confirmed".
-    2. **STRICT LENGTH:** 'what_to_expect' MUST be between **100-120 words** AND strictly **UNDER 800 characters**. Count both.
-    3. **NO FULL STOP:** The 'what_to_expect' paragraph MUST NOT end with a full stop (period).
-    4. **POINT OF VIEW (CRITICAL):** NEVER use first-person pronouns ("we", "us", "our") when referring to the tour provider. Always replace them with "The operator" (e.g., change "We offer pick-ups" to "The operator offers pick-ups").
-    
-    **HIGHLIGHTS RULES (STRICT):**
-    - **LENGTH:** Each bullet point must be **STRICTLY 10-12 words long**.
-    - **QUANTITY:** Generate exactly 4 bullet points.
-    - **NO FULL STOP:** Do NOT end highlights with a full stop/period.
-    - Must be specific to the activity.
-    
-    **SELLING POINTS:**
-    - Select EXACTLY 3-5 tags from the list below. Do NOT invent new ones.
-    - List: {SELLING_POINTS_LIST}
-    
-**SETTINGS DATA (CRITICAL - READ CAREFULLY):**
-    - 'group_type': If the tour is private, return 'Private'. If it is a shared/public tour, look at 'max_pax'. If max_pax is 20 or below, return 'Join-in (small group)'. If max_pax is 21 or above, return 'Join-in (big group)'.
-    - 'min_pax': Look for explicit minimum booking requirements. If not explicitly stated, default to "1".
-    - 'max_pax': Look for explicit maximum capacity limits. If not explicitly stated, return "20".
-    
-    **ITINERARY & TIMING:**
-    - **Start Time:** If a range is given (e.g., "Pickup 7:00am - 8:00am"), extract the **START** time (e.g., "07:00"). Do NOT average them.
-    - **Format:** Use HH:MM format (24-hour clock).
-    
-    **PRICING EXTRACTION:**
-    - Look for Adult, Child, and Infant prices. Extract as numbers.
-    - Extract child age range if specified (e.g., "0-15", "4-12"). If not found, return "N/A".
-    - Detect Currency Code.
-    
-    **REQUIRED JSON STRUCTURE:**
-    {{
-        "basic_info": {{
-            "city_country": "City, Country",
-            "group_type": "Private/Join-in (small group)/Join-in (big group)",
-            "min_pax": "1",
-            "max_pax": "15",
-            "duration": "Duration",
-            "main_attractions": "Tour Name",
-            "highlights": ["Highlight 1 (10-12 words)", "Highlight 2 (10-12 words)", "Highlight 3", "Highlight 4"],
-            "what_to_expect": "Strictly 100-120 words and max 800 chars. No final full stop",
-            "selling_points": ["Tag 1", "Tag 2"]
-        }},
-        "klook_itinerary": {{
-            "start": {{ "time": "09:00", "location": "Meeting Point" }},
-            "segments": [
-                {{ "type": "Attraction", "time": "10:00", "name": "Name", "details": "Details", "location_search": "Search Term", "ticket_status": "Free/Ticket" }}
-            ],
-            "end": {{ "time": "17:00", "location": "Drop off" }}
-        }},
-        "policies": {{ "cancellation": "Policy", "merchant_contact": "+X-XXX-XXX-XXXX" }},
-        "inclusions": {{ "included": ["Item 1"], "excluded": ["Item 2"] }},
-        "restrictions": {{ "child_policy": "Details", "accessibility": "Details", "faq": ["FAQ content"] }},
-        "seo": {{ "keywords": ["Key 1"] }},
-        "pricing": {{ 
-            "details": "Original text string",
-            "currency": "USD",
-            "adult_price": 0.0,
-            "child_price": 0.0,
-            "infant_price": 0.0,
-            "child_age": "0-15"
-        }},
-        "analysis": {{ "ota_search_term": "Product Name" }}
-    }}
-    **INPUT TEXT:**
-    """
-    try:
-        response = model.generate_content(intro_prompt + sanitize_text(text))
-        return response.text
-    except ResourceExhausted: return "429_LIMIT"
-    except Exception as e: return f"AI Error: {str(e)}"
-
-# --- REGENERATE DESCRIPTION ONLY ---
-def regenerate_description_only(text, api_key, lang="English"):
-    model_name = get_working_model_name(api_key)
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    
-    prompt = f"""
-    Write a 'What to Expect' summary for this tour.
-    **CRITICAL RULES:**
-    1. STRICTLY 100-120 words AND strictly UNDER 800 characters. Count carefully.
-    2. Do NOT end with a full stop/period.
-    3. Language: {lang}
-    4. Text only. No JSON.
-    5. POINT OF VIEW: NEVER use "we", "us", or "our". Always replace them with "The operator".
-    
-    **INPUT TEXT:**
-    {sanitize_text(text)}
-    """
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except: return "Error regenerating description."
-
-# --- GRAMMAR CHECKER FUNCTION (UPDATED FOR ERROR LISTING) ---
-def fix_grammar_american(text, keys):
-    if not keys: return {"error": "AI Error: No API keys found."}
-    
-    prompt = f"""
-    Act as a professional editor.
-    Task: Correct the grammar, spelling, and punctuation of the following text.
-    Standard: American English.
-    Constraint: Keep the original tone and meaning.
-    
-    Return strict JSON in this format:
-    {{
-        "corrected_text": "The full corrected text here.",
-        "errors_found": [
-            {{"original": "wrong word or phrase", "correction": "right word", "reason": "Why it was changed"}}
-        ]
-    }}
-    
-    Input Text:
-    {text}
-    """
-    
-    shuffled_keys = list(keys)
-    random.shuffle(shuffled_keys)
-    last_error = ""
-    
-    for key in shuffled_keys:
-        try:
-            model_name = get_working_model_name(key)
-            genai.configure(api_key=key)
-            # Force JSON output so we can separate the text and the error list
-            model = genai.GenerativeModel(model_name, generation_config={"response_mime_type": "application/json"})
-            
-            response = model.generate_content(prompt)
-            
-            clean_json = response.text.strip()
-            if clean_json.startswith("```json"): clean_json = clean_json[7:]
-            if clean_json.endswith("```"): clean_json = clean_json[:-3]
-            
-            res_data = json.loads(clean_json.strip())
-            
-            # Remove trailing period if present (matching your previous logic)
-            if res_data.get("corrected_text", "").endswith("."):
-                res_data["corrected_text"] = res_data["corrected_text"][:-1]
-                
-            return res_data 
-            
-        except Exception as e:
-            last_error = str(e)
-            time.sleep(0.5) 
-            continue 
-            
-    return {"error": f"AI Error: All keys exhausted. Last error: {last_error}"}
-
-# --- EMAIL DRAFTER ---
-def call_gemini_email_draft(json_data, api_key):
-    model_name = get_working_model_name(api_key)
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    prompt = f"Draft a concise GAP ANALYSIS email. Request MISSING info only. Data: {json.dumps(json_data)}"
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except: return "Error generating email."
-
-# --- CAPTION GENERATOR ---
-def call_gemini_caption(image_bytes, api_key, context_str=""):
-    # Reverting back to the smart finder since you are on the Paid Tier!
-    model_name = get_working_model_name(api_key)
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    
-    prompt = f"Social media caption (10-12 words, experiential verb start, NO full stop, no emojis). Context: '{context_str}'"
-    
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        response = model.generate_content([prompt, img])
-        return response.text
-        
-    except Exception as e: 
-        # 4. Stop failing silently! Print the exact error so we can debug if it happens again.
-        return f"Caption Failed: {str(e)}"
-
 # --- HELPER: RENDER COPY BOX ---
 def copy_box(label, text, height=None):
     if not text: return
@@ -753,31 +201,74 @@ def show_copy_dialog(data):
     st.code(clean(kw_text), language='text')
     st.code(clean(pol.get('merchant_contact')), language='text')
 
-# --- UI RENDERER ---
-def render_output(json_text, url_input=None):
-    if json_text == "429_LIMIT":
-        st.error("⏳ Quota Exceeded. Please wait 1 minute.")
-        return
-    if not json_text or "Error" in json_text:
-        st.error(f"⚠️ {json_text}")
-        return
-
+# --- PROGRESSIVE PREVIEW (WHILE THE SUMMARY STREAMS IN) ---
+# Returns an on_section callback that fills one placeholder per section as
+# soon as that section has finished streaming. The full render_output view
+# replaces the preview once the whole response is in.
+PREVIEW_ORDER = ["basic_info", "klook_itinerary", "pricing", "inclusions", "policies", "restrictions", "seo", "analysis"]
+
+def stream_preview(container):
+    with container.container():
+        st.caption("⚡ Live preview: sections appear as the AI finishes them")
+        slots = {name: st.empty() for name in PREVIEW_ORDER}
+
+    def on_section(name, value):
+        slot = slots.get(name)
+        if slot is None or not isinstance(value, dict): return
+        with slot.container():
+            if name == "basic_info":
+                st.subheader(value.get("main_attractions", ""))
+                st.write(f"**📍 Location:** {value.get('city_country')} | **⏳ Duration:** {value.get('duration')} | **👥 Group:** {value.get('group_type')}")
+                for h in value.get("highlights", []): st.write(f"- {h}")
+                st.write(value.get("what_to_expect", ""))
+            elif name == "klook_itinerary":
+                start, end = value.get("start", {}), value.get("end", {})
+                st.write(f"**🏁 Start:** {start.get('time')} @ {start.get('location')}")
+                for seg in value.get("segments", []):
+                    st.write(f"- **{seg.get('time', '')}** {seg.get('name', '')}")
+                st.write(f"**🏁 End:** {end.get('time')} @ {end.get('location')}")
+            elif name == "pricing":
+                cur = value.get("currency", "")
+                st.write(f"**💰 Adult:** {cur} {value.get('adult_price')} | **Child:** {cur} {value.get('child_price')} | **Infant:** {cur} {value.get('infant_price')}")
+            else:
+                st.write(f"**{name.replace('_', ' ').title()}:** ✅")
+    return on_section
+
+# --- RENDER ARTIFACT CACHE (BUILT ONCE PER RESULT, NOT ON EVERY RERUN) ---
+# Keyed by a hash of gen_result, so a new or regenerated summary starts a
+# fresh set. Entries are only built when first asked for; the PDF and the
+# automation JSON are built from download_button callables, which run on a
+# separate thread, so they close over the plain dict rather than session_state.
+MAX_ARTIFACT_SETS = 3
+
+def result_artifacts(json_text):
+    key = hashlib.sha1(json_text.encode('utf-8')).hexdigest()
+    store = st.session_state.setdefault('render_artifacts', {})
+    if key not in store:
+        while len(store) >= MAX_ARTIFACT_SETS:
+            store.pop(next(iter(store)))
+        store[key] = {}
+    return store[key]
+
+def artifact(artifacts, name, build):
+    if name not in artifacts:
+        artifacts[name] = build()
+    return artifacts[name]
+
+def parse_summary(json_text):
     clean_text = json_text.strip()
     if clean_text.startswith("```json"): clean_text = clean_text[7:]
     if clean_text.endswith("```"): clean_text = clean_text[:-3]
-    
     try:
         data = json.loads(clean_text)
-        if "basic_info" in data and "main_attractions" in data["basic_info"]:
-            st.session_state['product_context'] = data["basic_info"]["main_attractions"]
-    except:
-        st.warning("⚠️ Formatting Issue. See 'Raw Response' below.")
-        st.code(json_text)
-        return
-        
-    info = data.get("basic_info", {})
-    
-    # --- NEW: STRICT GROUP TYPE ENFORCER ---
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        enforce_group_type(data.get("basic_info", {}))
+    return data
+
+# --- NEW: STRICT GROUP TYPE ENFORCER ---
+def enforce_group_type(info):
     current_group = info.get("group_type", "")
     max_pax_val = str(info.get("max_pax", "")).strip()
     
@@ -794,8 +285,39 @@ def render_output(json_text, url_input=None):
             info["group_type"] = "Join-in (small group)"
         else:
             info["group_type"] = "Join-in (big group)"
-    # ---------------------------------------
 
+def build_automation_json(data, photos, store):
+    # Create a copy of the data specifically for the extension
+    extension_payload = data.copy()
+    
+    # If there are processed images in the session memory, pack them in!
+    if photos:
+        extension_payload["processed_photos"] = [
+            {"filename": item["fname"], "caption": item["caption"], "base64": store.data_url(item["digest"])}
+            for item in photos
+        ]
+    return json.dumps(extension_payload, indent=4)
+
+# --- UI RENDERER ---
+@perf.timed("ui.render_output")
+def render_output(json_text, url_input=None):
+    if str(json_text).startswith("429_LIMIT"):
+        st.error("⏳ Quota Exceeded. Please wait 1 minute.")
+        return
+    if not json_text or "Error" in json_text:
+        st.error(f"⚠️ {json_text}")
+        return
+
+    artifacts = result_artifacts(json_text)
+    data = artifact(artifacts, "data", lambda: parse_summary(json_text))
+    if not isinstance(data, dict):
+        st.warning("⚠️ Formatting Issue. See 'Raw Response' below.")
+        st.code(json_text)
+        return
+    if "main_attractions" in data.get("basic_info", {}):
+        st.session_state['product_context'] = data["basic_info"]["main_attractions"]
+        
+    info = data.get("basic_info", {})
     inc = data.get("inclusions", {})
     pol = data.get("policies", {})
     seo = data.get("seo", {})
@@ -813,14 +335,16 @@ def render_output(json_text, url_input=None):
         copy_box("📞 Phone", pol.get('merchant_contact'))
         st.divider()
         if HAS_REPORTLAB:
-            pdf_data = create_pdf(data)
-            if pdf_data:
-                st.download_button("📄 Download Summary PDF", pdf_data, f"Klook_Summary_{int(time.time())}.pdf", "application/pdf")
+            # Built on the first click only, then served from the artifact cache
+            st.download_button("📄 Download Summary PDF", lambda: artifact(artifacts, "pdf", lambda: create_pdf(data)) or b"",
+                               f"Klook_Summary_{int(time.time())}.pdf", "application/pdf")
 
     tab_names = ["ℹ️ Basic Info", "⏰ Start & End", "🗺️ Klook Itinerary", "📜 Policies", "✅ Inclusions", "🚫 Restrictions", "🔍 SEO", "💰 Price", "📊 Analysis", "📧 Supplier Email", "🔧 Automation"]
     tabs = st.tabs(tab_names)
 
     with tabs[0]:
+        # Whatever the automatic rewrites could not fix within their retry budget
+        violations = rule_violations(data, SELLING_POINTS)
         st.write(f"**📍 Location:** {info.get('city_country')}")
         st.write(f"**⏳ Duration:** {info.get('duration')}")
         st.write(f"**👥 Group:** {info.get('group_type')}")
@@ -833,8 +357,12 @@ def render_output(json_text, url_input=None):
         st.divider()
         st.write("**🌟 Highlights:**")
         for h in info.get("highlights", []): st.write(f"- {h}")
+        if ("basic_info", "highlights") in violations:
+            st.caption(f"⚠️ {violations[('basic_info', 'highlights')]}")
         st.write("**🏷️ Selling Points:**")
         st.write(", ".join(info.get("selling_points", [])))
+        if ("basic_info", "selling_points") in violations:
+            st.caption(f"⚠️ {violations[('basic_info', 'selling_points')]}")
         
         st.divider()
         
@@ -845,8 +373,8 @@ def render_output(json_text, url_input=None):
         
         c1, c2 = st.columns([3, 1])
         with c1:
-            if wte_chars > 800:
-                st.error(f"📝 **What to Expect** ({wte_count} words | ⚠️ {wte_chars}/800 chars):")
+            if ("basic_info", "what_to_expect") in violations:
+                st.error(f"📝 **What to Expect** ({wte_count} words | {wte_chars}/800 chars): ⚠️ {violations[('basic_info', 'what_to_expect')]}")
             else:
                 st.info(f"📝 **What to Expect** ({wte_count} words | {wte_chars}/800 chars):")
         with c2:
@@ -854,7 +382,7 @@ def render_output(json_text, url_input=None):
                 keys = get_all_keys()
                 if keys and st.session_state['raw_text_content']:
                     with st.spinner("Rewriting..."):
-                        new_desc = regenerate_description_only(st.session_state['raw_text_content'], random.choice(keys), "English") # Uses current lang default
+                        new_desc = run_scheduled(keys, lambda k: regenerate_description_only(st.session_state['raw_text_content'], k, "English"), "Error regenerating description") # Uses current lang default
                         # Clean last period again just in case
                         if new_desc.endswith("."): new_desc = new_desc[:-1]
                         
@@ -991,117 +519,234 @@ def render_output(json_text, url_input=None):
             keys = get_all_keys()
             if keys:
                 with st.spinner("Analyzing Gaps..."):
-                    email = call_gemini_email_draft(data, keys[0])
+                    email = run_scheduled(keys, lambda k: call_gemini_email_draft(data, k), "Error generating email")
                     st.text_area("Email Draft", value=email, height=300)
     
     with tabs[10]:
         st.header("🔧 Automation Data")
         
-        # Create a copy of the data specifically for the extension
-        extension_payload = data.copy()
+        # One payload per (result, processed photo set); serialized only when shown or downloaded
+        photos = st.session_state.get('processed_images_data') or []
+        photo_sig = hashlib.sha1(repr([(p["fname"], p.get("caption"), p["digest"]) for p in photos]).encode('utf-8')).hexdigest()
+        store = get_image_store()
+        automation_json = lambda: artifact(artifacts, ("automation", photo_sig), lambda: build_automation_json(data, photos, store))
         
-        # If there are processed images in the session memory, pack them in!
-        if st.session_state.get('processed_images_data'):
-            formatted_photos = []
-            for item in st.session_state['processed_images_data']:
-                formatted_photos.append({
-                    "filename": item["fname"],
-                    "caption": item["caption"],
-                    "base64": item.get("b64_string", "") 
-                })
-            
-            # Attach the array directly to the payload
-            extension_payload["processed_photos"] = formatted_photos
-            
-        st.code(json.dumps(extension_payload, indent=4), language="json")
-
+        st.caption(f"Summary JSON + {len(photos)} processed photo(s)")
+        st.download_button("⬇️ Download Automation JSON", automation_json, f"Klook_Automation_{int(time.time())}.json", "application/json")
+        if st.toggle("Show Automation JSON"):
+            st.code(automation_json(), language="json")
+
+
+def batch_status_rows(job):
+    icons = {"Queued": "⏳", "Running": "🔄", "Scraping": "🕷️", "Summarizing": "🧠", "Done": "✅", "Failed": "❌"}
+    rows = []
+    for i, url in enumerate(job.items):
+        stage = job.stages[i]
+        res = job.results[i] or {}
+        rows.append({
+            "#": i + 1,
+            "URL": url,
+            "Status": f"{icons.get(stage, '')} {stage}",
+            "Seconds": job.elapsed[i],
+            "Tokens": res.get("tokens"),
+            "Product / Error": res.get("product") or (job.errors[i] or "")[:200],
+        })
+    return rows
+
+# One flat row per merchant for the live table, the final table and the CSV
+def merchant_row(url, res, error, seconds):
+    res = res or {}
+    def joined(name):
+        items = res.get(name) or []
+        return ", ".join(str(i) for i in items) if isinstance(items, list) else str(items)
+    status = "Failed" if error else res.get("status", "Unknown")
+    try: score = int(res.get("legitimacy_score"))
+    except (TypeError, ValueError): score = None
+    return {
+        "URL": url,
+        "Merchant": res.get("merchant_name", ""),
+        "Status": status,
+        "Score": score,
+        "Domain Age (yrs)": res.get("domain_age") if isinstance(res.get("domain_age"), int) else None,
+        "Approve Categories": joined("preferred_categories_found"),
+        "Reject Categories": joined("red_flag_categories_found"),
+        "Reason": (error or res.get("status_reason", ""))[:300],
+        "Seconds": seconds,
+    }
 
-# --- SMART ROTATION (FIXED ERROR EXPOSURE) ---
-def smart_rotation_wrapper(text, keys, lang="English"):
-    if not keys: return "⚠️ No API keys found."
-    
-    shuffled_keys = list(keys)
-    random.shuffle(shuffled_keys)
-    last_error = ""
-    
-    for attempt in range(2): # Give the whole list of keys 2 full attempts
-        for key in shuffled_keys:
-            result = call_gemini_json_summary(text, key, lang)
-            
-            # If it's a quota error, log it and instantly try the next key
-            if result == "429_LIMIT" or "429" in str(result):
-                last_error = "429 Quota Exceeded on this key."
-                time.sleep(0.5)
-                continue
-            
-            # If it is another AI error (like 404), log it and try next key
-            if "Error" in str(result):
-                last_error = result
-                continue
-                
-            # SUCCESS! Process the JSON
-            try:
-                # Clean up markdown formatting if the AI added it
-                clean_result = result.replace("```json", "").replace("```", "").strip()
-                d = json.loads(clean_result)
-                
-                if "basic_info" in d and "highlights" in d["basic_info"]:
-                    d["basic_info"]["highlights"] = [h.rstrip('.') for h in d["basic_info"]["highlights"]]
-                
-                if "basic_info" in d and "what_to_expect" in d["basic_info"]:
-                    wte = d["basic_info"]["what_to_expect"]
-                    if wte.endswith("."): wte = wte[:-1]
-                    d["basic_info"]["what_to_expect"] = wte
-                
-                return json.dumps(d)
-            except: 
-                pass
-            
-            return result
-            
-    # If all keys fail, it will now tell you EXACTLY why!
-    return f"⚠️ AI Failed. Last Error: {last_error}"
+def merchant_status_rows(job):
+    icons = {"Queued": "⏳", "Running": "🔄", "Fetching site": "🕷️", "AI audit": "🧠", "Done": "✅", "Failed": "❌"}
+    rows = []
+    for i, url in enumerate(job.items):
+        stage = job.stages[i]
+        row = merchant_row(url, job.results[i], job.errors[i], job.elapsed[i])
+        if stage != "Done":
+            row["Status"] = f"{icons.get(stage, '')} {stage}"
+        rows.append(row)
+    return rows
+
+def rows_to_csv(rows):
+    buf = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(buf, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return buf.getvalue().encode("utf-8-sig")  # BOM so Excel opens non-ASCII names correctly
 
 
 # --- MAIN APP LOGIC ---
 with st.sidebar:
     st.header("⚙️ Settings")
     target_lang = st.selectbox("🌐 Target Language", ["English", "Chinese (Traditional)", "Chinese (Simplified)", "Korean", "Japanese", "Thai", "Vietnamese", "Indonesian"])
+    with st.expander("🗄️ AI Response Cache"):
+        cache_stats = get_response_cache().stats()
+        if cache_stats:
+            st.dataframe([{"kind": k, **v} for k, v in sorted(cache_stats.items())], hide_index=True, use_container_width=True)
+        else:
+            st.caption("Cache is empty.")
+        if st.button("🧹 Clear Cache"):
+            get_response_cache().clear()
+            st.rerun()
+    with st.expander("⏱️ Startup Timing"):
+        st.caption(f"This run: app imports {IMPORTS_MS:.0f} ms, sidebar ready after {(time.perf_counter() - SCRIPT_STARTED) * 1000:.0f} ms")
+        st.dataframe(import_report(), hide_index=True, use_container_width=True)
+        st.caption("Heavy libraries load on first use. Cold import cost per subsystem: `python lazy_deps.py`")
+    admin_password = tour_engine.get_setting("ADMIN_PASSWORD")
+    if admin_password:
+        with st.expander("📈 Performance (admin)"):
+            entered = st.text_input("Admin password", type="password", key="perf_admin_password")
+            if entered and hmac.compare_digest(entered, str(admin_password)):
+                perf_rows, perf_counters = perf.snapshot()
+                if perf_rows:
+                    st.dataframe(perf_rows, hide_index=True, use_container_width=True)
+                else:
+                    st.caption("No stages recorded since the server started.")
+                if perf_counters:
+                    st.caption(" · ".join(f"{k}: {v}" for k, v in sorted(perf_counters.items())))
+                routing_rows = tour_engine.get_model_router().snapshot()
+                if routing_rows:
+                    st.caption("Model routing (rolling latency / error rate per key, model and feature)")
+                    st.dataframe(routing_rows, hide_index=True, use_container_width=True)
+                st.download_button("⬇️ Prometheus metrics", perf.prometheus_text, "metrics.txt", "text/plain")
+                if st.button("🧹 Reset Metrics"):
+                    perf.reset()
+                    st.rerun()
+            elif entered:
+                st.error("Wrong password")
     st.divider()
 
 t1, t2, t3, t4, t5, t6, t7 = st.tabs(["🧠 Link Summary", "✍🏻 Text Summary", "📄 PDF Summary", "🖼️ Photo Resizer", "🛡️ Merchant Screening Tool", "📝 Grammar Check", "🔎 Klook Search"])
 
 with t1:
-    url = st.text_input("Paste Tour Link")
-    if st.button("Generate from Link"):
-        keys = get_all_keys()
-        if not keys: st.error("❌ No API Keys"); st.stop()
-        if not url: st.error("❌ Enter URL"); st.stop()
+    link_mode = st.radio("Mode", ["Single Link", "Batch (List / CSV)"], horizontal=True, label_visibility="collapsed")
+
+    if link_mode == "Single Link":
+        url = st.text_input("Paste Tour Link")
+        if st.button("Generate from Link"):
+            keys = get_all_keys()
+            if not keys: st.error("❌ No API Keys"); st.stop()
+            if not url: st.error("❌ Enter URL"); st.stop()
 
-        with st.status("🚀 Processing...", expanded=True) as status:
-            status.write("🕷️ Scraping URL & Images...")
-            data_dict, err = extract_data_from_url(url)
+            with st.status("🚀 Processing...", expanded=True) as status:
+                status.write("🕷️ Scraping URL & Images...")
+                data_dict, err = extract_data_from_url(url)
             
-            if err or not data_dict:
-                status.update(label="❌ Scrape Failed", state="error")
-                st.error(err)
-                st.stop()
+                if err or not data_dict:
+                    status.update(label="❌ Scrape Failed", state="error")
+                    st.error(err)
+                    st.stop()
             
-            st.session_state['scraped_images'] = data_dict['images']
-            st.session_state['raw_text_content'] = data_dict['text'] 
+                st.session_state['scraped_images'] = data_dict['images']
+                st.session_state['scraped_image_report'] = data_dict.get('image_report', [])
+                st.session_state['raw_text_content'] = data_dict['text'] 
             
-            status.write(f"✅ Found {len(data_dict['images'])} images & {len(data_dict['text'])} chars. Calling AI...")
-            result = smart_rotation_wrapper(data_dict['text'], keys, target_lang)
+                prefilled = prefill_summary(data_dict.get('structured'), target_lang)
+                if prefilled:
+                    known_count = sum(len(v) for v in prefilled.values())
+                    status.write(f"📦 Structured data found: {known_count} fields (name, price, duration...) taken as exact values")
+                status.write(f"✅ Found {len(data_dict['images'])} images & {len(data_dict['text'])} chars. Calling AI...")
+                plan = plan_summary(data_dict['text'], target_lang, prefilled)
+                status.write(describe_plan(plan))
+                preview = st.empty()
+                result, plan = summarize_document(data_dict['text'], keys, target_lang, prefilled, plan, on_section=stream_preview(preview))
+                preview.empty()
+                if plan.get("failed_chunks"):
+                    status.write(f"⚠️ {plan['failed_chunks']} of {len(plan['chunks'])} parts failed; merged the rest")
             
-            if "Busy" not in result and "Error" not in result:
-                st.session_state['gen_result'] = result
-                st.session_state['url_input'] = url
+                if "Busy" not in result and "Error" not in result:
+                    st.session_state['gen_result'] = result
+                    st.session_state['url_input'] = url
             
-            if "Busy" in result or "Error" in result or "Failed" in result:
-                status.update(label="❌ AI Failed", state="error")
-                st.error(result)
-            else:
-                status.update(label="✅ Complete!", state="complete")
+                if "Busy" in result or "Error" in result or "Failed" in result:
+                    status.update(label="❌ AI Failed", state="error")
+                    st.error(result)
+                else:
+                    status.update(label="✅ Complete!", state="complete")
+
+    else:
+        st.info("Paste one URL per line, or upload a CSV/TXT sheet (any column holding links is picked up).")
+        batch_text = st.text_area("Tour Links", height=150, key="batch_urls")
+        batch_file = st.file_uploader("Upload CSV / TXT", type=['csv', 'txt'], key="batch_file")
+        bc1, bc2 = st.columns(2)
+        batch_workers = bc1.slider("Parallel Workers", 1, 16, 6)
+        batch_per_host = bc2.slider("Max Requests per Website", 1, 4, 2)
+
+        if st.button("Run Batch"):
+            keys = get_all_keys()
+            if not keys: st.error("❌ No API Keys"); st.stop()
+            batch_urls = parse_url_list(batch_text, batch_file.getvalue() if batch_file else None)
+            if not batch_urls: st.error("❌ No URLs found"); st.stop()
+
+            job = BatchJob(
+                batch_urls,
+                lambda u, set_stage: summarize_link_job(u, keys, target_lang, set_stage, scrape=extract_data_from_url),
+                max_workers=batch_workers,
+                per_host=batch_per_host,
+            ).start()
+
+            prog_bar = st.progress(0, text=f"0 / {len(batch_urls)} done")
+            table_slot = st.empty()
+            finished_count = 0
+            # A rerun or Stop ends this script run mid-loop; don't leave the job spending quota
+            try:
+                while not job.done:
+                    finished_count += len(job.poll(timeout=0.5))
+                    prog_bar.progress(finished_count / len(batch_urls), text=f"{finished_count} / {len(batch_urls)} done")
+                    table_slot.dataframe(batch_status_rows(job), use_container_width=True, hide_index=True)
+            finally:
+                job.cancel()
+            prog_bar.progress(1.0, text=f"{len(batch_urls)} / {len(batch_urls)} done")
+            table_slot.empty()
+
+            st.session_state['batch_results'] = [
+                {"url": u, "error": job.errors[i], "elapsed": job.elapsed[i], **(job.results[i] or {})}
+                for i, u in enumerate(batch_urls)
+            ]
+
+        if st.session_state['batch_results']:
+            b_res = st.session_state['batch_results']
+            ok_count = sum(1 for r in b_res if not r.get("error"))
+            st.success(f"✅ {ok_count} / {len(b_res)} links summarized")
+            st.dataframe([
+                {"URL": r["url"], "Status": "❌ Failed" if r.get("error") else "✅ Done", "Seconds": r.get("elapsed"), "Tokens": r.get("tokens"),
+                 "Product / Error": r.get("product") or (r.get("error") or "")[:200]}
+                for r in b_res
+            ], use_container_width=True, hide_index=True)
+
+            done_urls = [r["url"] for r in b_res if not r.get("error")]
+            if done_urls:
+                pick = st.selectbox("Open a result below", done_urls)
+                if st.button("📂 Load Selected Result"):
+                    chosen = next(r for r in b_res if r["url"] == pick)
+                    st.session_state['gen_result'] = chosen["result"]
+                    st.session_state['url_input'] = chosen["url"]
+                    st.session_state['scraped_images'] = chosen["images"]
+                    st.session_state['scraped_image_report'] = chosen.get("image_report", [])
+                    st.session_state['raw_text_content'] = chosen["text"]
+                    st.rerun()
+
+            jsonl = "\n".join(json.dumps({"url": r["url"], "error": r.get("error"), "result": r.get("result")}) for r in b_res)
+            st.download_button("⬇️ Download Results (JSONL)", jsonl, f"Klook_Batch_{int(time.time())}.jsonl", "application/json")
 
 with t2:
     raw_text = st.text_area("Paste Tour Text")
@@ -1109,7 +754,11 @@ with t2:
         keys = get_all_keys()
         if not keys: st.error("❌ No Keys"); st.stop()
         st.session_state['raw_text_content'] = raw_text 
-        result = smart_rotation_wrapper(raw_text, keys, target_lang)
+        plan = plan_summary(raw_text, target_lang)
+        st.caption(describe_plan(plan))
+        preview = st.empty()
+        result, plan = summarize_document(raw_text, keys, target_lang, plan=plan, on_section=stream_preview(preview))
+        preview.empty()
         if "Busy" not in result and "Error" not in result and "Failed" not in result:
             st.session_state['gen_result'] = result
             try:
@@ -1122,20 +771,32 @@ with t2:
 with t3:
     st.info("Upload a PDF brochure or document to summarize.")
     pdf_file = st.file_uploader("Upload PDF", type=['pdf'])
+    pdf_pages = st.text_input("Pages (optional)", placeholder="All pages, or e.g. 1-5, 8, 12-")
     if pdf_file and st.button("Generate from PDF"):
         keys = get_all_keys()
         if not keys: st.error("❌ No Keys"); st.stop()
         
         with st.status("🚀 Reading PDF...", expanded=True) as status:
-            pdf_text = extract_text_from_pdf(pdf_file)
-            if "Error" in pdf_text:
+            pdf_text, pdf_report = extract_text_from_pdf(pdf_file, pdf_pages)
+            if pdf_report is None:
                 status.update(label="❌ PDF Read Failed", state="error")
                 st.error(pdf_text)
                 st.stop()
             
             st.session_state['raw_text_content'] = pdf_text 
+            read_pages = len(pdf_report["pages"])
+            stop_note = f" (stopped early at page {pdf_report['pages'][-1]['page']}: text budget reached)" if pdf_report["stopped_early"] else ""
+            status.write(f"📄 Read {read_pages} of {pdf_report['page_count']} pages in {pdf_report['seconds']}s{stop_note}")
+            with st.expander("⏱️ Per-page timing"):
+                st.dataframe(pdf_report["pages"], hide_index=True, use_container_width=True)
             status.write(f"✅ Extracted {len(pdf_text)} chars. Calling AI...")
-            result = smart_rotation_wrapper(pdf_text, keys, target_lang)
+            plan = plan_summary(pdf_text, target_lang)
+            status.write(describe_plan(plan))
+            preview = st.empty()
+            result, plan = summarize_document(pdf_text, keys, target_lang, plan=plan, on_section=stream_preview(preview))
+            preview.empty()
+            if plan.get("failed_chunks"):
+                status.write(f"⚠️ {plan['failed_chunks']} of {len(plan['chunks'])} parts failed; merged the rest")
             
             if "Busy" not in result and "Error" not in result and "Failed" not in result:
                 st.session_state['gen_result'] = result
@@ -1148,7 +809,7 @@ with t3:
                 status.update(label="❌ AI Failed", state="error")
                 st.error(result)
 
-# --- PHOTO RESIZER TAB (SEQUENTIAL & STABLE) ---
+# --- PHOTO RESIZER TAB (STAGED PIPELINE) ---
 with t4:
     st.info("Upload photos OR use photos scraped from the link.")
     
@@ -1158,26 +819,37 @@ with t4:
     enable_captions = st.checkbox("☑️ Generate AI Captions", value=True)
     c_align = st.selectbox("Crop Focus", ["Center", "Top", "Bottom", "Left", "Right"])
     align_map = {"Center":(0.5,0.5), "Top":(0.5,0.0), "Bottom":(0.5,1.0), "Left":(0.0,0.5), "Right":(1.0,0.5)}
+    encode_profile = st.selectbox("Encode Profile", list(ENCODE_PROFILES), index=list(ENCODE_PROFILES).index(DEFAULT_PROFILE),
+                                  help="balanced: same look as max, much faster to encode. max: the previous quality 95 + optimize setting.")
     
     files = st.file_uploader("Upload Files", accept_multiple_files=True, type=['jpg','png','jpeg'])
     
     selected_scraped = []
     if st.session_state['scraped_images']:
         st.divider()
-        st.write(f"**🌐 Found {len(st.session_state['scraped_images'])} images from website:**")
+        # Previews come from the server-side cache: each original is downloaded once,
+        # not by every browser on every rerun, and is reused when processing
+        thumbs = get_thumb_cache().prefetch(st.session_state['scraped_images'])
+        shown = drop_duplicates(st.session_state['scraped_images'], st.session_state['scraped_image_report'], thumbs.get)
+        st.write(f"**🌐 Found {len(shown)} images from website:**")
+        probes = {p["url"]: p for p in st.session_state['scraped_image_report']}
+        skipped = summarize_report(st.session_state['scraped_image_report'])
+        if skipped.get("too_small") or skipped.get("duplicate"):
+            st.caption(f"Skipped {skipped.get('too_small', 0)} below 1280×800 (checked from image headers) and {skipped.get('duplicate', 0)} duplicates.")
         cols = st.columns(5)
-        for i, img_url in enumerate(st.session_state['scraped_images']):
+        for i, img_url in enumerate(shown):
             with cols[i % 5]:
-                try:
-                    st.image(img_url, use_column_width=True)
-                    if st.checkbox("Select", key=f"img_{i}"):
-                        selected_scraped.append(img_url)
-                except Exception:
+                if not thumbs.get(img_url):
                     st.warning(f"⚠️ Could not load image {i+1}")
+                    continue
+                probe = probes.get(img_url)
+                size_note = f"{probe['width']}×{probe['height']}" if probe and probe["status"] == "ok" else "size unknown"
+                st.image(thumbs[img_url], use_column_width=True, caption=size_note)
+                if st.checkbox("Select", key=f"img_{i}"):
+                    selected_scraped.append(img_url)
 
-    if 'processed_images_data' not in st.session_state:
-        st.session_state['processed_images_data'] = []
-        st.session_state['zip_buffer'] = None
+    image_store = get_image_store()
+    image_session = st.session_state['image_session']
 
     if st.button("Process Selected Images"):
         keys = get_all_keys()
@@ -1187,57 +859,62 @@ with t4:
             st.warning("⚠️ No images selected.")
         else:
             st.session_state['processed_images_data'] = [] 
-            zip_buf = io.BytesIO()
-            
-            with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-                prog_bar = st.progress(0)
-                total_count = len(total_items)
-                
-                # --- SEQUENTIAL PROCESSING (STABLE & SAFE) ---
-                for idx, item in enumerate(total_items):
-                    prog_bar.progress((idx + 1) / total_count)
-                    
-                    if hasattr(item, 'read'): 
-                        fname = item.name
-                        b_img, orig_w, orig_h, err, b64_str = resize_image_klook_standard(item, align_map[c_align])
-                    else: 
-                        fname = f"web_image_{idx}.jpg"
-                        try:
-                            headers = {'User-Agent': 'Mozilla/5.0'}
-                            resp = requests.get(item, headers=headers, timeout=10)
-                            b_img, orig_w, orig_h, err, b64_str = resize_image_klook_standard(resp.content, align_map[c_align])
-                        except: 
-                            b_img, orig_w, orig_h, err, b64_str = None, 0, 0, None, None
-                    
-                    if b_img:
-                        zf.writestr(f"resized_{fname}", b_img)
-                        
-                        caption_text = ""
-                        if enable_captions and keys:
-                            caption_text = call_gemini_caption(b_img, random.choice(keys), context_str=manual_context)
-                            
-                            # Add a 2-second delay to prevent rate-limiting crashes 
-                            time.sleep(2)
-                        
-                        st.session_state['processed_images_data'].append({
-                            "fname": fname,
-                            "b_img": b_img,
-                            "orig_w": orig_w,
-                            "orig_h": orig_h,
-                            "caption": caption_text,
-                            "b64_string": b64_str, 
-                            "idx": idx
-                        })
+            image_store.release_session(image_session)
+
+            # --- STAGED PIPELINE: PARALLEL DOWNLOADS -> PROCESS-POOL RESIZE -> RATE-LIMITED CAPTIONS ---
+            photo_jobs = []
+            for idx, item in enumerate(total_items):
+                if hasattr(item, 'read'):
+                    photo_jobs.append({"idx": idx, "fname": item.name, "data": item.getvalue()})
+                else:
+                    photo_jobs.append({"idx": idx, "fname": f"web_image_{idx}.jpg", "url": item})
+
+            caption_fn = None
+            if enable_captions and keys:
+                caption_fn = lambda b: run_scheduled(keys, lambda k: call_gemini_caption(b, k, context_str=manual_context), "Caption Failed")
+
+            # The shared key scheduler paces captions to the real quota, so the queue itself is unthrottled
+            pipeline = PhotoPipeline(
+                photo_jobs,
+                alignment=align_map[c_align],
+                caption_fn=caption_fn,
+                caption_rate=0,
+                caption_workers=min(4, 2 * len(keys or [None])),
+                profile=encode_profile,
+                fetch_fn=get_thumb_cache().original,
+            )
+            prog_bar = st.progress(0)
+            for done_steps, total_steps in pipeline.run():
+                prog_bar.progress(done_steps / total_steps)
+
+            # Assemble in original selection order so the list and the ZIP stay deterministic.
+            # Session state keeps only digests; the JPEG bytes live once in the shared store.
+            for pos, job in enumerate(photo_jobs):
+                b_img, orig_w, orig_h, err = pipeline.results[pos] or (None, 0, 0, None)
+                if not b_img:
+                    continue
+                st.session_state['processed_images_data'].append({
+                    "fname": job["fname"],
+                    "digest": image_store.put(b_img, image_session),
+                    "size": len(b_img),
+                    "orig_w": orig_w,
+                    "orig_h": orig_h,
+                    "caption": pipeline.captions.get(pos, ""),
+                    "idx": job["idx"]
+                })
                         
-            st.session_state['zip_buffer'] = zip_buf.getvalue()
             st.success("✅ All images processed successfully!")
 
     # DISPLAY SECTION 
     if st.session_state.get('processed_images_data'):
         for item in st.session_state['processed_images_data']:
+            img_bytes = image_store.get(item["digest"], image_session)
+            if img_bytes is None:
+                st.warning(f"⚠️ {item['fname']} is no longer stored (the session was idle too long). Please reprocess the images.")
+                continue
             c1, c2 = st.columns([1, 2])
             with c1:
-                st.image(item["b_img"], caption=item["fname"], use_column_width=True)
+                st.image(img_bytes, caption=item["fname"], use_column_width=True)
             with c2:
                 with st.container(border=True):
                     ow = item.get("orig_w", 0)
@@ -1257,89 +934,151 @@ with t4:
                 
                 st.download_button(
                     label=f"⬇️ Download {item['fname']}",
-                    data=item["b_img"],
+                    data=lambda d=item["digest"]: image_store.get(d, image_session) or b"",
                     file_name=f"resized_{item['fname']}",
                     mime="image/jpeg",
                     key=f"btn_{item['idx']}"
                 )
             st.divider()
             
-        if st.session_state.get('zip_buffer'):
-            st.download_button("⬇️ Download All (ZIP)", st.session_state['zip_buffer'], "klook_images.zip", "application/zip")
+        zip_entries = [(f"resized_{item['fname']}", item["digest"]) for item in st.session_state['processed_images_data']]
+        st.download_button("⬇️ Download All (ZIP)", lambda: image_store.zip_bytes(zip_entries, image_session), "klook_images.zip", "application/zip")
+
+        usage = image_store.session_usage(image_session)
+        totals = image_store.stats()
+        st.caption(
+            f"🗄️ Image store: this session {usage['images']} images, {format_mb(usage['bytes'])} "
+            f"({format_mb(usage['in_memory'])} in memory, {format_mb(usage['on_disk'])} spilled to disk, {usage['shared']} shared). "
+            f"Server: {totals['images']} images across {totals['sessions']} sessions, "
+            f"{format_mb(totals['memory_bytes'])} / {format_mb(totals['memory_budget'])} in memory."
+        )
 
 # --- TAB 5 UI (UPDATED ADVANCED MERCHANT VALIDATOR) ---
 with t5:
     st.header("🛡️ Merchant Risk Assessment")
-    m_url = st.text_input("Merchant Website URL", key="m_url")
-    m_text = st.text_area("About Us / Business Text (Optional)", key="m_text")
+    merchant_mode = st.radio("Merchant Mode", ["Single Merchant", "Bulk (List / CSV)"], horizontal=True, label_visibility="collapsed")
+
+    if merchant_mode == "Single Merchant":
+        m_url = st.text_input("Merchant Website URL", key="m_url")
+        m_text = st.text_area("About Us / Business Text (Optional)", key="m_text")
     
-    if st.button("🔍 Run Risk Audit"):
-        keys = get_all_keys()
-        if not keys: st.error("❌ No Keys"); st.stop()
+        if st.button("🔍 Run Risk Audit"):
+            keys = get_all_keys()
+            if not keys: st.error("❌ No Keys"); st.stop()
         
-        with st.status("🕵️ Auditing Merchant & Checking Categories...", expanded=True) as status:
-            risk_res = validate_merchant_risk(m_text, m_url, keys)
+            with st.status("🕵️ Auditing Merchant & Checking Categories...", expanded=True) as status:
+                risk_res = validate_merchant_risk(m_text, m_url, keys)
             
-            if "error" in risk_res and len(risk_res) == 2: 
-                 status.update(label="❌ Audit Failed!", state="error")
-                 st.error(risk_res["error"])
-            else:
-                 st.session_state['merchant_result'] = risk_res
-                 status.update(label="✅ Audit Complete!", state="complete")
+                if "error" in risk_res and len(risk_res) == 2: 
+                     status.update(label="❌ Audit Failed!", state="error")
+                     st.error(risk_res["error"])
+                else:
+                     st.session_state['merchant_result'] = risk_res
+                     status.update(label="✅ Audit Complete!", state="complete")
 
-    if st.session_state['merchant_result'] and "legitimacy_score" in st.session_state['merchant_result']:
-        res = st.session_state['merchant_result']
-        m_name = res.get('merchant_name', 'Merchant')
-        status_val = res.get('status', 'Unknown')
+        if st.session_state['merchant_result'] and "legitimacy_score" in st.session_state['merchant_result']:
+            res = st.session_state['merchant_result']
+            m_name = res.get('merchant_name', 'Merchant')
+            status_val = res.get('status', 'Unknown')
         
-        # 1. BIG DECISION BANNER
-        if status_val.lower() == 'approved':
-            st.success(f"### ✅ STATUS: APPROVED \n **Reason:** {res.get('status_reason', '')}")
-        else:
-            st.error(f"### ❌ STATUS: REJECTED \n **Reason:** {res.get('status_reason', '')}")
+            # 1. BIG DECISION BANNER
+            if status_val.lower() == 'approved':
+                st.success(f"### ✅ STATUS: APPROVED \n **Reason:** {res.get('status_reason', '')}")
+            else:
+                st.error(f"### ❌ STATUS: REJECTED \n **Reason:** {res.get('status_reason', '')}")
             
-        st.divider()
+            st.divider()
         
-        # 2. SCORE & MERCHANT INFO
-        col1, col2 = st.columns([1, 2])
-        with col1:
-            st.metric("Legitimacy Score", f"{res.get('legitimacy_score', 0)}/100")
-            st.write(f"**Merchant:** {m_name}")
-            st.write(f"**Domain Age:** {res.get('domain_age', 'Unknown')} years")
-        with col2:
-            st.info(f"**Score Breakdown:** \n {res.get('score_reason', 'N/A')}")
+            # 2. SCORE & MERCHANT INFO
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                st.metric("Legitimacy Score", f"{res.get('legitimacy_score', 0)}/100")
+                st.write(f"**Merchant:** {m_name}")
+                st.write(f"**Domain Age:** {res.get('domain_age', 'Unknown')} years")
+            with col2:
+                st.info(f"**Score Breakdown:** \n {res.get('score_reason', 'N/A')}")
             
-            st.write("🌐 **OTA Cross-Check (Google)**")
-            search_query = urllib.parse.quote(f'"{m_name}"')
-            st.link_button("🔵 Find on GetYourGuide", f"https://www.google.com/search?q={search_query}+GetYourGuide")
-            st.link_button("🟢 Find on Viator", f"https://www.google.com/search?q={search_query}+Viator")
+                st.write("🌐 **OTA Cross-Check (Google)**")
+                search_query = urllib.parse.quote(f'"{m_name}"')
+                st.link_button("🔵 Find on GetYourGuide", f"https://www.google.com/search?q={search_query}+GetYourGuide")
+                st.link_button("🟢 Find on Viator", f"https://www.google.com/search?q={search_query}+Viator")
 
-        st.divider()
+            st.divider()
 
-        # 3. CATEGORY TRIANGULATION 
-        st.subheader("📊 Category Extraction")
-        c_pref, c_red, c_other = st.columns(3)
+            # 3. CATEGORY TRIANGULATION 
+            st.subheader("📊 Category Extraction")
+            c_pref, c_red, c_other = st.columns(3)
         
-        with c_pref:
-            st.write("🟢 **Approve Criterias**")
-            items = res.get('preferred_categories_found', [])
-            if items:
-                for c in items: st.success(f"✅ {c}")
-            else: st.caption("None found.")
+            with c_pref:
+                st.write("🟢 **Approve Criterias**")
+                items = res.get('preferred_categories_found', [])
+                if items:
+                    for c in items: st.success(f"✅ {c}")
+                else: st.caption("None found.")
                 
-        with c_red:
-            st.write("🔴 **Reject Criterias**")
-            items = res.get('red_flag_categories_found', [])
-            if items:
-                for c in items: st.error(f"🚩 {c}")
-            else: st.caption("None found.")
+            with c_red:
+                st.write("🔴 **Reject Criterias**")
+                items = res.get('red_flag_categories_found', [])
+                if items:
+                    for c in items: st.error(f"🚩 {c}")
+                else: st.caption("None found.")
                 
-        with c_other:
-            st.write("⚪ **Other Criterias**")
-            items = res.get('other_categories_found', [])
-            if items:
-                for c in items: st.info(f"🔹 {c}")
-            else: st.caption("None found.")
+            with c_other:
+                st.write("⚪ **Other Criterias**")
+                items = res.get('other_categories_found', [])
+                if items:
+                    for c in items: st.info(f"🔹 {c}")
+                else: st.caption("None found.")
+
+    else:
+        st.info("Paste one merchant URL per line, or upload a CSV/TXT sheet (any column holding links is picked up).")
+        mb_text = st.text_area("Merchant Websites", height=150, key="merchant_batch_urls")
+        mb_file = st.file_uploader("Upload CSV / TXT", type=['csv', 'txt'], key="merchant_batch_file")
+        mc1, mc2 = st.columns(2)
+        mb_workers = mc1.slider("Parallel Audits", 1, 16, 8, key="merchant_workers")
+        mb_per_host = mc2.slider("Max Requests per Website", 1, 4, 1, key="merchant_per_host")
+
+        if st.button("🔍 Run Bulk Screening"):
+            keys = get_all_keys()
+            if not keys: st.error("❌ No Keys"); st.stop()
+            mb_urls = parse_url_list(mb_text, mb_file.getvalue() if mb_file else None)
+            if not mb_urls: st.error("❌ No URLs found"); st.stop()
+
+            def audit_one(u, set_stage):
+                res = validate_merchant_risk("", u, keys, set_stage)
+                if res.get("error"):
+                    raise RuntimeError(res["error"])
+                return res
+
+            job = BatchJob(mb_urls, audit_one, max_workers=mb_workers, per_host=mb_per_host, key_func=host_of).start()
+            prog_bar = st.progress(0, text=f"0 / {len(mb_urls)} screened")
+            table_slot = st.empty()
+            finished_count = 0
+            try:
+                while not job.done:
+                    finished_count += len(job.poll(timeout=0.5))
+                    prog_bar.progress(finished_count / len(mb_urls), text=f"{finished_count} / {len(mb_urls)} screened")
+                    table_slot.dataframe(merchant_status_rows(job), use_container_width=True, hide_index=True)
+            finally:
+                job.cancel()
+            prog_bar.progress(1.0, text=f"{len(mb_urls)} / {len(mb_urls)} screened")
+            table_slot.empty()
+
+            st.session_state['merchant_batch_results'] = [
+                merchant_row(u, job.results[i], job.errors[i], job.elapsed[i]) for i, u in enumerate(mb_urls)
+            ]
+
+        if st.session_state['merchant_batch_results']:
+            mb_rows = st.session_state['merchant_batch_results']
+            counts = {s: sum(1 for r in mb_rows if r["Status"] == s) for s in ("Approved", "Rejected", "Failed")}
+            st.success(f"✅ {counts['Approved']} approved · ❌ {counts['Rejected']} rejected · ⚠️ {counts['Failed']} failed (of {len(mb_rows)})")
+            show = st.multiselect("Show", ["Approved", "Rejected", "Failed", "Unknown"], default=["Approved", "Rejected", "Failed", "Unknown"], key="merchant_filter")
+            st.dataframe(
+                [r for r in mb_rows if r["Status"] in show],
+                use_container_width=True, hide_index=True,
+                column_config={"Score": st.column_config.ProgressColumn("Score", min_value=0, max_value=100, format="%d")},
+            )
+            st.download_button("⬇️ Download Screening (CSV)", lambda: rows_to_csv(mb_rows), f"Merchant_Screening_{int(time.time())}.csv", "text/csv")
 
 # --- TAB 6 UI (NEW GRAMMAR CHECKER WITH ERROR LIST) ---
 with t6:
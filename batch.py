@@ -0,0 +1,145 @@
+import csv
+import io
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+URL_PATTERN = re.compile(r"https?://[^\s,;\"'<>]+", re.IGNORECASE)
+
+# --- INPUT PARSING (PLAIN LIST OR CSV) ---
+def parse_url_list(raw_text="", csv_file=None):
+    candidates = []
+    if raw_text:
+        candidates.extend(URL_PATTERN.findall(raw_text))
+
+    if csv_file is not None:
+        content = csv_file.read() if hasattr(csv_file, 'read') else csv_file
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig', 'ignore')
+        for row in csv.reader(io.StringIO(content)):
+            for cell in row:
+                candidates.extend(URL_PATTERN.findall(cell))
+
+    # Keep first occurrence only, preserve sheet order
+    urls = []
+    seen = set()
+    for u in candidates:
+        u = u.strip().rstrip(').')
+        if u and u not in seen:
+            seen.add(u)
+            urls.append(u)
+    return urls
+
+def host_of(url):
+    try:
+        return urllib.parse.urlparse(url).netloc.lower().replace("www.", "")
+    except Exception:
+        return ""
+
+# --- BOUNDED BATCH JOB ---
+# Runs worker(item, set_stage) over items with a global and a per-host cap.
+# Items are only handed to the pool once their host has a free slot, so one
+# slow merchant site cannot park every worker thread.
+# Results land as they finish; the UI calls poll() from the script thread
+# because Streamlit elements must not be touched from worker threads.
+class BatchJob:
+    def __init__(self, items, worker, max_workers=6, per_host=2, key_func=host_of):
+        self.items = list(items)
+        self.worker = worker
+        self.max_workers = max(1, int(max_workers))
+        self.per_host = max(1, int(per_host))
+        self.key_func = key_func
+
+        self.stages = ["Queued"] * len(self.items)
+        self.results = [None] * len(self.items)
+        self.errors = [None] * len(self.items)
+        self.elapsed = [None] * len(self.items)
+
+        self._lock = threading.Lock()
+        self._queue = list(range(len(self.items)))
+        self._host_active = {}
+        self._running = 0
+        self._finished = []
+        self._remaining = len(self.items)
+        self._executor = None
+
+    def _host(self, idx):
+        return self.key_func(self.items[idx]) if self.key_func else ""
+
+    def _run_one(self, idx):
+        def set_stage(label):
+            self.stages[idx] = label
+
+        started = time.time()
+        set_stage("Running")
+        try:
+            self.results[idx] = self.worker(self.items[idx], set_stage)
+            set_stage("Done")
+        except Exception as e:
+            self.errors[idx] = str(e)
+            set_stage("Failed")
+        finally:
+            self.elapsed[idx] = round(time.time() - started, 1)
+        return idx
+
+    def _on_done(self, idx):
+        with self._lock:
+            host = self._host(idx)
+            self._host_active[host] -= 1
+            self._running -= 1
+            self._remaining -= 1
+            self._finished.append(idx)
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            if self._executor is None:
+                return
+            for idx in list(self._queue):
+                if self._running >= self.max_workers:
+                    break
+                host = self._host(idx)
+                if self._host_active.get(host, 0) >= self.per_host:
+                    continue
+                self._queue.remove(idx)
+                self._host_active[host] = self._host_active.get(host, 0) + 1
+                self._running += 1
+                fut = self._executor.submit(self._run_one, idx)
+                fut.add_done_callback(lambda f, i=idx: self._on_done(i))
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch")
+        self._dispatch()
+        return self
+
+    @property
+    def done(self):
+        return self._remaining == 0
+
+    def poll(self, timeout=0.5):
+        deadline = time.time() + timeout
+        while not self._finished and not self.done and time.time() < deadline:
+            time.sleep(0.05)
+        with self._lock:
+            out, self._finished = self._finished, []
+        if self.done and self._executor:
+            self._executor.shutdown(wait=False)
+        return out
+
+    def iter_finished(self, timeout=0.5):
+        while True:
+            for idx in self.poll(timeout):
+                yield idx
+            if self.done:
+                for idx in self.poll(0):
+                    yield idx
+                return
+
+    def cancel(self):
+        with self._lock:
+            self._queue = []
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
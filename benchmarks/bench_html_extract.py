@@ -0,0 +1,93 @@
+# --- BENCHMARK: ONE-PASS PAGE EXTRACTOR VS THE OLD BEAUTIFULSOUP PATH ---
+# Usage: python benchmarks/bench_html_extract.py [page.html ...]
+# Without arguments a synthetic multi-megabyte tour page (inline JS bundles,
+# long itinerary, many images) is generated.
+import os
+import sys
+import time
+import random
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from html_extract import PageExtractor, HAS_LXML
+
+BASE_URL = "https://tours.example.com/products/sunrise-volcano-trek"
+
+def synthetic_page(js_bundles=6, bundle_kb=400, paragraphs=2500, images=60, seed=7):
+    rnd = random.Random(seed)
+    words = "volcano sunrise trek guide pickup hotel breakfast crater summit jeep village temple lake coffee plantation".split()
+    parts = ["<html><head><title>Sunrise Volcano Trek | Example Tours</title>"]
+    for i in range(js_bundles):
+        parts.append("<script>window.__BUNDLE_%d__=\"%s\";</script>" % (i, "x" * (bundle_kb * 1024)))
+    parts.append("<style>.a{color:red}</style></head><body>")
+    for i in range(paragraphs):
+        sentence = " ".join(rnd.choice(words) for _ in range(30))
+        parts.append(f"<div class='day'><h3>Day {i % 5 + 1}</h3><p>{sentence}</p></div>")
+        if i % (paragraphs // images) == 0:
+            parts.append(f"<img data-src='/media/photo_{i}.jpg' srcset='/media/photo_{i}_640.jpg 640w, /media/photo_{i}_1920.jpg 1920w'>")
+            parts.append("<img src='/static/logo.png'>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+# Verbatim copy of the pre-streaming extract_data_from_url parsing path
+def soup_extract(html, url):
+    soup = BeautifulSoup(html, 'html.parser')
+    found_images = []
+    for img in soup.find_all('img'):
+        src = img.get('data-src') or img.get('data-original') or img.get('src')
+        if img.get('srcset'):
+            try:
+                src = img.get('srcset').split(',')[-1].strip().split(' ')[0]
+            except: pass
+        if src:
+            if src.startswith('//'): src = 'https:' + src
+            elif src.startswith('/'): src = urllib.parse.urljoin(url, src)
+            if not any(x in src.lower() for x in ['logo', 'icon', 'avatar', 'svg', 'blank', 'transparent']):
+                if src not in found_images:
+                    found_images.append(src)
+    found_images = found_images[:15]
+    for script in soup(["script", "style", "noscript", "svg"]):
+        script.extract()
+    text = soup.get_text(separator=' \n ')
+    lines = (line.strip() for line in text.splitlines())
+    clean_text = '\n'.join(line for line in lines if line)[:100000]
+    return {"text": clean_text, "images": found_images}
+
+def streamed_extract(raw, url, engine):
+    extractor = PageExtractor(url, engine=engine)
+    for i in range(0, len(raw), 64 * 1024):
+        if extractor.feed(raw[i:i + 64 * 1024]) and len(extractor.images) >= 15:
+            break
+    return extractor.close()
+
+def measure(label, fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        out = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if best is None or elapsed < best[0]:
+            best = (elapsed, peak)
+    print(f"{label:<28} {best[0]:>9.1f} ms   peak {best[1] / 1024 / 1024:>7.1f} MB   text {len(out['text']):>7}   images {len(out['images'])}")
+    return out
+
+def main(paths):
+    pages = [(p, open(p, 'rb').read()) for p in paths] or [("synthetic", synthetic_page().encode('utf-8'))]
+    for name, raw in pages:
+        print(f"\n== {name} ({len(raw) / 1024 / 1024:.1f} MB) ==")
+        ref = measure("beautifulsoup (old)", lambda: soup_extract(raw, BASE_URL))
+        engines = ["html.parser"] + (["lxml"] if HAS_LXML else [])
+        for engine in engines:
+            out = measure(f"streamed {engine}", lambda: streamed_extract(raw, BASE_URL, engine))
+            same_images = out["images"] == ref["images"]
+            same_prefix = out["text"][:2000].split() == ref["text"][:2000].split()
+            print(f"{'':<28} images match: {same_images}   text prefix match: {same_prefix}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,136 @@
+# --- BENCHMARK: DRAFT-DECODE RESIZE VS THE OLD FULL-DECODE PATH ---
+# Usage: python benchmarks/bench_resize.py [photo.jpg ...]
+# Without arguments a synthetic corpus is generated (phone-sized noisy and
+# smooth JPEGs, a panorama, a PNG with alpha). Each case runs in a fresh
+# interpreter so peak RSS is per image; Pillow's pixel buffers are allocated
+# in C and do not show up in tracemalloc.
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageOps, ImageChops, ImageStat
+from image_pipeline import resize_image_klook_standard, ENCODE_PROFILES
+
+def synthetic_corpus(out_dir, seed=11):
+    rnd = random.Random(seed)
+    specs = [("noisy_6000x4000.jpg", (6000, 4000), "noise"), ("smooth_4032x3024.jpg", (4032, 3024), "gradient"),
+             ("portrait_3024x4032.jpg", (3024, 4032), "noise"), ("pano_8000x2000.jpg", (8000, 2000), "gradient"),
+             ("logo_2400x1600.png", (2400, 1600), "alpha")]
+    paths = []
+    for name, size, kind in specs:
+        if kind == "noise":
+            # Low-res noise upscaled: photo-like texture without a 24 MP random buffer
+            small = [Image.effect_noise((size[0] // 8, size[1] // 8), 40 + 10 * c) for c in range(3)]
+            img = Image.merge("RGB", small)
+            img = img.resize(size, Image.Resampling.BICUBIC)
+        elif kind == "gradient":
+            img = Image.linear_gradient("L").resize(size).convert("RGB")
+            img = Image.merge("RGB", [img.getchannel(0), img.getchannel(0).rotate(180), Image.new("L", size, rnd.randint(60, 200))])
+        else:
+            img = Image.new("RGBA", size, (0, 0, 0, 0))
+            img.paste(Image.linear_gradient("L").resize((size[0] // 2, size[1] // 2)).convert("RGBA"), (size[0] // 4, size[1] // 4))
+        path = os.path.join(out_dir, name)
+        img.save(path, quality=90) if name.endswith(".jpg") else img.save(path)
+        paths.append(path)
+    return paths
+
+# Verbatim copy of the pre-draft resize path (full decode, ImageOps.fit, quality 95 + optimize)
+def legacy_resize(data, alignment=(0.5, 0.5)):
+    img = Image.open(io.BytesIO(data))
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[3])
+        img = background
+    else:
+        img = img.convert('RGB')
+    img_resized = ImageOps.fit(img, (1280, 800), method=Image.Resampling.LANCZOS, centering=alignment)
+    buf = io.BytesIO()
+    img_resized.save(buf, format='JPEG', quality=95, subsampling=0, optimize=True)
+    return buf.getvalue()
+
+def psnr(a_bytes, b_bytes):
+    a = Image.open(io.BytesIO(a_bytes)).convert("RGB")
+    b = Image.open(io.BytesIO(b_bytes)).convert("RGB")
+    mse = sum(v ** 2 for v in ImageStat.Stat(ImageChops.difference(a, b)).rms) / 3
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+# VmHWM is reset on exec; ru_maxrss is not, and would report the parent's peak
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Child: one image, one variant ("baseline" only reads the file, to subtract
+# interpreter + import overhead). Prints {"ms", "rss_mb"} as JSON.
+def run_one(path, variant, out_path, repeat=5):
+    with open(path, "rb") as f:
+        data = f.read()
+    best, out = 0.0, b""
+    for _ in range(repeat if variant != "baseline" else 0):
+        started = time.perf_counter()
+        if variant == "legacy":
+            out = legacy_resize(data)
+        else:
+            out, _, _, err = resize_image_klook_standard(data, profile=variant)
+            if err: raise RuntimeError(err)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if not best else min(best, elapsed)
+    with open(out_path, "wb") as f:
+        f.write(out)
+    print(json.dumps({"ms": best, "rss_mb": peak_rss_mb()}))
+
+def measure(path, variant, out_path):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--one", path, variant, out_path],
+                          capture_output=True, text=True, check=True)
+    row = json.loads(proc.stdout.strip().splitlines()[-1])
+    with open(out_path, "rb") as f:
+        row["out"] = f.read()
+    return row
+
+def compare(paths, tmp):
+    variants = ["legacy"] + list(ENCODE_PROFILES)
+    totals = {v: 0.0 for v in variants}
+    for path in paths:
+        with Image.open(path) as img:
+            size = img.size
+        print(f"\n== {os.path.basename(path)} ({size[0]}x{size[1]}, {os.path.getsize(path) / 1024 / 1024:.1f} MB) ==")
+        base_rss = measure(path, "baseline", os.path.join(tmp, "out_baseline.jpg"))["rss_mb"]
+        ref = None
+        for variant in variants:
+            row = measure(path, variant, os.path.join(tmp, f"out_{variant}.jpg"))
+            totals[variant] += row["ms"]
+            if variant == "legacy":
+                ref = row["out"]
+                quality = ""
+            else:
+                quality = f"   PSNR vs legacy {psnr(ref, row['out']):>5.1f} dB"
+            print(f"{variant:<10} {row['ms']:>8.1f} ms   peak +{row['rss_mb'] - base_rss:>6.1f} MB   out {len(row['out']) / 1024:>6.0f} KB{quality}")
+    print("\n== total ==")
+    for variant in variants:
+        print(f"{variant:<10} {totals[variant]:>8.1f} ms   x{totals['legacy'] / totals[variant]:.1f}")
+
+def main(paths):
+    with tempfile.TemporaryDirectory(prefix="bench_resize_") as tmp:
+        compare(paths or synthetic_corpus(tmp), tmp)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--one"]:
+        run_one(*sys.argv[2:5])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,271 @@
+# --- BENCHMARK SUITE: HOT PATHS AGAINST CHECKED-IN FIXTURES ---
+# Usage: python benchmarks/bench_suite.py [--stages scrape,pdf,...] [--save out.json]
+#                                         [--compare benchmarks/baseline.json] [--threshold 0.2]
+# Runs every stage offline: the tour page and photos are served from
+# benchmarks/fixtures by a local HTTP server, and Gemini is replaced by
+# benchmarks/fake_gemini.py (fixed latency, injected 429s). Each stage runs
+# in a fresh interpreter; after setup and one warmup op the peak-RSS mark
+# is reset, so "peak MB" is what the measured ops themselves pushed it to.
+# --compare exits 1 when a stage is slower (ops/s or p95) or heavier (peak
+# RSS) than the baseline by more than --threshold. The baseline is machine
+# specific: regenerate it with --save on the hardware you deploy to.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import threading
+import subprocess
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+STAGE_OPS = {
+    "scrape": 20,
+    "pdf": 10,
+    "resize.small": 20,
+    "resize.medium": 10,
+    "resize.large": 5,
+    "export.pdf": 100,
+    "rotation": 30,
+    "rotation.concurrent": 60,
+}
+ROTATION_THREADS = 8
+ROTATION_KEYS = ["bench-key-1", "bench-key-2", "bench-key-3"]
+
+def fixture(name, mode="rb"):
+    with open(os.path.join(FIXTURES, name), mode) as f:
+        return f.read()
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=FIXTURES, **kwargs)
+
+    def log_message(self, *args):
+        pass
+
+def serve_fixtures():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def vm_hwm_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# "5" resets VmHWM to the current RSS (Linux >= 4.0); elsewhere the peak includes setup
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+# --- STAGES ---
+# Each setup returns op(i) -> None; op raises if the stage produced an error
+def setup_scrape(args):
+    import tour_engine
+    base = serve_fixtures()
+    def op(i):
+        data, err = tour_engine.extract_data_from_url(f"{base}/tour_page.html")
+        if err: raise RuntimeError(err)
+        if not data["images"]: raise RuntimeError("no images kept")
+    return op
+
+def setup_pdf(args):
+    import tour_engine
+    data = fixture("brochure.pdf")
+    def op(i):
+        text, report = tour_engine.extract_text_from_pdf(data)
+        if report is None: raise RuntimeError(text)
+    return op
+
+def setup_resize(name, args):
+    from image_pipeline import resize_image_klook_standard
+    data = fixture(name)
+    def op(i):
+        _, _, _, err = resize_image_klook_standard(data)
+        if err: raise RuntimeError(err)
+    return op
+
+def setup_export(args):
+    from pdf_export import create_pdf, HAS_REPORTLAB
+    if not HAS_REPORTLAB: raise RuntimeError("reportlab is not installed")
+    data = json.loads(fixture("summary.json", "r"))
+    def op(i):
+        if not create_pdf(data): raise RuntimeError("empty PDF")
+    return op
+
+def setup_rotation(args):
+    import tour_engine
+    text = fixture("tour_page.html", "r")[-20000:]
+    def op(i):
+        # A unique prefix per op keeps the response cache out of the measurement
+        result = tour_engine.smart_rotation_wrapper(f"[bench op {i}]\n{text}", ROTATION_KEYS)
+        if result.startswith("⚠️"): raise RuntimeError(result)
+    return op
+
+STAGES = {
+    "scrape": setup_scrape,
+    "pdf": setup_pdf,
+    "resize.small": partial(setup_resize, "photo_small.jpg"),
+    "resize.medium": partial(setup_resize, "photo_medium.jpg"),
+    "resize.large": partial(setup_resize, "photo_large.jpg"),
+    "export.pdf": setup_export,
+    "rotation": setup_rotation,
+    "rotation.concurrent": setup_rotation,
+}
+
+def quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+# Child: one stage, prints {"stage", "ops", "errors", "ops_s", "p50_ms", "p95_ms", "peak_mb"} as JSON
+def run_child(stage, args, tmp):
+    os.environ["GEMINI_CACHE_PATH"] = os.path.join(tmp, "gemini_cache.sqlite3")
+    os.environ["THUMB_CACHE_DIR"] = os.path.join(tmp, "thumbs")
+    # Key budgets are not what is measured here; 429s still cool keys down
+    os.environ["GEMINI_KEY_RPM"] = "100000"
+    os.environ["GEMINI_KEY_MAX_IN_FLIGHT"] = str(ROTATION_THREADS)
+
+    import fake_gemini
+    backend = fake_gemini.install(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4,
+                                  rate_limit_rate=args.rate_limit, retry_hint=args.retry_hint)
+
+    op = STAGES[stage](args)
+    op(-1)  # warmup: imports, pools, model lookup, first cache fill
+    reset_peak_rss()
+    calls_before = backend.stats()
+
+    count = STAGE_OPS[stage]
+    durations, errors = [], []
+    def timed_op(i):
+        started = time.perf_counter()
+        try:
+            op(i)
+        except Exception as e:
+            errors.append(str(e)[:200])
+        durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if stage.endswith(".concurrent"):
+        with ThreadPoolExecutor(max_workers=ROTATION_THREADS) as pool:
+            list(pool.map(timed_op, range(count)))
+    else:
+        for i in range(count):
+            timed_op(i)
+    wall = time.perf_counter() - started
+
+    ordered = sorted(durations)
+    stats = backend.stats()
+    row = {
+        "stage": stage, "ops": count, "errors": len(errors),
+        "ops_s": round(count / wall, 2),
+        "p50_ms": round(quantile(ordered, 0.50) * 1000, 1),
+        "p95_ms": round(quantile(ordered, 0.95) * 1000, 1),
+        "peak_mb": round(vm_hwm_mb(), 1),
+        "gemini_calls": stats["calls"] - calls_before["calls"],
+        "gemini_429s": stats["rate_limited"] - calls_before["rate_limited"],
+    }
+    if errors: row["first_error"] = errors[0]
+    print(json.dumps(row, ensure_ascii=False))
+
+def measure(stage, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", stage,
+           "--latency-ms", str(args.latency_ms), "--rate-limit", str(args.rate_limit), "--retry-hint", str(args.retry_hint)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"stage": stage, "failed": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+# --- BASELINE COMPARISON ---
+# Returns one message per metric that moved the wrong way by more than threshold
+def regressions(rows, baseline, threshold):
+    found = []
+    for row in rows:
+        base = baseline.get(row["stage"])
+        if not base or "failed" in row or "failed" in base: continue
+        if row["ops_s"] < base["ops_s"] * (1 - threshold):
+            found.append(f"{row['stage']}: ops/s {base['ops_s']} -> {row['ops_s']}")
+        if row["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            found.append(f"{row['stage']}: p95 {base['p95_ms']} ms -> {row['p95_ms']} ms")
+        if row["peak_mb"] > base["peak_mb"] * (1 + threshold):
+            found.append(f"{row['stage']}: peak RSS {base['peak_mb']} MB -> {row['peak_mb']} MB")
+    return found
+
+def print_table(rows, baseline):
+    print(f"{'stage':<21} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>8} {'errors':>6} {'429s':>5}  vs baseline")
+    for row in rows:
+        if "failed" in row:
+            print(f"{row['stage']:<21} FAILED: {row['failed']}")
+            continue
+        base = baseline.get(row["stage"])
+        delta = f"ops/s {row['ops_s'] / base['ops_s'] - 1:+.0%}  p95 {row['p95_ms'] / max(base['p95_ms'], 0.1) - 1:+.0%}" if base and "ops_s" in base else ""
+        print(f"{row['stage']:<21} {row['ops_s']:>8.2f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['peak_mb']:>8.1f} "
+              f"{row['errors']:>6} {row['gemini_429s']:>5}  {delta}")
+        if row.get("first_error"):
+            print(f"{'':<21} first error: {row['first_error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the tour summarizer hot paths.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown before failing (default 0.2)")
+    parser.add_argument("--latency-ms", type=float, default=80, help="fake Gemini latency per call")
+    parser.add_argument("--rate-limit", type=float, default=0.1, help="fraction of fake Gemini calls answered with a 429")
+    parser.add_argument("--retry-hint", type=float, default=0.2, help="retry hint (seconds) carried by injected 429s")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Background cache writers may still hold files when the stage ends
+        with tempfile.TemporaryDirectory(prefix="bench_suite_", ignore_cleanup_errors=True) as tmp:
+            run_child(args.child, args, tmp)
+        return 0
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error("unknown stage(s): " + ", ".join(unknown))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {row["stage"]: row for row in json.load(f)["stages"]}
+
+    rows = []
+    for stage in stages:
+        rows.append(measure(stage, args))
+        print(f"  {stage} done", file=sys.stderr)
+    print_table(rows, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "cpus": os.cpu_count(),
+                       "fake_gemini": {"latency_ms": args.latency_ms, "rate_limit": args.rate_limit, "retry_hint": args.retry_hint},
+                       "stages": rows}, f, indent=2)
+        print(f"\nsaved {args.save}")
+
+    failed = [row["stage"] for row in rows if "failed" in row]
+    found = regressions(rows, baseline, args.threshold) if baseline else []
+    for message in found:
+        print(f"REGRESSION {message}")
+    if failed:
+        print("FAILED stages: " + ", ".join(failed))
+    return 1 if found or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# --- LOCAL GEMINI STAND-IN FOR BENCHMARKS ---
+# install() puts a fake "google.generativeai" and "google.ai.generativelanguage"
+# into sys.modules before gemini_clients first touches them (both are lazy
+# imports there), so every call site runs unchanged against canned answers.
+# The real client talks gRPC, so an in-process module is the only local
+# backend that does not need a patched transport. Each call sleeps latency_ms +/- jitter_ms and
+# fails with a ResourceExhausted "429 ... Please retry in Ns" at
+# rate_limit_rate, like the real quota errors.
+import os
+import sys
+import json
+import time
+import types
+import random
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_PATH = os.path.join(HERE, "fixtures", "summary.json")
+MODEL_NAME = "models/gemini-2.5-flash"
+STREAM_CHUNK = 64
+
+MERCHANT = {"merchant_name": "Example Tours", "legitimacy_score": 82, "preferred_categories_found": ["Tours"],
+            "red_flag_categories_found": [], "risk_reason": "Established operator", "status": "Approved"}
+GRAMMAR = {"corrected_text": "Corrected text.", "errors_found": []}
+CAPTION = "Sunrise over the crater rim"
+
+# Same class name as google.api_core's, which is what is_rate_limit_error checks
+class ResourceExhausted(Exception):
+    pass
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeBackend:
+    def __init__(self, latency_ms=400, jitter_ms=100, rate_limit_rate=0.0, retry_hint=1.0, seed=21):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_hint = retry_hint
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.calls_per_key = {}
+        with open(SUMMARY_PATH, encoding="utf-8") as f:
+            self.summary = f.read()
+
+    def _roll(self, key):
+        with self._lock:
+            self.calls += 1
+            self.calls_per_key[key] = self.calls_per_key.get(key, 0) + 1
+            delay = max(0.0, self.latency_ms + self._rnd.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            limited = self._rnd.random() < self.rate_limit_rate
+            if limited: self.rate_limited += 1
+        return delay, limited
+
+    def answer(self, prompt):
+        text = prompt if isinstance(prompt, str) else " ".join(str(p) for p in prompt if isinstance(p, str))
+        if "corrected_text" in text: return json.dumps(GRAMMAR)
+        if "legitimacy_score" in text: return json.dumps(MERCHANT)
+        if "caption" in text.lower(): return CAPTION
+        return self.summary
+
+    def generate(self, key, prompt, stream=False):
+        delay, limited = self._roll(key)
+        # A 429 comes back fast; only successful generations pay the full latency
+        time.sleep(delay / 10 if limited else delay)
+        if limited:
+            raise ResourceExhausted(f"429 Resource has been exhausted (e.g. check quota). Please retry in {self.retry_hint}s.")
+        text = self.answer(prompt)
+        if stream:
+            return [FakeResponse(text[i:i + STREAM_CHUNK]) for i in range(0, len(text), STREAM_CHUNK)]
+        return FakeResponse(text)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "rate_limited": self.rate_limited, "calls_per_key": dict(self.calls_per_key)}
+
+class ServiceClient:
+    def __init__(self, client_options=None, **kwargs):
+        self.api_key = (client_options or {}).get("api_key")
+
+def _no_global_config(**kwargs):
+    raise RuntimeError("genai.configure is process-global; use the per-key client pool")
+
+def install(**options):
+    backend = FakeBackend(**options)
+
+    # Like the real model, answers with whatever client (and so key) it was bound to
+    class GenerativeModel:
+        def __init__(self, model_name, generation_config=None, **kwargs):
+            self.model_name = model_name
+            self.generation_config = generation_config
+            self._client = None
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            if self._client is None:
+                raise RuntimeError("model has no client bound")
+            return backend.generate(self._client.api_key, prompt, stream=stream)
+
+    def list_models(client=None, **kwargs):
+        if client is None:
+            raise RuntimeError("list_models needs a client")
+        return [types.SimpleNamespace(name=MODEL_NAME, supported_generation_methods=["generateContent"])]
+
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = _no_global_config
+    genai.list_models = list_models
+    genai.GenerativeModel = GenerativeModel
+    genai.backend = backend
+    glm = types.ModuleType("google.ai.generativelanguage")
+    glm.GenerativeServiceClient = type("GenerativeServiceClient", (ServiceClient,), {})
+    glm.ModelServiceClient = type("ModelServiceClient", (ServiceClient,), {})
+    sys.modules["google.generativeai"] = genai
+    sys.modules["google.ai.generativelanguage"] = glm
+    return backend
@@ -0,0 +1,99 @@
+# --- BENCHMARK FIXTURES ---
+# Regenerates the checked-in fixtures deterministically:
+#   python benchmarks/fixtures/make_fixtures.py
+# tour_page.html   saved-style tour page: JSON-LD, inline JS bundle, itinerary, <img> tags
+# brochure.pdf     24-page text brochure (reportlab)
+# photo_*.jpg      small / medium / large photos (800x600, 2048x1365, 4032x3024)
+# summary.json     a complete summary, as the model returns it, for the PDF export
+import os
+import json
+import random
+
+from PIL import Image, ImageFilter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORDS = ("volcano sunrise trek guide pickup hotel breakfast crater summit jeep village temple lake coffee "
+         "plantation waterfall rice terrace sunset beach snorkel market lunch dinner transfer").split()
+
+PHOTOS = {"photo_small.jpg": (800, 600), "photo_medium.jpg": (2048, 1365), "photo_large.jpg": (4032, 3024)}
+
+def sentence(rnd, n=24):
+    return " ".join(rnd.choice(WORDS) for _ in range(n)).capitalize()
+
+def make_page(rnd):
+    ld = {
+        "@context": "https://schema.org", "@type": "Product", "name": "Mount Batur Sunrise Trek with Breakfast",
+        "image": ["/photo_large.jpg"],
+        "offers": {"@type": "Offer", "price": "45.00", "priceCurrency": "USD"},
+    }
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Mount Batur Sunrise Trek | Example Tours</title>",
+        f"<script type='application/ld+json'>{json.dumps(ld)}</script>",
+        "<script>window.__APP_STATE__=\"%s\";</script>" % ("x" * 120000),
+        "<style>.day{margin:0}</style></head><body><nav><img src='/static/logo.png'></nav>",
+        "<h1>Mount Batur Sunrise Trek with Breakfast</h1>",
+    ]
+    for name in PHOTOS:
+        parts.append(f"<img src='/{name}' alt='trek'>")
+    for day in range(1, 4):
+        parts.append(f"<h2>Day {day}</h2>")
+        for _ in range(40):
+            parts.append(f"<div class='day'><p>{sentence(rnd)}.</p></div>")
+    parts.append("<h2>Inclusions</h2><ul><li>Hotel pickup</li><li>Breakfast</li><li>Guide</li></ul>")
+    parts.append("<h2>FAQ</h2>" + "".join(f"<p>{sentence(rnd, 12)}?</p>" for _ in range(20)))
+    parts.append("</body></html>")
+    with open(os.path.join(HERE, "tour_page.html"), "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+def make_brochure(rnd, pages=24):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(os.path.join(HERE, "brochure.pdf"), pagesize=A4, invariant=1)
+    for page in range(pages):
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(40, 800, f"Day {page % 6 + 1} - Highlights and itinerary (page {page + 1})")
+        c.setFont("Helvetica", 10)
+        for line in range(44):
+            c.drawString(40, 770 - line * 16, sentence(rnd, 14))
+        c.showPage()
+    c.save()
+
+def make_photos(rnd):
+    for name, size in PHOTOS.items():
+        # Smooth gradients plus blurred noise: compresses like a real photo, not like static
+        base = Image.merge("RGB", [Image.linear_gradient("L").rotate(a).resize(size) for a in (0, 90, 180)])
+        noise = Image.effect_noise((size[0] // 4, size[1] // 4), 50).resize(size).filter(ImageFilter.GaussianBlur(2)).convert("RGB")
+        Image.blend(base, noise, 0.35).save(os.path.join(HERE, name), quality=85)
+
+def make_summary():
+    summary = {
+        "basic_info": {
+            "city_country": "Bali, Indonesia", "group_type": "Join-in", "min_pax": "1", "max_pax": "12", "duration": "8 hours",
+            "main_attractions": "Mount Batur Sunrise Trek",
+            "highlights": ["Watch the sunrise paint the sky from the summit of Mount Batur"] * 4,
+            "what_to_expect": " ".join(["Start"] + [WORDS[i % len(WORDS)] for i in range(109)]),
+            "selling_points": ["Nature", "Guided", "Sunrise", "Volcano"],
+        },
+        "klook_itinerary": {
+            "start": {"time": "02:00", "location": "Hotel lobby"},
+            "segments": [{"type": "Attraction", "time": f"0{h}:00", "name": f"Stop {h}", "details": "Short break", "location_search": "Mount Batur", "ticket_status": "Included"} for h in range(3, 9)],
+            "end": {"time": "10:00", "location": "Hotel lobby"},
+        },
+        "policies": {"cancellation": "Free cancellation up to 24 hours before", "merchant_contact": "+62-361-000-000"},
+        "inclusions": {"included": ["Hotel pickup", "Breakfast", "Guide"], "excluded": ["Tips"]},
+        "restrictions": {"child_policy": "Ages 6 and up", "accessibility": "Not wheelchair accessible", "faq": ["Bring a jacket"]},
+        "seo": {"keywords": ["mount batur", "sunrise trek"]},
+        "pricing": {"details": "USD 45", "currency": "USD", "adult_price": 45.0, "child_price": 30.0, "infant_price": 0.0, "child_age": "4-11"},
+        "analysis": {"ota_search_term": "Mount Batur sunrise trek"},
+    }
+    with open(os.path.join(HERE, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    rnd = random.Random(21)
+    make_page(rnd)
+    make_brochure(rnd)
+    make_photos(rnd)
+    make_summary()
+    for name in sorted(os.listdir(HERE)):
+        print(f"{name:<20} {os.path.getsize(os.path.join(HERE, name)) / 1024:>8.0f} KB")
@@ -0,0 +1,176 @@
+# --- HEADLESS BATCH RUNNER ---
+# Runs the same scrape / PDF / summarize / merchant-audit logic as the app,
+# without a browser, and streams one JSON line per input.
+#
+#   python cli.py summarize links.csv brochure.pdf https://... --out results.jsonl
+#   python cli.py merchant merchants.txt --out audits.jsonl --workers 8
+#
+# Inputs can be URLs, PDF paths, TXT/CSV files holding links, or "-" for
+# stdin. Keys come from --keys, GEMINI_KEYS / GEMINI_API_KEY in the
+# environment, or .streamlit/secrets.toml. The output file doubles as the
+# checkpoint: re-running the same command skips inputs that already have a
+# successful line and retries the rest.
+import os
+import sys
+import json
+import time
+import argparse
+
+import perf
+import tour_engine
+from batch import BatchJob, parse_url_list, host_of
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+DEFAULT_SECRETS = os.path.join(".streamlit", "secrets.toml")
+
+# --- INPUTS ---
+def is_pdf(item):
+    return item.lower().endswith(".pdf") and not item.lower().startswith(("http://", "https://"))
+
+def collect_inputs(args):
+    items = []
+    for arg in args:
+        if arg == "-":
+            items.extend(parse_url_list(sys.stdin.read()))
+        elif is_pdf(arg):
+            items.append(os.path.abspath(arg))
+        elif os.path.isfile(arg):
+            with open(arg, "rb") as f:
+                items.extend(parse_url_list(csv_file=f.read()))
+        else:
+            items.extend(parse_url_list(arg))
+    seen = set()
+    return [i for i in items if not (i in seen or seen.add(i))]
+
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try: record = json.loads(line)
+            except ValueError: continue  # torn last line from a killed run
+            if record.get("ok"): done.add(record.get("input"))
+    return done
+
+# --- WORKERS (RUN IN BatchJob THREADS) ---
+def summarize_item(item, keys, lang, pages, set_stage):
+    if is_pdf(item):
+        set_stage("Reading PDF")
+        with open(item, "rb") as f:
+            text, report = tour_engine.extract_text_from_pdf(f, pages)
+        if report is None:
+            raise RuntimeError(text)
+        set_stage("Summarizing")
+        result, plan = tour_engine.summarize_document(text, keys, lang)
+        if tour_engine.summary_failed(result):
+            raise RuntimeError(result)
+        return {"result": result, "tokens": plan["total_request_tokens"], "requests": len(plan["chunks"]),
+                "pages_read": len(report["pages"]), "page_count": report["page_count"]}
+    return tour_engine.summarize_link_job(item, keys, lang, set_stage)
+
+def merchant_item(item, keys, set_stage):
+    res = tour_engine.validate_merchant_risk("", item, keys, set_stage)
+    if res.get("error"):
+        raise RuntimeError(res["error"])
+    return {"result": res}
+
+def to_record(item, job, i):
+    res = job.results[i] or {}
+    record = {"input": item, "ok": job.errors[i] is None, "error": job.errors[i], "seconds": job.elapsed[i]}
+    for k, v in res.items():
+        if k == "text": continue  # source text is bulky and reproducible
+        if k == "result" and isinstance(v, str):
+            try: v = json.loads(v)
+            except ValueError: pass
+        record[k] = v
+    return record
+
+def print_perf_table():
+    rows, counters = perf.snapshot()
+    print(f"\n{'stage':<26}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=sys.stderr)
+    for r in rows:
+        print(f"{r['stage']:<26}{r['count']:>7}{r['errors']:>5}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}", file=sys.stderr)
+    for name, n in sorted(counters.items()):
+        print(f"{name:<26}{n:>7}", file=sys.stderr)
+
+# --- MAIN ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless Klook summarizer / merchant screener")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("summarize", "Summarize tour links and PDF brochures"), ("merchant", "Screen merchant websites")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("inputs", nargs="+", help="URLs, PDF paths, TXT/CSV link lists, or - for stdin")
+        p.add_argument("--out", default=f"{name}_results.jsonl", help="JSONL output, also used to resume")
+        p.add_argument("--workers", type=int, default=6, help="Inputs processed in parallel")
+        p.add_argument("--per-host", type=int, default=2, help="Max parallel requests per website")
+        p.add_argument("--keys", help="Comma-separated Gemini keys (default: env / secrets.toml)")
+        p.add_argument("--secrets", default=DEFAULT_SECRETS, help="Streamlit secrets.toml to read keys and settings from")
+        p.add_argument("--restart", action="store_true", help="Ignore and overwrite existing results")
+        p.add_argument("--perf", action="store_true", help="Log every timed stage as JSON to stderr and print p50/p95/p99 at the end")
+        if name == "summarize":
+            p.add_argument("--lang", default="English", help="Output language")
+            p.add_argument("--pages", default="", help="PDF page ranges, e.g. '1-5, 8'")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.perf:
+        perf.enable_logging(sys.stderr)
+
+    settings = {}
+    if os.path.exists(args.secrets) and tomllib is not None:
+        with open(args.secrets, "rb") as f:
+            settings = tomllib.load(f)
+    if args.keys:
+        settings["GEMINI_KEYS"] = args.keys
+    tour_engine.configure(settings)
+    keys = tour_engine.get_all_keys()
+    if not keys:
+        print("No Gemini keys: pass --keys, set GEMINI_KEYS or add them to secrets.toml", file=sys.stderr)
+        return 2
+
+    items = collect_inputs(args.inputs)
+    done = set() if args.restart else load_checkpoint(args.out)
+    pending = [i for i in items if i not in done]
+    print(f"{len(items)} inputs, {len(items) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+    if not pending:
+        return 0
+
+    # Every key's model list in one concurrent round instead of on each key's first item
+    tour_engine.warm_up_keys(keys)
+    if args.command == "summarize":
+        worker = lambda item, set_stage: summarize_item(item, keys, args.lang, args.pages, set_stage)
+    else:
+        worker = lambda item, set_stage: merchant_item(item, keys, set_stage)
+    job = BatchJob(pending, worker, max_workers=args.workers, per_host=args.per_host,
+                   key_func=lambda item: item if is_pdf(item) else host_of(item))
+
+    started = time.time()
+    failed = 0
+    with open(args.out, "w" if args.restart else "a", encoding="utf-8") as out:
+        job.start()
+        try:
+            for n, i in enumerate(job.iter_finished(), 1):
+                record = to_record(pending[i], job, i)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                failed += not record["ok"]
+                status = "ok  " if record["ok"] else "FAIL"
+                print(f"[{n}/{len(pending)}] {status} {record['seconds']}s {pending[i]}" + ("" if record["ok"] else f"  {str(record['error'])[:120]}"), file=sys.stderr)
+        except KeyboardInterrupt:
+            job.cancel()
+            print("Interrupted; re-run the same command to resume.", file=sys.stderr)
+            return 130
+
+    print(f"Done in {time.time() - started:.1f}s: {len(pending) - failed} ok, {failed} failed -> {args.out}", file=sys.stderr)
+    if args.perf:
+        print_perf_table()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
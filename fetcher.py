@@ -0,0 +1,181 @@
+import ssl
+import threading
+import urllib.parse
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.poolmanager import PoolManager
+from urllib3.util.retry import Retry
+
+from lazy_deps import lazy, available
+
+# cloudscraper pulls in its own stack; only load it when a scrape needs it
+cloudscraper = lazy("cloudscraper")
+HAS_CLOUDSCRAPER = available("cloudscraper")
+
+TLS_DEFAULT = "default"
+TLS_LEGACY = "legacy"
+
+DEFAULT_TIMEOUT = (10, 30)  # (connect, read)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_SESSIONS = 64  # least recently used sessions past this are closed
+
+# --- CUSTOM SSL ADAPTER ---
+# Old operator sites still negotiate weak ciphers; SECLEVEL=1 lets us talk to them.
+class LegacySSLAdapter(HTTPAdapter):
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        ctx = ssl.create_default_context()
+        ctx.set_ciphers('DEFAULT@SECLEVEL=1')
+        self.poolmanager = PoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            ssl_context=ctx,
+            **pool_kwargs
+        )
+
+# cloudscraper's own https adapter carries the browser cipher suite its clearance
+# depends on; rebuild it with our pool size instead of replacing it
+def _cloudscraper_adapter(session, tls_profile, **pool_kwargs):
+    adapter = cloudscraper.CipherSuiteAdapter(
+        cipherSuite=session.cipherSuite,
+        ecdhCurve=session.ecdhCurve,
+        server_hostname=session.server_hostname,
+        source_address=session.source_address,
+        ssl_context=session.ssl_context,
+        **pool_kwargs
+    )
+    if tls_profile == TLS_LEGACY:
+        # the pool manager holds this same context, so new connections pick it up
+        adapter.ssl_context.set_ciphers(session.cipherSuite + ':@SECLEVEL=1')
+    return adapter
+
+def _retry_policy(retries, backoff, statuses=RETRY_STATUSES):
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=statuses,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+# --- SHARED POOLED FETCHER ---
+# One long-lived session per (host, TLS profile, client) so keep-alive
+# connections, TLS sessions and cloudscraper clearance cookies are reused.
+# Every request to a host also takes a slot from that host's semaphore,
+# which matches the adapter pool size, so a host never sees more than
+# max_per_host concurrent connections from this process. A run over
+# thousands of hosts keeps only the max_sessions most recently used
+# sessions open, and a host's slot is dropped once no request holds it.
+class HttpFetcher:
+    def __init__(self, max_per_host=4, timeout=DEFAULT_TIMEOUT, retries=2, backoff=0.5, max_sessions=MAX_SESSIONS):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._host_slots = {}  # host -> [semaphore, requests holding or waiting]
+
+    def _build_session(self, tls_profile, client, retries):
+        use_scraper = client == "cloudscraper" and HAS_CLOUDSCRAPER
+        # Cloudflare answers its JS challenge with a 503; leave that for cloudscraper to solve
+        statuses = tuple(c for c in RETRY_STATUSES if c != 503) if use_scraper else RETRY_STATUSES
+        pool_kwargs = dict(
+            pool_connections=1,
+            pool_maxsize=self.max_per_host,
+            pool_block=True,
+            max_retries=_retry_policy(retries, self.backoff, statuses),
+        )
+        if use_scraper:
+            session = cloudscraper.create_scraper(
+                browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+            )
+            https_adapter = _cloudscraper_adapter(session, tls_profile, **pool_kwargs)
+        else:
+            session = requests.Session()
+            https_adapter = (LegacySSLAdapter if tls_profile == TLS_LEGACY else HTTPAdapter)(**pool_kwargs)
+
+        session.mount('https://', https_adapter)
+        session.mount('http://', HTTPAdapter(**pool_kwargs))
+        return session
+
+    # retries: None for the fetcher default; 0 for callers working to a deadline,
+    # where 3 attempts x timeout would overrun it
+    def session(self, host, tls_profile=TLS_DEFAULT, client="requests", retries=None):
+        retries = self.retries if retries is None else retries
+        cache_key = (host, tls_profile, client, retries)
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(cache_key)
+            if session is None:
+                session = self._build_session(tls_profile, client, retries)
+                self._sessions[cache_key] = session
+                while len(self._sessions) > self.max_sessions:
+                    evicted.append(self._sessions.popitem(last=False)[1])
+            else:
+                self._sessions.move_to_end(cache_key)
+        for old in evicted:
+            try: old.close()
+            except Exception: pass
+        return session
+
+    @contextmanager
+    def _slot(self, host):
+        with self._lock:
+            entry = self._host_slots.get(host)
+            if entry is None:
+                entry = self._host_slots[host] = [threading.BoundedSemaphore(self.max_per_host), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0: del self._host_slots[host]
+
+    def get(self, url, headers=None, timeout=None, tls_profile=TLS_DEFAULT, client="requests", retries=None, **kwargs):
+        host = urllib.parse.urlparse(url).netloc.lower()
+        session = self.session(host, tls_profile, client, retries)
+        with self._slot(host):
+            return session.get(url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for s in sessions:
+            try: s.close()
+            except Exception: pass
+
+# --- BYTE-CAPPED BODY READER ---
+# Use with get(..., stream=True). Yields raw chunks until the body ends or
+# max_bytes is reached; the caller may stop early and must close the response.
+def read_capped(response, max_bytes, chunk_size=64 * 1024):
+    received = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if not chunk: continue
+        remaining = max_bytes - received
+        if remaining <= 0: break
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+        received += len(chunk)
+        yield chunk
+        if received >= max_bytes: break
+
+_shared_fetcher = None
+_shared_lock = threading.Lock()
+
+def get_fetcher():
+    global _shared_fetcher
+    with _shared_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = HttpFetcher()
+        return _shared_fetcher
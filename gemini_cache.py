@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "gemini_cache.sqlite3")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# --- KEY BUILDING ---
+def normalize_text(text):
+    if not text: return ""
+    text = unicodedata.normalize('NFKC', str(text))
+    return " ".join(text.split())
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'ignore')
+    return hashlib.sha256(data).hexdigest()
+
+# kind + prompt template version + model + language + normalized input (or a hash of raw bytes)
+def make_key(kind, version, model, lang, payload):
+    if isinstance(payload, (bytes, bytearray)):
+        body = "sha256:" + content_hash(bytes(payload))
+    else:
+        body = normalize_text(payload)
+    parts = json.dumps([kind, version, model or "", lang or "", body], ensure_ascii=False)
+    return content_hash(parts)
+
+# --- ON-DISK LRU CACHE (SQLITE) ---
+# Survives restarts/redeploys, capped by total value size with least-recently-used
+# eviction, per-entry TTL, and hit/miss counters per kind (in process memory).
+class GeminiCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, kind, field):
+        with self._stats_lock:
+            row = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "writes": 0, "evictions": 0})
+            row[field] += 1
+
+    def get(self, kind, key):
+        try:
+            conn = self._conn()
+            now = time.time()
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(kind, "misses")
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.commit()
+                self._count(kind, "misses")
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._count(kind, "hits")
+            return value
+        except sqlite3.Error:
+            self._count(kind, "misses")
+            return None
+
+    def set(self, kind, key, value, ttl):
+        if value is None: return
+        try:
+            conn = self._conn()
+            now = time.time()
+            size = len(value.encode('utf-8', 'ignore'))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, value, size, now, now + ttl, now),
+            )
+            conn.commit()
+            self._count(kind, "writes")
+            self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            conn.commit()
+            return
+        # Trim to 90% of the cap so we don't evict on every single write
+        target = int(self.max_bytes * 0.9)
+        for key, kind, size in conn.execute("SELECT key, kind, size FROM entries ORDER BY last_access ASC").fetchall():
+            if total <= target: break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self._count(kind, "evictions")
+        conn.commit()
+
+    def stats(self):
+        with self._stats_lock:
+            counters = {k: dict(v) for k, v in self._stats.items()}
+        try:
+            rows = self._conn().execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind").fetchall()
+        except sqlite3.Error:
+            rows = []
+        for kind, entries, size in rows:
+            row = counters.setdefault(kind, {"hits": 0, "misses": 0, "writes": 0, "evictions": 0})
+            row["entries"] = entries
+            row["bytes"] = size
+        return counters
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.commit()
+        conn.execute("VACUUM")
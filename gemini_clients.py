@@ -0,0 +1,65 @@
+import json
+import threading
+
+from lazy_deps import lazy
+
+genai = lazy("google.generativeai")
+glm = lazy("google.ai.generativelanguage")
+
+# --- PER-KEY GEMINI CLIENT POOL ---
+# genai.configure(api_key=...) swaps the key for the whole process, so two
+# sessions rotating keys on different threads could send a request with the
+# other one's key. Instead every key gets its own GenerativeServiceClient
+# (and ModelServiceClient for list_models), built once with the key in its
+# client_options, and every (key, model, generation_config) gets one
+# GenerativeModel bound to that client. Clients and models are safe to share
+# between threads, so calls on any keys run in parallel without touching
+# global state.
+class GeminiClientPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generative = {}  # key -> GenerativeServiceClient
+        self._model_service = {}  # key -> ModelServiceClient
+        self._models = {}  # (key, model_name, config json) -> GenerativeModel
+
+    def _client(self, clients, cls_name, key):
+        with self._lock:
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = getattr(glm, cls_name)(client_options={"api_key": key})
+            return client
+
+    def generative_client(self, key):
+        return self._client(self._generative, "GenerativeServiceClient", key)
+
+    def model_client(self, key):
+        return self._client(self._model_service, "ModelServiceClient", key)
+
+    def model(self, key, model_name, generation_config=None):
+        slot = (key, model_name, json.dumps(generation_config, sort_keys=True) if generation_config else "")
+        with self._lock:
+            model = self._models.get(slot)
+        if model is not None:
+            return model
+        client = self.generative_client(key)
+        model = genai.GenerativeModel(model_name, generation_config=generation_config)
+        model._client = client  # what genai would fill in from the global default client
+        with self._lock:
+            return self._models.setdefault(slot, model)
+
+    def list_models(self, key):
+        return list(genai.list_models(client=self.model_client(key)))
+
+    # Drop the clients of keys that were removed from the settings
+    def retain(self, keys):
+        keep = set(keys)
+        with self._lock:
+            for clients in (self._generative, self._model_service):
+                for key in [k for k in clients if k not in keep]:
+                    del clients[key]
+            for slot in [s for s in self._models if s[0] not in keep]:
+                del self._models[slot]
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._generative), "models": len(self._models)}
@@ -0,0 +1,236 @@
+import re
+import codecs
+import urllib.parse
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+SKIP_TAGS = {"script", "style", "noscript", "svg"}
+IMAGE_BLACKLIST = ['logo', 'icon', 'avatar', 'svg', 'blank', 'transparent']
+DEFAULT_TEXT_BUDGET = 100000
+DEFAULT_MAX_IMAGES = 15
+MAX_LD_JSON_BLOCKS = 20
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w-]+)""", re.IGNORECASE)
+_IMG_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_ATTR = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+
+# --- ENCODING SNIFFING (HEADER, THEN <meta charset>, THEN UTF-8) ---
+def sniff_encoding(content_type, head_bytes):
+    if content_type and "charset=" in content_type.lower():
+        enc = content_type.lower().split("charset=")[-1].split(";")[0].strip().strip('"\'')
+        try:
+            codecs.lookup(enc)
+            return enc
+        except LookupError:
+            pass
+    m = _META_CHARSET.search(head_bytes[:4096] if head_bytes else b"")
+    if m:
+        enc = m.group(1).decode('ascii', 'ignore')
+        try:
+            codecs.lookup(enc)
+            return enc
+        except LookupError:
+            pass
+    return "utf-8"
+
+# --- IMAGE CANDIDATE NORMALIZATION (SAME RULES AS THE OLD SOUP LOOP) ---
+def pick_image_src(attrs, base_url):
+    src = attrs.get('data-src') or attrs.get('data-original') or attrs.get('src')
+    if attrs.get('srcset'):
+        try:
+            src = attrs.get('srcset').split(',')[-1].strip().split(' ')[0]
+        except Exception: pass
+    if not src:
+        return None
+    if src.startswith('//'): src = 'https:' + src
+    elif src.startswith('/'): src = urllib.parse.urljoin(base_url, src)
+    if any(x in src.lower() for x in IMAGE_BLACKLIST):
+        return None
+    return src
+
+# --- ONE-PASS PAGE EXTRACTOR ---
+# Collects visible text and <img> candidates while the document is fed in
+# chunks. feed() returns True once the text budget is full so the caller can
+# stop downloading; images in the unread tail are then picked up by a cheap
+# regex scan instead of a full parse.
+class PageExtractor:
+    def __init__(self, base_url, text_budget=DEFAULT_TEXT_BUDGET, max_images=DEFAULT_MAX_IMAGES, engine=None):
+        self.base_url = base_url
+        self.text_budget = text_budget
+        self.max_images = max_images
+        self.engine = engine or ("lxml" if HAS_LXML else "html.parser")
+        self.lines = []
+        self.text_chars = 0
+        self.images = []
+        self._seen_images = set()
+        self._skip_depth = 0
+        self._decoder = None
+        self._full = False
+        self._tail = []
+        self._pending = []
+
+        # Structured data (schema.org JSON-LD, OpenGraph/meta, microdata) is read in the
+        # same pass, before <script> bodies are thrown away with the rest of the markup
+        self.ld_json = []
+        self.meta = {}
+        self.microdata = []
+        self._ld_buf = None
+        self._itemprop_stack = []
+
+        if self.engine == "lxml":
+            self._parser = etree.HTMLParser(target=_LxmlTarget(self), recover=True, no_network=True)
+        else:
+            self._parser = _StdlibParser(self)
+
+    # --- callbacks shared by both engines ---
+    def _start(self, tag, attrs):
+        self._flush()
+        tag = tag.lower()
+        if tag == "script" and "ld+json" in attrs.get("type", "").lower() and len(self.ld_json) < MAX_LD_JSON_BLOCKS:
+            self._ld_buf = []
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "img" and len(self.images) < self.max_images:
+            self._add_image(attrs)
+        if tag == "meta":
+            name = (attrs.get("property") or attrs.get("name") or "").lower()
+            if name and attrs.get("content") and name not in self.meta:
+                self.meta[name] = attrs["content"]
+        prop = attrs.get("itemprop")
+        if prop:
+            value = attrs.get("content") or attrs.get("datetime") or attrs.get("href") or (attrs.get("src") if tag == "img" else None)
+            if value is not None or tag in ("meta", "link", "img"):
+                self.microdata.append((prop, value or ""))
+            else:
+                self._itemprop_stack.append([tag, prop, []])
+
+    def _end(self, tag):
+        self._flush()
+        tag = tag.lower()
+        if tag == "script" and self._ld_buf is not None:
+            self.ld_json.append("".join(self._ld_buf))
+            self._ld_buf = None
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if self._itemprop_stack and self._itemprop_stack[-1][0] == tag:
+            _, prop, parts = self._itemprop_stack.pop()
+            value = " ".join(" ".join(parts).split())
+            if value: self.microdata.append((prop, value[:500]))
+
+    def _data(self, text):
+        if self._ld_buf is not None:
+            self._ld_buf.append(text)
+        if self._itemprop_stack and not self._skip_depth:
+            self._itemprop_stack[-1][2].append(text)
+        # Parsers split one text node at entity refs and chunk edges; join before splitting lines
+        if not self._skip_depth and not self._full:
+            self._pending.append(text)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line: continue
+            self.lines.append(line)
+            self.text_chars += len(line) + 1
+            if self.text_chars >= self.text_budget:
+                self._full = True
+                return
+
+    def _add_image(self, attrs):
+        src = pick_image_src(attrs, self.base_url)
+        if src and src not in self._seen_images:
+            self._seen_images.add(src)
+            self.images.append(src)
+
+    @property
+    def full(self):
+        return self._full
+
+    def feed(self, chunk, encoding="utf-8"):
+        if isinstance(chunk, bytes):
+            if self._decoder is None:
+                self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            chunk = self._decoder.decode(chunk)
+        if self._full:
+            # Text is done; keep the raw tail only for the image regex scan
+            if len(self.images) < self.max_images:
+                self._tail.append(chunk)
+            return True
+        self._parser.feed(chunk)
+        return self._full
+
+    def close(self):
+        if not self._full:
+            try: self._parser.close()
+            except Exception: pass
+            self._flush()
+        if self._tail and len(self.images) < self.max_images:
+            for tag in _IMG_TAG.findall("".join(self._tail)):
+                if len(self.images) >= self.max_images: break
+                attrs = {}
+                for name, v1, v2, v3 in _ATTR.findall(tag):
+                    attrs[name.lower()] = v1 or v2 or v3
+                self._add_image(attrs)
+        text = "\n".join(self.lines)[:self.text_budget]
+        return {
+            "url": self.base_url,
+            "text": text,
+            "images": self.images[:self.max_images],
+            "ld_json": self.ld_json,
+            "meta": self.meta,
+            "microdata": self.microdata,
+        }
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, owner):
+        super().__init__(convert_charrefs=True)
+        self.owner = owner
+
+    def handle_starttag(self, tag, attrs):
+        self.owner._start(tag, {k.lower(): (v or "") for k, v in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag.lower() in SKIP_TAGS:
+            self.owner._end(tag)
+
+    def handle_endtag(self, tag):
+        self.owner._end(tag)
+
+    def handle_data(self, data):
+        self.owner._data(data)
+
+class _LxmlTarget:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def start(self, tag, attrib):
+        if isinstance(tag, str):
+            self.owner._start(tag, {k.lower(): v for k, v in attrib.items()})
+
+    def end(self, tag):
+        if isinstance(tag, str):
+            self.owner._end(tag)
+
+    def data(self, data):
+        self.owner._data(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return None
+
+def extract_page(html, base_url, text_budget=DEFAULT_TEXT_BUDGET, max_images=DEFAULT_MAX_IMAGES, engine=None):
+    extractor = PageExtractor(base_url, text_budget, max_images, engine)
+    extractor.feed(html)
+    return extractor.close()
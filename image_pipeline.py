@@ -0,0 +1,279 @@
+import io
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from fetcher import get_fetcher
+from lazy_deps import lazy, available
+from perf import span, observe
+
+Image = lazy("PIL.Image")
+HAS_PIL = available("PIL")
+
+TARGET_SIZE = (1280, 800)
+
+# --- ENCODE PROFILES ---
+# max is the original setting. balanced keeps 4:4:4 chroma and the same
+# visual quality but skips the extra optimize pass; fast also halves chroma
+# resolution, which is hard to see on photos but softens small red text.
+ENCODE_PROFILES = {
+    "fast": {"quality": 88, "subsampling": 2, "optimize": False},
+    "balanced": {"quality": 92, "subsampling": 0, "optimize": False},
+    "max": {"quality": 95, "subsampling": 0, "optimize": True},
+}
+DEFAULT_PROFILE = "balanced"
+
+# Decode at least this many times the linear size the crop needs, so the
+# final LANCZOS pass still downsamples and keeps full sharpness
+DRAFT_OVERSAMPLE = 1.5
+REDUCING_GAP = 3.0
+
+# Same crop box as ImageOps.fit (no bleed)
+def fit_box(src_size, dst_size, centering=(0.5, 0.5)):
+    src_w, src_h = src_size
+    cx, cy = centering
+    if not 0.0 <= cx <= 1.0: cx = 0.5
+    if not 0.0 <= cy <= 1.0: cy = 0.5
+    src_ratio = src_w / src_h
+    dst_ratio = dst_size[0] / dst_size[1]
+    if src_ratio == dst_ratio:
+        crop_w, crop_h = src_w, src_h
+    elif src_ratio > dst_ratio:
+        crop_w, crop_h = dst_ratio * src_h, src_h
+    else:
+        crop_w, crop_h = src_w, src_w / dst_ratio
+    left = (src_w - crop_w) * cx
+    top = (src_h - crop_h) * cy
+    return (left, top, left + crop_w, top + crop_h)
+
+# --- IMAGE RESIZING LOGIC (ENHANCED FOR QUALITY DIAGNOSTICS) ---
+# Lives outside app.py so the process pool can import it in worker processes.
+# Returns (jpeg_bytes, orig_w, orig_h, error); base64 views are built on
+# demand by image_store instead of being carried around with every image.
+# Large JPEGs are decoded at a reduced DCT scale (draft mode) and resampled
+# with a reducing gap, so a 6000 px phone photo never gets fully decoded.
+def resize_image_klook_standard(image_input, alignment=(0.5, 0.5), profile=DEFAULT_PROFILE, fast_decode=True):
+    if not HAS_PIL: return None, 0, 0, "⚠️ Error: 'Pillow' library missing."
+    try:
+        if isinstance(image_input, bytes):
+            img = Image.open(io.BytesIO(image_input))
+        else:
+            img = Image.open(image_input)
+
+        orig_w, orig_h = img.size
+        target_width, target_height = TARGET_SIZE
+
+        if fast_decode and img.format == "JPEG":
+            # Smallest DCT scale that still leaves the crop DRAFT_OVERSAMPLE x the target
+            scale = max(target_width / orig_w, target_height / orig_h) * DRAFT_OVERSAMPLE
+            if scale < 1:
+                img.draft("RGB", (int(orig_w * scale) + 1, int(orig_h * scale) + 1))
+
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[3])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        box = fit_box(img.size, TARGET_SIZE, alignment)
+        img_resized = img.resize(
+            TARGET_SIZE,
+            Image.Resampling.LANCZOS,
+            box=box,
+            reducing_gap=REDUCING_GAP if fast_decode else None,
+        )
+
+        buf = io.BytesIO()
+        img_resized.save(buf, format='JPEG', **ENCODE_PROFILES.get(profile, ENCODE_PROFILES[DEFAULT_PROFILE]))
+
+        return buf.getvalue(), orig_w, orig_h, None
+    except Exception as e:
+        return None, 0, 0, f"Error processing image: {e}"
+
+# --- DOWNLOAD STAGE ---
+def download_image(url, timeout=10):
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    resp = get_fetcher().get(url, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return resp.content
+
+# --- SHARED PROCESS POOL FOR CPU-BOUND WORK (RESIZE/ENCODE, PDF PAGES) ---
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+            # spawn: forking a threaded Streamlit server is not safe
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+def reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+# --- RATE-LIMITED CAPTION QUEUE ---
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class CaptionQueue:
+    def __init__(self, caption_fn, per_second=0.5, workers=2):
+        self.caption_fn = caption_fn
+        self.limiter = RateLimiter(per_second)
+        self.results = {}
+        self._q = queue.Queue()
+        self._threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(max(1, workers))]
+        for t in self._threads: t.start()
+
+    def _loop(self):
+        while True:
+            job = self._q.get()
+            if job is None:
+                self._q.task_done()
+                return
+            idx, image_bytes = job
+            try:
+                self.limiter.wait()
+                with span("photo.caption"):
+                    self.results[idx] = self.caption_fn(image_bytes)
+            except Exception as e:
+                self.results[idx] = f"Caption Failed: {str(e)}"
+            finally:
+                self._q.task_done()
+
+    def put(self, idx, image_bytes):
+        self._q.put((idx, image_bytes))
+
+    def close(self):
+        for _ in self._threads: self._q.put(None)
+
+    def pending(self):
+        return self._q.unfinished_tasks
+
+# --- STAGED PIPELINE: DOWNLOAD (THREADS) -> RESIZE (PROCESSES) -> CAPTION (QUEUE) ---
+# jobs: list of {"idx", "fname", "data": bytes} or {"idx", "fname", "url": str}.
+# run() yields (finished, total) for the progress bar; results keep job order.
+# fetch_fn(url) -> bytes replaces the plain download, e.g. a ThumbnailCache
+# that already holds the originals shown in the preview grid.
+class PhotoPipeline:
+    def __init__(self, jobs, alignment=(0.5, 0.5), caption_fn=None, caption_rate=0.5,
+                 download_workers=6, caption_workers=2, use_processes=True, profile=DEFAULT_PROFILE, fetch_fn=None):
+        self.jobs = list(jobs)
+        self.fetch_fn = fetch_fn or download_image
+        self.alignment = alignment
+        self.profile = profile
+        self.caption_fn = caption_fn
+        self.caption_rate = caption_rate
+        self.download_workers = download_workers
+        self.caption_workers = caption_workers
+        self.use_processes = use_processes
+        self.results = [None] * len(self.jobs)
+        self.captions = {}
+
+    def _download(self, url):
+        with span("photo.download"):
+            return self.fetch_fn(url)
+
+    # photo.resize is timed from submit to result, so it includes pool queueing
+    def _submit_resize(self, pos, data):
+        self._resize_started[pos] = time.perf_counter()
+        if self.use_processes:
+            try:
+                return get_process_pool().submit(resize_image_klook_standard, data, self.alignment, self.profile)
+            except (BrokenProcessPool, RuntimeError, OSError):
+                reset_process_pool()
+                self.use_processes = False
+        return self._local.submit(resize_image_klook_standard, data, self.alignment, self.profile)
+
+    def run(self):
+        total = len(self.jobs)
+        if not total:
+            return
+        steps_per_job = 2 if self.caption_fn else 1
+        steps_total = total * steps_per_job
+        steps_done = 0
+        started = time.perf_counter()
+        self._resize_started = {}
+
+        captions = CaptionQueue(self.caption_fn, self.caption_rate, self.caption_workers) if self.caption_fn else None
+        self._local = ThreadPoolExecutor(max_workers=2)
+        resize_of = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers) as dl_pool:
+                download_of = {}
+                for pos, job in enumerate(self.jobs):
+                    if job.get("data") is not None:
+                        resize_of[self._submit_resize(pos, job["data"])] = pos
+                    else:
+                        download_of[dl_pool.submit(self._download, job["url"])] = pos
+
+                while download_of or resize_of:
+                    finished, _ = wait(list(download_of) + list(resize_of), timeout=0.5, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        if fut in download_of:
+                            pos = download_of.pop(fut)
+                            try:
+                                resize_of[self._submit_resize(pos, fut.result())] = pos
+                            except Exception:
+                                self.results[pos] = (None, 0, 0, None)
+                                steps_done += steps_per_job
+                            continue
+
+                        pos = resize_of.pop(fut)
+                        try:
+                            out = fut.result()
+                        except BrokenProcessPool:
+                            reset_process_pool()
+                            self.use_processes = False
+                            resize_of[self._submit_resize(pos, self._job_bytes(pos))] = pos
+                            continue
+                        self.results[pos] = out
+                        observe("photo.resize", time.perf_counter() - self._resize_started[pos], ok=bool(out[0]))
+                        steps_done += 1
+                        if captions and out[0]:
+                            captions.put(pos, out[0])
+                        elif captions:
+                            steps_done += 1
+                    yield min(steps_done, steps_total), steps_total
+
+            if captions:
+                while captions.pending():
+                    time.sleep(0.2)
+                    yield min(steps_done + len(captions.results), steps_total), steps_total
+        finally:
+            if captions: captions.close()
+            self._local.shutdown(wait=False)
+
+        self.captions = captions.results if captions else {}
+        observe("photo.pipeline", time.perf_counter() - started)
+        yield steps_total, steps_total
+
+    def _job_bytes(self, pos):
+        job = self.jobs[pos]
+        if job.get("data") is not None:
+            return job["data"]
+        return self.fetch_fn(job["url"])
@@ -0,0 +1,143 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from fetcher import get_fetcher, read_capped
+from lazy_deps import lazy, available
+
+Image = lazy("PIL.Image")
+ImageFile = lazy("PIL.ImageFile")
+HAS_PIL = available("PIL")
+
+MIN_SIZE = (1280, 800)          # must fill the Klook frame without upscaling
+PROBE_BYTES = 64 * 1024         # enough for the header of JPEG/PNG/WebP/GIF, EXIF included
+MAX_HASH_BYTES = 20 * 1024 * 1024
+DUPLICATE_DISTANCE = 6          # dHash bits; same photo re-encoded/resized lands well below this
+PROBE_WORKERS = 8
+
+_CONTENT_RANGE_TOTAL = re.compile(r"/\s*(\d+)\s*$")
+
+# --- HEADER PROBE ---
+# Asks for the first PROBE_BYTES only (Range request) and feeds them to
+# Pillow's incremental parser until it knows the dimensions. Servers that
+# ignore Range send the whole body; we stop reading after PROBE_BYTES anyway.
+# Returns {url, width, height, bytes, format, status, reason}; status is
+# "ok" until ranking marks it "too_small" / "duplicate", "error" if the
+# server refused it, or "unknown" if the header could not be read.
+def probe_image(url, timeout=10):
+    info = {"url": url, "width": 0, "height": 0, "bytes": None, "format": None, "status": "unknown", "reason": ""}
+    headers = {'User-Agent': 'Mozilla/5.0', 'Range': f'bytes=0-{PROBE_BYTES - 1}'}
+    try:
+        resp = get_fetcher().get(url, headers=headers, timeout=timeout, stream=True)
+        try:
+            if resp.status_code not in (200, 206):
+                info["status"] = "error"
+                info["reason"] = f"HTTP {resp.status_code}"
+                return info
+            m = _CONTENT_RANGE_TOTAL.search(resp.headers.get('Content-Range', ''))
+            length = m.group(1) if m else (resp.headers.get('Content-Length') if resp.status_code == 200 else None)
+            info["bytes"] = int(length) if length and length.isdigit() else None
+
+            parser = ImageFile.Parser()
+            for chunk in read_capped(resp, PROBE_BYTES, chunk_size=16 * 1024):
+                parser.feed(chunk)
+                if parser.image is not None:
+                    break
+        finally:
+            resp.close()
+        if parser.image is None:
+            info["reason"] = "header not found in first bytes"
+            return info
+        info["width"], info["height"] = parser.image.size
+        info["format"] = parser.image.format
+        info["status"] = "ok"
+    except Exception as e:
+        info["reason"] = str(e)[:200]
+    return info
+
+# --- PERCEPTUAL HASH (dHASH) ---
+# 9x8 grayscale, one bit per horizontal gradient. JPEGs are decoded at 1/8
+# scale, so even a 20 MP photo costs a few milliseconds.
+def dhash(data):
+    img = Image.open(io.BytesIO(data))
+    img.draft("L", (64, 64))
+    pixels = list(img.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+def download_capped(url, timeout=15):
+    resp = get_fetcher().get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=timeout, stream=True)
+    try:
+        resp.raise_for_status()
+        data = b"".join(read_capped(resp, MAX_HASH_BYTES))
+    finally:
+        resp.close()
+    return data
+
+def fills_frame(info, min_size=MIN_SIZE):
+    return info["width"] >= min_size[0] and info["height"] >= min_size[1]
+
+# --- RANKING ---
+# Probes every candidate concurrently and drops the ones that cannot fill
+# min_size. Only headers are read, so this is cheap enough for the scrape
+# itself; duplicates are dropped later by drop_duplicates, from previews.
+# Returns (usable_urls, report): usable_urls are the usable images largest
+# first, followed by any whose header could not be read (kept, since they
+# are not known to be unusable); report has one probe dict per candidate.
+def rank_image_candidates(urls, limit=15, min_size=MIN_SIZE, workers=PROBE_WORKERS):
+    urls = list(dict.fromkeys(urls))
+    if not urls or not HAS_PIL:
+        return urls[:limit], []
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as pool:
+        report = list(pool.map(probe_image, urls))
+
+    big = []
+    for info in report:
+        if info["status"] != "ok": continue
+        if fills_frame(info, min_size):
+            big.append(info)
+        else:
+            info["status"] = "too_small"
+            info["reason"] = f"{info['width']}x{info['height']} is below {min_size[0]}x{min_size[1]}"
+    big.sort(key=lambda i: (i["width"] * i["height"], i["bytes"] or 0), reverse=True)
+
+    usable = [info["url"] for info in big]
+    usable += [info["url"] for info in report if info["status"] == "unknown"]
+    return usable[:limit], report
+
+# --- DUPLICATES ---
+# urls come ranked largest first, so the first copy of each photo is kept.
+# fetch(url) -> bytes or None; pass the preview cache's thumbnails (dHash
+# only looks at a 9x8 image, so a 320px preview hashes like the original).
+# Duplicates are marked in report; returns the urls that are kept.
+def drop_duplicates(urls, report, fetch):
+    if not HAS_PIL:
+        return list(urls)
+    probes = {info["url"]: info for info in report}
+    kept = []
+    for url in urls:
+        try:
+            data = fetch(url)
+            h = dhash(data) if data else None
+        except Exception:
+            h = None
+        twin = None
+        if h is not None:
+            twin = next((k for k, kh in kept if kh is not None and bin(h ^ kh).count("1") <= DUPLICATE_DISTANCE), None)
+        if twin is not None:
+            if url in probes:
+                probes[url]["status"] = "duplicate"
+                probes[url]["reason"] = f"same photo as {twin}"
+            continue
+        kept.append((url, h))
+    return [url for url, _ in kept]
+
+def summarize_report(report):
+    counts = {}
+    for info in report:
+        counts[info["status"]] = counts.get(info["status"], 0) + 1
+    return counts
@@ -0,0 +1,158 @@
+import io
+import os
+import time
+import shutil
+import atexit
+import base64
+import zipfile
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, Counter
+
+# --- CONTENT-ADDRESSED IMAGE STORE ---
+# Processed photos are stored once per distinct content (SHA-256) and shared
+# by every session that references them; session state only keeps digests.
+# Blobs live in memory up to memory_budget bytes; past that the least
+# recently used ones are spilled to files in a private temp directory and
+# read back on demand. Base64 data URLs and ZIP archives are built when asked
+# for and never kept. Sessions hold references; a blob is deleted when no
+# session references it any more, and sessions idle (no put, and no get
+# naming the session) for longer than session_ttl are released on the next
+# write; get() then returns None for their images.
+class ImageStore:
+    def __init__(self, memory_budget=256 * 1024 * 1024, spill_dir=None, session_ttl=6 * 3600):
+        self.memory_budget = memory_budget
+        self.session_ttl = session_ttl
+        self._spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # digest -> bytes, LRU order
+        self._memory_bytes = 0
+        self._disk = {}                # digest -> (path, size)
+        self._refs = Counter()         # digest -> number of sessions holding it
+        self._sessions = {}            # session_id -> Counter(digest)
+        self._last_seen = {}
+        self.spills = 0
+
+    def _spill_path(self, digest):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="klook_images_")
+            atexit.register(shutil.rmtree, self._spill_dir, True)
+        return os.path.join(self._spill_dir, digest)
+
+    def _enforce_budget(self):
+        while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+            digest, data = self._memory.popitem(last=False)
+            path = self._spill_path(digest)
+            with open(path, "wb") as f:
+                f.write(data)
+            self._disk[digest] = (path, len(data))
+            self._memory_bytes -= len(data)
+            self.spills += 1
+
+    def _drop(self, digest):
+        data = self._memory.pop(digest, None)
+        if data is not None:
+            self._memory_bytes -= len(data)
+        path_size = self._disk.pop(digest, None)
+        if path_size:
+            try: os.remove(path_size[0])
+            except OSError: pass
+
+    def _expire_idle(self, now):
+        for sid, seen in list(self._last_seen.items()):
+            if now - seen > self.session_ttl:
+                self._release(sid)
+
+    def _release(self, session_id):
+        for digest, n in self._sessions.pop(session_id, Counter()).items():
+            self._refs[digest] -= n
+            if self._refs[digest] <= 0:
+                del self._refs[digest]
+                self._drop(digest)
+        self._last_seen.pop(session_id, None)
+
+    # --- writes ---
+    def put(self, data, session_id):
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._expire_idle(now)
+            if digest not in self._memory and digest not in self._disk:
+                self._memory[digest] = data
+                self._memory_bytes += len(data)
+            self._refs[digest] += 1
+            self._sessions.setdefault(session_id, Counter())[digest] += 1
+            self._last_seen[session_id] = now
+            self._enforce_budget()
+        return digest
+
+    def release_session(self, session_id):
+        with self._lock:
+            self._release(session_id)
+
+    # --- reads / on-demand views ---
+    # session_id: the viewing session, kept alive by the read. None once the
+    # image is gone (its sessions were released or expired).
+    def get(self, digest, session_id=None):
+        with self._lock:
+            if session_id in self._last_seen:
+                self._last_seen[session_id] = time.time()
+            data = self._memory.get(digest)
+            if data is not None:
+                self._memory.move_to_end(digest)
+                return data
+            path_size = self._disk.get(digest)
+        if path_size is None:
+            return None
+        # Read outside the lock; a release or eviction in between removes the file
+        try:
+            with open(path_size[0], "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def data_url(self, digest, mime="image/jpeg", session_id=None):
+        data = self.get(digest, session_id)
+        if data is None: return ""
+        return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+    # entries: [(filename, digest)]. JPEGs are already compressed, so stored, not deflated
+    def zip_bytes(self, entries, session_id=None):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            for name, digest in entries:
+                data = self.get(digest, session_id)
+                if data is not None:
+                    zf.writestr(name, data)
+        return buf.getvalue()
+
+    # --- accounting ---
+    def _size(self, digest):
+        data = self._memory.get(digest)
+        if data is not None: return len(data), True
+        path_size = self._disk.get(digest)
+        return (path_size[1] if path_size else 0), False
+
+    def session_usage(self, session_id):
+        with self._lock:
+            usage = {"images": 0, "bytes": 0, "in_memory": 0, "on_disk": 0, "shared": 0}
+            for digest in self._sessions.get(session_id, {}):
+                size, in_memory = self._size(digest)
+                usage["images"] += 1
+                usage["bytes"] += size
+                usage["in_memory" if in_memory else "on_disk"] += size
+                if self._refs[digest] > self._sessions[session_id][digest]:
+                    usage["shared"] += 1
+            return usage
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": len(self._memory) + len(self._disk),
+                "sessions": len(self._sessions),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": sum(s for _, s in self._disk.values()),
+                "memory_budget": self.memory_budget,
+                "spills": self.spills,
+            }
@@ -0,0 +1,79 @@
+import json
+
+# --- INCREMENTAL TOP-LEVEL JSON SECTION PARSER ---
+# Fed with text deltas from a streamed response holding one JSON object.
+# feed() returns the (key, value) pairs of top-level members whose values
+# have just finished arriving, so complete sections can be shown while the
+# rest of the object is still being generated. Markdown fences around the
+# object are ignored. The scan is a single pass over each delta: only string,
+# escape and nesting state is tracked, and a member is handed to json.loads
+# once its value closes.
+class SectionStreamParser:
+    def __init__(self):
+        self.text = ""
+        self.sections = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._member_start = None
+
+    def feed(self, delta):
+        if not delta: return []
+        self.text += delta
+        completed = []
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape: self._escape = False
+                elif ch == "\\": self._escape = True
+                elif ch == '"': self._in_string = False
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_member(text[self._member_start:i])
+                    self._member_start = None
+                    self._started = False
+                    i += 1
+                    break
+                if self._depth == 1:
+                    # A nested section just closed; the member ends here
+                    completed += self._close_member(text[self._member_start:i + 1])
+                    self._member_start = i + 1
+            elif ch == "," and self._depth == 1:
+                # Scalar member (string / number) at the top level
+                completed += self._close_member(text[self._member_start:i])
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    def _close_member(self, fragment):
+        fragment = fragment.strip().strip(",").strip()
+        if not fragment: return []
+        try:
+            member = json.loads("{" + fragment + "}")
+        except ValueError:
+            return []
+        out = []
+        for key, value in member.items():
+            if key not in self.sections:
+                self.sections[key] = value
+                out.append((key, value))
+        return out
+
+    @property
+    def complete(self):
+        return self._started is False and self._member_start is None and bool(self.sections)
@@ -0,0 +1,242 @@
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from perf import span, incr
+
+# --- OUTCOMES REPORTED BACK BY CALL SITES ---
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+FAILED = "failed"
+
+class RateLimited(Exception):
+    def __init__(self, message="429 Quota Exceeded", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# --- RETRY HINT PARSING ---
+# Gemini 429s carry either "Please retry in 37.5s" or a RetryInfo block "retry_delay { seconds: 37 }"
+_RETRY_PATTERNS = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry[- ]after[:\s]+([\d.]+)", re.IGNORECASE),
+]
+
+def retry_hint_seconds(error):
+    hint = getattr(error, "retry_after", None)
+    if hint:
+        return float(hint)
+    text = str(error)
+    for pattern in _RETRY_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            try: return float(m.group(1))
+            except ValueError: pass
+    return None
+
+def is_rate_limit_error(error):
+    if isinstance(error, RateLimited):
+        return True
+    name = type(error).__name__
+    text = str(error)
+    return name in ("ResourceExhausted", "TooManyRequests") or "429" in text or "quota" in text.lower()
+
+# --- PER-KEY STATE ---
+class KeyState:
+    def __init__(self, key, capacity, refill_per_sec):
+        self.key = key
+        self.capacity = float(capacity)
+        self.refill_per_sec = refill_per_sec
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.breaker_open_until = 0.0
+        self.half_open_probe = False
+        self.calls = 0
+        self.rate_limits = 0
+        self.failures = 0
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_sec)
+            self.updated_at = now
+
+    def ready_at(self, now, max_in_flight):
+        # Earliest monotonic time this key could be handed out (ignores in-flight, which frees on release)
+        at = max(now, self.cooldown_until, self.breaker_open_until)
+        if self.tokens < 1 and self.refill_per_sec > 0:
+            at = max(at, now + (1 - self.tokens) / self.refill_per_sec)
+        return at
+
+# --- HEALTH-AWARE SCHEDULER ---
+# Token bucket per key, cooldown after 429 (honoring retry hints), circuit
+# breaker for keys that keep failing, least-loaded selection. One instance is
+# shared by every session so concurrent users see the same key health.
+class KeyScheduler:
+    def __init__(self, keys, requests_per_minute=60, burst=5, max_in_flight=2,
+                 failure_threshold=3, breaker_seconds=120, default_cooldown=30):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.failure_threshold = failure_threshold
+        self.breaker_seconds = breaker_seconds
+        self.default_cooldown = default_cooldown
+        self._cond = threading.Condition()
+        self._states = {}
+        self.update_keys(keys)
+
+    def update_keys(self, keys):
+        with self._cond:
+            for k in keys:
+                if k not in self._states:
+                    self._states[k] = KeyState(k, self.burst, self.requests_per_minute / 60.0)
+            for k in list(self._states):
+                if k not in keys:
+                    del self._states[k]
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _eligible(self, state, now):
+        if state.in_flight >= self.max_in_flight: return False
+        if now < state.cooldown_until: return False
+        if now < state.breaker_open_until: return False
+        if state.breaker_open_until and state.half_open_probe: return False
+        return state.tokens >= 1
+
+    def acquire(self, timeout=30, exclude=()):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = []
+                for state in self._states.values():
+                    state.refill(now)
+                    if state.key in exclude: continue
+                    if self._eligible(state, now): candidates.append(state)
+
+                if candidates:
+                    # Least loaded first, then fullest bucket; shuffle to spread ties
+                    random.shuffle(candidates)
+                    best = min(candidates, key=lambda s: (s.in_flight, -s.tokens))
+                    best.tokens -= 1
+                    best.in_flight += 1
+                    best.calls += 1
+                    if best.breaker_open_until:
+                        best.half_open_probe = True
+                    return best.key
+
+                pool = [s for s in self._states.values() if s.key not in exclude]
+                if not pool or now >= deadline:
+                    return None
+                next_ready = min(s.ready_at(now, self.max_in_flight) for s in pool)
+                self._cond.wait(max(0.05, min(next_ready, deadline) - now))
+
+    def release(self, key, outcome=OK, retry_after=None):
+        with self._cond:
+            state = self._states.get(key)
+            if state is None:
+                return
+            now = time.monotonic()
+            state.in_flight = max(0, state.in_flight - 1)
+            state.half_open_probe = False
+
+            if outcome == OK:
+                state.consecutive_failures = 0
+                state.breaker_open_until = 0.0
+            elif outcome == RATE_LIMITED:
+                state.rate_limits += 1
+                state.tokens = 0.0
+                state.cooldown_until = now + (retry_after or self.default_cooldown)
+            else:
+                state.failures += 1
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold:
+                    state.breaker_open_until = now + self.breaker_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, timeout=30, exclude=()):
+        key = self.acquire(timeout=timeout, exclude=exclude)
+        lease = Lease(self, key)
+        try:
+            yield lease
+        except Exception as e:
+            if key is not None and not lease.reported:
+                if is_rate_limit_error(e): lease.rate_limited(retry_hint_seconds(e))
+                else: lease.failed()
+            raise
+        finally:
+            if key is not None and not lease.reported:
+                lease.ok()
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            rows = []
+            for state in self._states.values():
+                state.refill(now)
+                if now < state.breaker_open_until: health = "Circuit Open"
+                elif now < state.cooldown_until: health = "Cooling Down"
+                else: health = "Healthy"
+                rows.append({
+                    "key": f"...{state.key[-4:]}",
+                    "health": health,
+                    "in_flight": state.in_flight,
+                    "tokens": round(state.tokens, 1),
+                    "calls": state.calls,
+                    "rate_limits": state.rate_limits,
+                    "failures": state.failures,
+                    "cooldown_s": round(max(0.0, state.cooldown_until - now), 1),
+                })
+            return rows
+
+class Lease:
+    def __init__(self, scheduler, key):
+        self.scheduler = scheduler
+        self.key = key
+        self.reported = False
+
+    def _report(self, outcome, retry_after=None):
+        if self.reported or self.key is None: return
+        self.reported = True
+        self.scheduler.release(self.key, outcome, retry_after)
+
+    def ok(self): self._report(OK)
+    def failed(self): self._report(FAILED)
+    def rate_limited(self, retry_after=None): self._report(RATE_LIMITED, retry_after)
+
+# --- ROTATION HELPER FOR CALL SITES ---
+# call(key) returns a result or raises; RateLimited / 429-looking errors cool the
+# key down, anything else counts towards its circuit breaker.
+def run_with_rotation(scheduler, call, max_attempts=None, wait_timeout=30):
+    attempts = max_attempts or max(2, 2 * len(scheduler))
+    last_error = ""
+    for _ in range(attempts):
+        with span("gemini.key_wait"):
+            key = scheduler.acquire(timeout=wait_timeout)
+        if key is None:
+            incr("gemini.no_key_available")
+            last_error = last_error or "No API key available (all cooling down or failing)."
+            break
+        incr("gemini.attempts")
+        try:
+            result = call(key)
+        except Exception as e:
+            last_error = str(e)
+            if is_rate_limit_error(e):
+                incr("gemini.rate_limited")
+                scheduler.release(key, RATE_LIMITED, retry_hint_seconds(e))
+            else:
+                incr("gemini.failed")
+                scheduler.release(key, FAILED)
+            continue
+        scheduler.release(key, OK)
+        return result, None
+    return None, last_error
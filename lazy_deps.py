@@ -0,0 +1,100 @@
+import sys
+import time
+import threading
+import importlib
+import importlib.util
+import subprocess
+
+# --- LAZY HEAVY DEPENDENCIES ---
+# Heavy libraries are bound to LazyModule proxies and only imported on first
+# attribute access, i.e. when the tab or feature that needs them runs.
+# Capability flags (HAS_*) come from available(), which only locates the
+# package on disk and does not import it.
+
+# module -> subsystem, in the order shown by the startup report
+SUBSYSTEMS = {
+    "google.generativeai": "Gemini client",
+    "cloudscraper": "Scraper (Cloudflare)",
+    "bs4": "Merchant audit HTML",
+    "reportlab.platypus": "PDF export",
+    "pypdf": "PDF reading (fast)",
+    "pdfplumber": "PDF reading (layout)",
+    "PIL.Image": "Images",
+    "whois": "Domain age (WHOIS)",
+}
+
+_import_ms = {}
+
+def available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+# One lock for all first loads: another thread may be half-way through
+# importing the module, and sys.modules already holds it partially initialized
+_load_lock = threading.RLock()
+
+def load(name):
+    with _load_lock:
+        mod = sys.modules.get(name)
+        if mod is not None:
+            _import_ms.setdefault(name, 0.0)
+            return mod
+        started = time.perf_counter()
+        mod = importlib.import_module(name)
+        _import_ms.setdefault(name, (time.perf_counter() - started) * 1000)
+        return mod
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        mod = self.__dict__["_module"]
+        if mod is None:
+            mod = load(self.__dict__["_name"])
+            self.__dict__["_module"] = mod
+        return getattr(mod, attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']} ({state})>"
+
+def lazy(name):
+    return LazyModule(name)
+
+# --- STARTUP TIMING REPORT ---
+# In-process view: what this server has imported so far and what it cost.
+def import_report():
+    rows = []
+    for name, subsystem in SUBSYSTEMS.items():
+        ms = _import_ms.get(name)
+        if ms is not None:
+            status = "loaded"
+        elif name in sys.modules:
+            status, ms = "loaded (by another module)", 0.0
+        else:
+            status = "not loaded" if available(name) else "not installed"
+        rows.append({"subsystem": subsystem, "module": name, "status": status, "import_ms": round(ms, 1) if ms is not None else None})
+    return rows
+
+# Cold view: each module imported in a fresh interpreter, as a scaled-to-zero
+# container would pay for it. Usage: python lazy_deps.py
+def measure_cold_imports(modules=None, python=sys.executable):
+    rows = []
+    for name in modules or SUBSYSTEMS:
+        code = f"import time; t = time.perf_counter(); import {name}; print((time.perf_counter() - t) * 1000)"
+        proc = subprocess.run([python, "-W", "ignore", "-c", code], capture_output=True, text=True)
+        ms = float(proc.stdout.strip().splitlines()[-1]) if proc.returncode == 0 and proc.stdout.strip() else None
+        rows.append({"subsystem": SUBSYSTEMS.get(name, name), "module": name, "cold_import_ms": round(ms, 1) if ms is not None else None})
+    return rows
+
+if __name__ == "__main__":
+    total = 0.0
+    for row in measure_cold_imports():
+        ms = row["cold_import_ms"]
+        total += ms or 0
+        print(f"{row['subsystem']:<24} {row['module']:<22} {('%.1f ms' % ms) if ms is not None else 'not installed':>14}")
+    print(f"{'':<47}{total:>11.1f} ms total")
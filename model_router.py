@@ -0,0 +1,142 @@
+import time
+import random
+import threading
+from collections import deque
+
+# --- MODEL CAPABILITIES ---
+# Matched by substring against the names list_models returns, in preference
+# order. gemini-pro (1.0) has neither JSON mode nor image input.
+MODEL_PRIORITY = ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-pro"]
+MODEL_CAPS = {
+    "gemini-2.5-flash": {"json", "vision"},
+    "gemini-2.0-flash": {"json", "vision"},
+    "gemini-pro": set(),
+}
+FEATURE_NEEDS = {
+    "summary": {"json"},
+    "repair": {"json"},
+    "rules": {"json"},
+    "merchant": {"json"},
+    "grammar": {"json"},
+    "caption": {"vision"},
+    "rewrite": set(),
+    "email": set(),
+}
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+PROFILE_WINDOW = 50      # last calls kept per key/model/feature
+MIN_SAMPLES = 3          # below this a profile is not trusted for latency or health
+MAX_ERROR_RATE = 0.5     # over the window; above it the pair is skipped
+UNHEALTHY_RETRY = 120    # seconds before a skipped pair gets a trial call again
+EXPLORE_RATE = 0.05      # share of calls sent to an under-sampled healthy model
+MODEL_LIST_TTL = 86400
+FAILED_LIST_TTL = 300    # a failed listing is retried soon, not tomorrow
+
+def model_family(name):
+    return next((fam for fam in MODEL_PRIORITY if fam in name), None)
+
+def meets(name, feature):
+    family = model_family(name)
+    if family is None:
+        return True  # unknown model: nothing says it cannot
+    return FEATURE_NEEDS.get(feature, set()) <= MODEL_CAPS[family]
+
+class Profile:
+    def __init__(self):
+        self.samples = deque(maxlen=PROFILE_WINDOW)  # (seconds, ok)
+        self.last_failure = 0.0
+
+    def p50(self):
+        ordered = sorted(s for s, ok in self.samples if ok)
+        return ordered[len(ordered) // 2] if ordered else None
+
+    def error_rate(self):
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples) if self.samples else 0.0
+
+    def healthy(self, now):
+        if len(self.samples) < MIN_SAMPLES or self.error_rate() <= MAX_ERROR_RATE:
+            return True
+        return now - self.last_failure > UNHEALTHY_RETRY
+
+# --- LATENCY / ERROR AWARE ROUTING ---
+# Per key: the models list_models offered (one per family, preference order).
+# Per key/model/feature: a rolling window of call latencies and outcomes
+# (a caption and a summary take very different times, so features are kept
+# apart). choose() returns the fastest healthy model that has what the
+# feature needs; models without enough samples rank after measured ones, in
+# preference order, and get an occasional exploratory call so they can
+# become measured. Shared by every session, like the key scheduler.
+class ModelRouter:
+    def __init__(self, rng=None):
+        self._lock = threading.Lock()
+        self._models = {}    # key -> (names, expires_at)
+        self._profiles = {}  # (key, model, feature) -> Profile
+        self._rng = rng or random.Random()
+
+    def models_for(self, key):
+        with self._lock:
+            entry = self._models.get(key)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def set_models(self, key, available):
+        names = []
+        for fam in MODEL_PRIORITY:
+            hit = next((m for m in available if fam in m), None)
+            if hit: names.append(hit)
+        if not names and available:
+            names = [available[0]]
+        ttl = MODEL_LIST_TTL if names else FAILED_LIST_TTL
+        with self._lock:
+            self._models[key] = (names, time.time() + ttl)
+        return names
+
+    def record(self, key, model, feature, seconds, ok):
+        with self._lock:
+            profile = self._profiles.get((key, model, feature))
+            if profile is None:
+                profile = self._profiles[(key, model, feature)] = Profile()
+            profile.samples.append((seconds, ok))
+            if not ok: profile.last_failure = time.time()
+
+    def choose(self, key, feature):
+        names = [m for m in (self.models_for(key) or []) if meets(m, feature)]
+        if not names:
+            return DEFAULT_MODEL
+        now = time.time()
+        with self._lock:
+            profiles = [self._profiles.get((key, m, feature)) for m in names]
+            healthy = [(m, p) for m, p in zip(names, profiles) if p is None or p.healthy(now)]
+            if not healthy:
+                return names[0]
+            measured = [(p.p50(), i, m) for i, (m, p) in enumerate(healthy)
+                        if p is not None and len(p.samples) >= MIN_SAMPLES and p.p50() is not None]
+            unmeasured = [m for m, p in healthy if p is None or len(p.samples) < MIN_SAMPLES or p.p50() is None]
+            if not measured:
+                return unmeasured[0]
+            if unmeasured and self._rng.random() < EXPLORE_RATE:
+                return unmeasured[0]
+            return min(measured)[2]
+
+    def forget(self, keys_to_keep):
+        keep = set(keys_to_keep)
+        with self._lock:
+            for key in [k for k in self._models if k not in keep]:
+                del self._models[key]
+            for slot in [s for s in self._profiles if s[0] not in keep]:
+                del self._profiles[slot]
+
+    # One row per key/model/feature for the admin panel; keys are shown by their last 4 characters
+    def snapshot(self):
+        with self._lock:
+            items = [(k, list(p.samples)) for k, p in self._profiles.items()]
+        rows = []
+        for (key, model, feature), samples in sorted(items):
+            profile = Profile()
+            profile.samples.extend(samples)
+            p50 = profile.p50()
+            rows.append({"key": "…" + key[-4:], "model": model, "feature": feature, "calls": len(samples),
+                         "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                         "error_rate": round(profile.error_rate(), 2)})
+        return rows
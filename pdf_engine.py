@@ -0,0 +1,154 @@
+import os
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from image_pipeline import get_process_pool, reset_process_pool
+from lazy_deps import lazy, available
+
+pypdf = lazy("pypdf")
+pdfplumber = lazy("pdfplumber")
+HAS_PYPDF = available("pypdf")
+HAS_PDFPLUMBER = available("pdfplumber")
+
+PAGES_PER_BATCH = 8
+INLINE_MAX_PAGES = 12  # below this, spinning up worker processes costs more than it saves
+MIN_PAGE_CHARS = 10    # pages with less than this from pypdf get a pdfplumber pass
+
+# --- PAGE RANGE SELECTION ("1-5, 8, 12-") ---
+def parse_page_ranges(spec, page_count):
+    if not spec or not str(spec).strip():
+        return list(range(page_count))
+    pages = []
+    for part in str(spec).replace(";", ",").split(","):
+        part = part.strip()
+        if not part: continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            lo = int(lo) if lo.strip() else 1
+            hi = int(hi) if hi.strip() else page_count
+        else:
+            lo = hi = int(part)
+        for p in range(max(1, lo), min(page_count, hi) + 1):
+            if p - 1 not in pages:
+                pages.append(p - 1)
+    return sorted(pages)
+
+# --- WORKER: ONE BATCH OF PAGES (RUNS IN A POOL PROCESS) ---
+# pypdf first (fast, no layout analysis); pdfplumber only for the pages that
+# come out empty, e.g. odd encodings or text drawn in tricky ways.
+def extract_page_batch(path, page_numbers):
+    rows = []
+    empty = []
+    if HAS_PYPDF:
+        reader = pypdf.PdfReader(path)
+        for n in page_numbers:
+            started = time.perf_counter()
+            try: text = reader.pages[n].extract_text() or ""
+            except Exception: text = ""
+            rows.append({"page": n + 1, "text": text, "seconds": time.perf_counter() - started, "engine": "pypdf"})
+            if len(text.strip()) < MIN_PAGE_CHARS:
+                empty.append(len(rows) - 1)
+    else:
+        rows = [{"page": n + 1, "text": "", "seconds": 0.0, "engine": "none"} for n in page_numbers]
+        empty = list(range(len(rows)))
+
+    if empty and HAS_PDFPLUMBER:
+        with pdfplumber.open(path) as pdf:
+            for i in empty:
+                started = time.perf_counter()
+                try: text = pdf.pages[rows[i]["page"] - 1].extract_text() or ""
+                except Exception: text = ""
+                rows[i]["seconds"] += time.perf_counter() - started
+                if len(text.strip()) > len(rows[i]["text"].strip()):
+                    rows[i]["text"] = text
+                    rows[i]["engine"] = "pdfplumber"
+    return rows
+
+def count_pages(path):
+    if HAS_PYPDF:
+        return len(pypdf.PdfReader(path).pages)
+    if HAS_PDFPLUMBER:
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    raise RuntimeError("No PDF library installed (pypdf or pdfplumber)")
+
+# --- ENGINE ---
+# Pages are extracted in batches on the shared process pool, but results are
+# consumed in page order and only a few batches are kept in flight, so once
+# char_budget characters are collected nothing further is submitted.
+# Returns {"text", "pages": [{page, chars, seconds, engine}], "page_count",
+# "selected", "stopped_early", "seconds"}.
+def extract_pdf(source, char_budget, page_ranges="", use_processes=True):
+    started = time.perf_counter()
+    data = source if isinstance(source, bytes) else source.getvalue() if hasattr(source, "getvalue") else source.read()
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        page_count = count_pages(path)
+        selected = parse_page_ranges(page_ranges, page_count)
+        batches = [selected[i:i + PAGES_PER_BATCH] for i in range(0, len(selected), PAGES_PER_BATCH)]
+
+        if len(selected) <= INLINE_MAX_PAGES or not use_processes:
+            rows, stopped = _run_inline(path, batches, char_budget)
+        else:
+            try:
+                rows, stopped = _run_pooled(path, batches, char_budget, get_process_pool())
+            except (BrokenProcessPool, RuntimeError, OSError):
+                reset_process_pool()
+                with ThreadPoolExecutor(max_workers=4) as local:
+                    rows, stopped = _run_pooled(path, batches, char_budget, local)
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+    text = "\n".join(r["text"] for r in rows if r["text"])
+    return {
+        "text": text[:char_budget],
+        "pages": [{"page": r["page"], "chars": len(r["text"]), "seconds": round(r["seconds"], 3), "engine": r["engine"]} for r in rows],
+        "page_count": page_count,
+        "selected": len(selected),
+        "stopped_early": stopped,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def _run_inline(path, batches, char_budget):
+    rows, chars = [], 0
+    for i, batch in enumerate(batches):
+        out = extract_page_batch(path, batch)
+        rows.extend(out)
+        chars += sum(len(r["text"]) + 1 for r in out)
+        if chars >= char_budget:
+            return rows, i < len(batches) - 1
+    return rows, False
+
+def _run_pooled(path, batches, char_budget, pool):
+    in_flight_limit = max(2, getattr(pool, "_max_workers", 4) * 2)
+    futures = {}
+    done_batches = {}
+    next_submit = 0
+    next_consume = 0
+    rows, chars = [], 0
+    try:
+        while next_consume < len(batches):
+            while next_submit < len(batches) and len(futures) < in_flight_limit:
+                futures[pool.submit(extract_page_batch, path, batches[next_submit])] = next_submit
+                next_submit += 1
+            finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done_batches[futures.pop(fut)] = fut.result()
+            # Consume strictly in page order so the budget cut is deterministic
+            while next_consume in done_batches:
+                out = done_batches.pop(next_consume)
+                next_consume += 1
+                rows.extend(out)
+                chars += sum(len(r["text"]) + 1 for r in out)
+                if chars >= char_budget:
+                    return rows, next_consume < len(batches)
+        return rows, False
+    finally:
+        for fut in futures:
+            fut.cancel()
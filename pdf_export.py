@@ -0,0 +1,68 @@
+import io
+
+from lazy_deps import available, load
+from perf import timed
+
+# Summary PDF export. Kept out of app.py so it can run (and be benchmarked)
+# without a Streamlit session.
+HAS_REPORTLAB = available("reportlab")
+
+# --- PDF GENERATOR ---
+@timed("export.pdf")
+def create_pdf(data):
+    if not HAS_REPORTLAB:
+        return None
+    load("reportlab.platypus")  # timed import, shows up in the startup report
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=12, textColor=colors.darkorange)
+    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=12, spaceBefore=10, spaceAfter=6, textColor=colors.black)
+    body_style = styles['BodyText']
+    bullet_style = ParagraphStyle('Bullet', parent=styles['BodyText'], leftIndent=20)
+
+    info = data.get('basic_info', {})
+    story.append(Paragraph(f"{info.get('main_attractions', 'Tour Summary')}", title_style))
+    story.append(Paragraph(f"<b>Location:</b> {info.get('city_country')} | <b>Duration:</b> {info.get('duration')}", body_style))
+    story.append(Spacer(1, 12))
+
+    story.append(Paragraph("✨ Highlights", heading_style))
+    highlights = info.get('highlights', [])
+    if highlights:
+        bullets = [ListItem(Paragraph(h, body_style)) for h in highlights]
+        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
+
+    story.append(Paragraph("📝 What to Expect", heading_style))
+    story.append(Paragraph(info.get('what_to_expect', ''), body_style))
+
+    story.append(Paragraph("🗺️ Itinerary", heading_style))
+    itin = data.get('klook_itinerary', {})
+    segments = itin.get('segments', [])
+    start = itin.get('start', {})
+    story.append(Paragraph(f"<b>{start.get('time', '')}</b> - Start at {start.get('location', '')}", body_style))
+    for seg in segments:
+        text = f"<b>{seg.get('time', '')}</b> - {seg.get('type')}: {seg.get('name')}"
+        if seg.get('details'): text += f"<br/><i>{seg.get('details')}</i>"
+        story.append(Paragraph(text, bullet_style))
+    end = itin.get('end', {})
+    story.append(Paragraph(f"<b>{end.get('time', '')}</b> - End at {end.get('location', '')}", body_style))
+
+    inc = data.get('inclusions', {})
+    story.append(Paragraph("✅ Included", heading_style))
+    if inc.get('included'):
+        bullets = [ListItem(Paragraph(x, body_style)) for x in inc.get('included', [])]
+        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
+    story.append(Paragraph("❌ Excluded", heading_style))
+    if inc.get('excluded'):
+        bullets = [ListItem(Paragraph(x, body_style)) for x in inc.get('excluded', [])]
+        story.append(ListFlowable(bullets, bulletType='bullet', start='•'))
+
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,178 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- STAGE TIMING SPANS ---
+# with span("pdf.extract"): ...   or   @timed("gemini.summary")
+# Every finished span is logged as one JSON line on the "tour_perf" logger
+# (stage, ms, ok, parent stage, extra fields) and added to a rolling window
+# of the last WINDOW durations per stage, from which p50/p95/p99 are read.
+# Counters (incr) track events that have no duration, e.g. key retries.
+# All state is per process and shared by every session.
+WINDOW = 1000
+METRIC_PREFIX = "tour"
+
+log = logging.getLogger("tour_perf")
+
+_lock = threading.Lock()
+_samples = {}    # stage -> deque of seconds
+_totals = {}     # stage -> [count, sum_seconds, errors]
+_counters = {}   # name -> int
+_local = threading.local()
+
+def _record(stage, seconds, ok):
+    with _lock:
+        window = _samples.get(stage)
+        if window is None:
+            window = _samples[stage] = deque(maxlen=WINDOW)
+            _totals[stage] = [0, 0.0, 0]
+        window.append(seconds)
+        totals = _totals[stage]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += 0 if ok else 1
+
+@contextmanager
+def span(stage, **fields):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(stage)
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        stack.pop()
+        _record(stage, seconds, ok)
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({"stage": stage, "ms": round(seconds * 1000, 1), "ok": ok, "parent": parent, **fields},
+                                default=str, ensure_ascii=False))
+
+def timed(stage):
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def observe(stage, seconds, ok=True):
+    _record(stage, seconds, ok)
+
+def incr(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+# Structured span logs to stderr (or stream), one JSON object per line
+def enable_logging(stream=None, level=logging.INFO):
+    if not any(getattr(h, "_tour_perf", False) for h in log.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler._tour_perf = True
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
+
+# --- READ-OUT ---
+def _quantile(ordered, q):
+    if not ordered: return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def snapshot():
+    with _lock:
+        windows = {k: sorted(v) for k, v in _samples.items()}
+        totals = {k: list(v) for k, v in _totals.items()}
+        counters = dict(_counters)
+    rows = []
+    for stage in sorted(windows):
+        ordered = windows[stage]
+        count, total, errors = totals[stage]
+        rows.append({
+            "stage": stage,
+            "count": count,
+            "errors": errors,
+            "p50_ms": round(_quantile(ordered, 0.50) * 1000, 1),
+            "p95_ms": round(_quantile(ordered, 0.95) * 1000, 1),
+            "p99_ms": round(_quantile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+            "total_s": round(total, 2),
+        })
+    return rows, counters
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+
+def _metric_name(name):
+    return METRIC_PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+# Prometheus text exposition format: one summary for all stages (quantiles
+# over the rolling window, _sum/_count over the process lifetime) plus one
+# counter per incr() name
+def prometheus_text():
+    with _lock:
+        windows = {k: sorted(v) for k, v in _samples.items()}
+        totals = {k: list(v) for k, v in _totals.items()}
+        counters = dict(_counters)
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_seconds Stage latency (quantiles over the last {WINDOW} runs).",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+    ]
+    for stage in sorted(windows):
+        label = stage.replace("\\", "\\\\").replace('"', '\\"')
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{label}",quantile="{q}"}} {_quantile(windows[stage], q):.6f}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{label}"}} {totals[stage][1]:.6f}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{label}"}} {totals[stage][0]}')
+    lines.append(f"# HELP {METRIC_PREFIX}_stage_errors_total Stages that raised.")
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+    for stage in sorted(totals):
+        label = stage.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{label}"}} {totals[stage][2]}')
+    for name in sorted(counters):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {counters[name]}")
+    return "\n".join(lines) + "\n"
+
+# --- OPTIONAL /metrics ENDPOINT ---
+# Streamlit cannot add routes, so scraping goes to a tiny side server. It
+# listens on loopback only unless a host (e.g. "0.0.0.0") is passed in.
+_server = None
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="perf-metrics", daemon=True).start()
+        return _server
@@ -0,0 +1,203 @@
+import re
+import json
+import unicodedata
+import urllib.parse
+
+# schema.org types that describe a bookable tour/activity page
+PRODUCT_TYPES = {"product", "touristtrip", "trip", "event", "touristattraction", "sightseeingtour", "tour"}
+
+_ISO_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$", re.IGNORECASE)
+_AMOUNT = re.compile(r"-?\d[\d.,]*")
+_DOT_THOUSANDS = re.compile(r"-?\d{1,3}(?:\.\d{3})+(?:,\d+)?")  # 1.200,50 / 1.200.000
+_SPACE_THOUSANDS = re.compile(r"(?<=\d)[ \u00a0\u2009\u202f](?=\d{3}\b)")  # 1 200 (space, NBSP, thin spaces)
+_COMMA_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_TITLE_SEPARATOR = re.compile(r"\s+[|\-–—·]\s+")
+
+# --- SMALL HELPERS ---
+def _as_list(value):
+    if value is None: return []
+    return value if isinstance(value, list) else [value]
+
+def _first_text(value):
+    for v in _as_list(value):
+        if isinstance(v, dict):
+            v = v.get("name") or v.get("@value") or v.get("url")
+        if isinstance(v, (str, int, float)) and str(v).strip():
+            return str(v).strip()
+    return ""
+
+# First number in text, read as written: "1,200.50", "1.200,50", "1 200,00",
+# "12,50" and "Rp 1.200.000". A dot before groups of exactly three digits is
+# a thousands separator unless a dot-decimal could be meant ("1.5", "1.2345").
+def parse_amount(text):
+    m = _AMOUNT.search(_SPACE_THOUSANDS.sub("", str(text)))
+    if not m: return None
+    token = m.group(0).rstrip(".,")
+    if _DOT_THOUSANDS.fullmatch(token):
+        token = token.replace(".", "").replace(",", ".")
+    else:
+        token = _COMMA_THOUSANDS.sub("", token).replace(",", ".")
+    m = _NUMBER.match(token)
+    return float(m.group(0)) if m else None
+
+def _squash(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+# og:title usually ends with the site: "Louvre Tour | Acme", "Louvre Tour - Acme Tours".
+# The last segment is dropped only when it names the site (og:site_name or the host),
+# so "Ha Long Bay - Full Day Cruise" keeps both halves.
+def strip_site_suffix(title, site_name="", url=""):
+    title = title.strip()
+    cuts = list(_TITLE_SEPARATOR.finditer(title))
+    if not cuts: return title
+    last = _squash(title[cuts[-1].end():])
+    host = _squash(urllib.parse.urlparse(url).netloc.lower().removeprefix("www."))
+    if len(last) >= 3 and (last == _squash(site_name) or last in host):
+        return title[:cuts[-1].start()].strip()
+    return title
+
+def _to_price(value):
+    if value is None or isinstance(value, bool): return None
+    if isinstance(value, (int, float)): return float(value)
+    return parse_amount(value)
+
+def humanize_duration(value):
+    if not value: return ""
+    m = _ISO_DURATION.match(str(value).strip())
+    if not m:
+        return str(value).strip()
+    days, hours, minutes = (int(x) if x else 0 for x in m.groups())
+    parts = []
+    if days: parts.append(f"{days} day{'s' if days != 1 else ''}")
+    if hours: parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes: parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    return " ".join(parts)
+
+def _put(facts, key, value):
+    if value not in ("", None) and not facts.get(key):
+        facts[key] = value
+
+def _types(node):
+    return {str(t).lower() for t in _as_list(node.get("@type"))}
+
+def _walk(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from _walk(item)
+    elif isinstance(node, dict):
+        yield node
+        for key in ("@graph", "mainEntity", "itemListElement", "item"):
+            if key in node:
+                yield from _walk(node[key])
+
+def _load_ld_blocks(blocks):
+    nodes = []
+    for raw in blocks:
+        raw = raw.strip()
+        if not raw: continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            # Some CMSs leave trailing commas or HTML comments around the JSON
+            try: data = json.loads(re.sub(r",\s*([}\]])", r"\1", raw.strip("<!-> \n")))
+            except ValueError: continue
+        nodes.extend(_walk(data))
+    return nodes
+
+# --- EXTRACTION ---
+# page: output of html_extract.PageExtractor.close(). Returns flat facts; any
+# field that could not be found is left out.
+def extract_structured(page):
+    facts = {}
+    images = []
+
+    nodes = _load_ld_blocks(page.get("ld_json", []))
+    products = [n for n in nodes if _types(n) & PRODUCT_TYPES]
+    for node in products:
+        _put(facts, "name", _first_text(node.get("name")))
+        _put(facts, "description", _first_text(node.get("description")))
+        duration = node.get("duration") or node.get("timeRequired")
+        if duration: _put(facts, "duration", humanize_duration(_first_text(duration)))
+
+        for offer in _as_list(node.get("offers")):
+            if not isinstance(offer, dict): continue
+            for sub in [offer] + [o for o in _as_list(offer.get("offers")) if isinstance(o, dict)]:
+                price = _to_price(sub.get("price") if sub.get("price") is not None else sub.get("lowPrice"))
+                if price is not None and "price" not in facts:
+                    facts["price"] = price
+                    facts["currency"] = _first_text(sub.get("priceCurrency"))
+
+        for loc in _as_list(node.get("location") or node.get("itinerary")):
+            if not isinstance(loc, dict): continue
+            address = loc.get("address") if isinstance(loc.get("address"), dict) else {}
+            city = _first_text(address.get("addressLocality"))
+            country = _first_text(address.get("addressCountry"))
+            if city or country:
+                _put(facts, "city_country", ", ".join(x for x in (city, country) if x))
+                break
+
+        for img in _as_list(node.get("image")):
+            src = img.get("url") if isinstance(img, dict) else img
+            if isinstance(src, str) and src.startswith("http"):
+                images.append(src)
+
+    meta = page.get("meta", {})
+    _put(facts, "name", strip_site_suffix(meta.get("og:title", ""), meta.get("og:site_name", ""),
+                                          meta.get("og:url") or page.get("url", "")))
+    _put(facts, "description", meta.get("og:description", ""))
+    if "price" not in facts:
+        price = _to_price(meta.get("product:price:amount") or meta.get("og:price:amount"))
+        if price is not None:
+            facts["price"] = price
+            facts["currency"] = meta.get("product:price:currency") or meta.get("og:price:currency") or ""
+    for key in ("og:image:secure_url", "og:image", "og:image:url"):
+        if meta.get(key, "").startswith("http"):
+            images.append(meta[key])
+
+    micro = {}
+    for prop, value in page.get("microdata", []):
+        micro.setdefault(prop, value)
+        if prop == "image" and str(value).startswith("http"):
+            images.append(value)
+    _put(facts, "name", micro.get("name", ""))
+    if "price" not in facts and _to_price(micro.get("price")) is not None:
+        facts["price"] = _to_price(micro.get("price"))
+        facts["currency"] = micro.get("priceCurrency", "")
+    if "duration" not in facts and micro.get("duration"):
+        facts["duration"] = humanize_duration(micro["duration"])
+
+    seen = set()
+    facts["images"] = [i for i in images if not (i in seen or seen.add(i))]
+    return {k: v for k, v in facts.items() if v not in ("", None, [])}
+
+# --- PRE-FILL FOR THE SUMMARY SCHEMA ---
+# Only facts that need no rewriting are pre-filled. Free text (name, duration)
+# is only trusted when the output language is English; prices always are.
+def prefill_summary(facts, target_lang="English"):
+    if not facts: return {}
+    prefilled = {}
+    basic = {}
+    if target_lang == "English":
+        for field, fact in (("main_attractions", "name"), ("duration", "duration"), ("city_country", "city_country")):
+            if facts.get(fact):
+                # Same Roman-characters-only rule the summary prompt enforces
+                value = unicodedata.normalize('NFKD', facts[fact]).encode('ascii', 'ignore').decode('ascii')
+                basic[field] = value.split(" | ")[0].strip()
+    if basic:
+        prefilled["basic_info"] = basic
+
+    if facts.get("price") is not None and facts.get("currency"):
+        prefilled["pricing"] = {
+            "currency": facts["currency"].upper(),
+            "adult_price": facts["price"],
+        }
+    return prefilled
+
+def merge_prefilled(summary, prefilled):
+    for section, fields in (prefilled or {}).items():
+        target = summary.setdefault(section, {})
+        if isinstance(target, dict) and isinstance(fields, dict):
+            for key, value in fields.items():
+                target[key] = value
+    return summary
@@ -0,0 +1,160 @@
+import re
+
+# Rough but stable: ~4 chars per token for Latin scripts, ~1 token per CJK/Thai char
+_WIDE_CHARS = re.compile(r"[฀-๿぀-ヿ㐀-䶿一-鿿가-힯]")
+
+# Lines that usually open a new section in tour pages and brochures
+_HEADING = re.compile(
+    r"^\s*(#{1,6}\s+\S|day\s*\d+|d\d+\b|itinerary|highlights?|overview|description|what to expect|"
+    r"inclu(ded|sions?)|exclu(ded|sions?)|what'?s included|pric(e|es|ing)|rates?|cancell?ation|"
+    r"polic(y|ies)|faq|frequently asked|meeting point|pick-?up|important information|know before you go)",
+    re.IGNORECASE,
+)
+
+PLACEHOLDERS = {"", "to be confirmed", "n/a", "na", "none", "unknown", "-", "tbc"}
+
+# --- MEASURE ---
+def estimate_tokens(text):
+    if not text: return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+# --- SPLIT AT SECTION BOUNDARIES ---
+def split_sections(text):
+    sections = []
+    current = []
+    for line in text.splitlines():
+        is_heading = bool(_HEADING.match(line)) or (line.isupper() and 3 <= len(line.strip()) <= 60)
+        if is_heading and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return [s for s in sections if s.strip()]
+
+# Longest prefix of line that estimate_tokens puts within max_tokens (never empty)
+def _cut_point(line, max_tokens):
+    wide = narrow = 0
+    for i, ch in enumerate(line):
+        if _WIDE_CHARS.match(ch): wide += 1
+        else: narrow += 1
+        if wide + (narrow + 3) // 4 > max_tokens:
+            return max(i, 1)
+    return len(line)
+
+def _hard_split(section, max_tokens):
+    # Oversized section: fall back to paragraphs, then lines, then a raw cut
+    pieces = []
+    for unit in re.split(r"\n\s*\n", section):
+        if estimate_tokens(unit) <= max_tokens:
+            pieces.append(unit)
+            continue
+        for line in unit.splitlines():
+            while estimate_tokens(line) > max_tokens:
+                cut = _cut_point(line, max_tokens)
+                pieces.append(line[:cut])
+                line = line[cut:]
+            pieces.append(line)
+    return pieces
+
+def pack_chunks(text, max_tokens):
+    chunks = []
+    current, current_tokens = [], 0
+    for section in split_sections(text):
+        units = [section] if estimate_tokens(section) <= max_tokens else _hard_split(section, max_tokens)
+        for unit in units:
+            t = estimate_tokens(unit)
+            if current and current_tokens + t > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += t
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+# --- PLAN ---
+def plan_document(text, max_input_tokens, prompt_tokens=0):
+    input_tokens = estimate_tokens(text)
+    if input_tokens <= max_input_tokens:
+        chunks = [text]
+    else:
+        chunks = pack_chunks(text, max_input_tokens)
+    chunk_tokens = [estimate_tokens(c) for c in chunks]
+    return {
+        "mode": "single" if len(chunks) == 1 else "map_reduce",
+        "chunks": chunks,
+        "input_tokens": input_tokens,
+        "chunk_tokens": chunk_tokens,
+        "prompt_tokens": prompt_tokens,
+        "total_request_tokens": sum(chunk_tokens) + prompt_tokens * len(chunks),
+    }
+
+# --- MERGE PARTIAL RESULTS ---
+def _is_placeholder(value):
+    if value is None: return True
+    if isinstance(value, (int, float)): return value == 0
+    if isinstance(value, (list, dict)): return len(value) == 0
+    return str(value).strip().lower() in PLACEHOLDERS
+
+def _union(lists, key=None):
+    out, seen = [], set()
+    for items in lists:
+        for item in items if isinstance(items, list) else []:
+            marker = key(item) if key else (str(item).strip().lower() if not isinstance(item, dict) else repr(sorted(item.items())))
+            if marker in seen: continue
+            seen.add(marker)
+            out.append(item)
+    return out
+
+def _first(values):
+    for v in values:
+        if not _is_placeholder(v): return v
+    return values[0] if values else None
+
+def _last(values):
+    return _first(list(reversed(values)))
+
+# partials: summary dicts in document order. Scalars take the first real value
+# (the opening pages usually carry the overview), list fields are unioned in
+# order, and the itinerary is stitched: first start, all segments, last end.
+def merge_partials(partials, max_highlights=4):
+    partials = [p for p in partials if isinstance(p, dict)]
+    if not partials: return {}
+    if len(partials) == 1: return partials[0]
+
+    def section(name):
+        return [p.get(name) if isinstance(p.get(name), dict) else {} for p in partials]
+
+    merged = {}
+    for name in ("basic_info", "policies", "restrictions", "inclusions", "seo", "pricing", "analysis"):
+        parts = section(name)
+        keys = []
+        for part in parts:
+            keys.extend(k for k in part if k not in keys)
+        out = {}
+        for k in keys:
+            values = [part.get(k) for part in parts if k in part]
+            if any(isinstance(v, list) for v in values):
+                out[k] = _union(values)
+            else:
+                out[k] = _first(values)
+        merged[name] = out
+
+    info = merged.get("basic_info", {})
+    if isinstance(info.get("highlights"), list):
+        info["highlights"] = info["highlights"][:max_highlights]
+    if isinstance(info.get("selling_points"), list):
+        info["selling_points"] = info["selling_points"][:5]
+
+    itins = section("klook_itinerary")
+    merged["klook_itinerary"] = {
+        "start": _first([i.get("start") for i in itins if i.get("start")]) or {},
+        "segments": _union(
+            [i.get("segments", []) for i in itins],
+            key=lambda s: (str(s.get("time", "")).strip(), str(s.get("name", "")).strip().lower()) if isinstance(s, dict) else str(s),
+        ),
+        "end": _last([i.get("end") for i in itins if i.get("end")]) or {},
+    }
+    return merged
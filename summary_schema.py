@@ -0,0 +1,263 @@
+import re
+import json
+
+from json_stream import SectionStreamParser
+from structured_data import parse_amount
+
+# --- SUMMARY JSON CONTRACT ---
+# Field-level templates, so fields already known from the page's structured data
+# can be left out of the prompt (and merged back in afterwards). The examples
+# are valid JSON and double as the type of each field for the response schema
+# and the validator below.
+SUMMARY_FIELD_TEMPLATES = {
+    "basic_info": [
+        ("city_country", '"City, Country"'),
+        ("group_type", '"Private/Join-in (small group)/Join-in (big group)"'),
+        ("min_pax", '"1"'),
+        ("max_pax", '"15"'),
+        ("duration", '"Duration"'),
+        ("main_attractions", '"Tour Name"'),
+        ("highlights", '["Highlight 1 (10-12 words)", "Highlight 2 (10-12 words)", "Highlight 3", "Highlight 4"]'),
+        ("what_to_expect", '"Strictly 100-120 words and max 800 chars. No final full stop"'),
+        ("selling_points", '["Tag 1", "Tag 2"]'),
+    ],
+    "klook_itinerary": [
+        ("start", '{ "time": "09:00", "location": "Meeting Point" }'),
+        ("segments", '[{ "type": "Attraction", "time": "10:00", "name": "Name", "details": "Details", "location_search": "Search Term", "ticket_status": "Free/Ticket" }]'),
+        ("end", '{ "time": "17:00", "location": "Drop off" }'),
+    ],
+    "policies": [("cancellation", '"Policy"'), ("merchant_contact", '"+X-XXX-XXX-XXXX"')],
+    "inclusions": [("included", '["Item 1"]'), ("excluded", '["Item 2"]')],
+    "restrictions": [("child_policy", '"Details"'), ("accessibility", '"Details"'), ("faq", '["FAQ content"]')],
+    "seo": [("keywords", '["Key 1"]')],
+    "pricing": [
+        ("details", '"Original text string"'),
+        ("currency", '"USD"'),
+        ("adult_price", "0.0"),
+        ("child_price", "0.0"),
+        ("infant_price", "0.0"),
+        ("child_age", '"0-15"'),
+    ],
+    "analysis": [("ota_search_term", '"Product Name"')],
+}
+
+def template_fields(known=None):
+    known = known or {}
+    for section, fields in SUMMARY_FIELD_TEMPLATES.items():
+        skip = known.get(section, {})
+        for name, example in fields:
+            if name not in skip:
+                yield section, name, json.loads(example)
+
+# --- RESPONSE SCHEMA (GEMINI response_schema) ---
+def _schema_for(example):
+    if isinstance(example, dict):
+        return {"type": "object", "properties": {k: _schema_for(v) for k, v in example.items()}, "required": list(example)}
+    if isinstance(example, list):
+        return {"type": "array", "items": _schema_for(example[0])}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+# Same shape as the prompt's REQUIRED JSON STRUCTURE; known fields are left out.
+# fields: [(section, name)] to ask for only those (the repair request).
+def summary_response_schema(known=None, fields=None):
+    sections = {}
+    for section, name, example in template_fields(known):
+        if fields is not None and (section, name) not in fields: continue
+        sections.setdefault(section, {})[name] = _schema_for(example)
+    return {
+        "type": "object",
+        "properties": {s: {"type": "object", "properties": props, "required": list(props)} for s, props in sections.items()},
+        "required": list(sections),
+    }
+
+# --- TOLERANT PARSING ---
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Cuts a truncated object back to its last complete value and closes the open brackets
+def close_truncated(text):
+    stack, in_string, escape = [], False, False
+    cut, cut_stack = None, None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape: escape = False
+            elif ch == "\\": escape = True
+            elif ch == '"': in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack: break
+            stack.pop()
+            cut, cut_stack = i + 1, list(stack)
+            if not stack: return text[:i + 1]
+        elif ch == ",":
+            cut, cut_stack = i, list(stack)
+    if cut is None:
+        return None
+    return text[:cut] + "".join(reversed(cut_stack))
+
+# Returns the summary dict, or as many whole sections / fields as could be read
+# from malformed or cut-off JSON, or None when nothing is readable
+def parse_summary_tolerant(text):
+    if not text: return None
+    clean = _FENCE.sub("", str(text).strip())
+    start = clean.find("{")
+    if start < 0: return None
+    clean = clean[start:]
+    try:
+        data = json.loads(clean[:clean.rfind("}") + 1])
+        if isinstance(data, dict): return data
+    except ValueError:
+        pass
+    closed = close_truncated(clean)
+    if closed:
+        try:
+            data = json.loads(closed)
+            if isinstance(data, dict) and data: return data
+        except ValueError:
+            pass
+    parser = SectionStreamParser()
+    parser.feed(clean)
+    return {k: v for k, v in parser.sections.items() if isinstance(v, dict)} or None
+
+# --- FIELD VALIDATION ---
+def _coerce(value, example):
+    if isinstance(example, (int, float)):
+        if isinstance(value, bool): return None
+        if isinstance(value, (int, float)): return float(value)
+        if isinstance(value, str) and value.strip().lower() == "free": return 0.0
+        return parse_amount(value) if isinstance(value, str) else None
+    if isinstance(example, str):
+        return value if isinstance(value, str) and value.strip() else None
+    if isinstance(example, list):
+        if isinstance(example[0], str) and isinstance(value, str) and value.strip():
+            return [value]
+        if not isinstance(value, list): return None
+        items = [_coerce(v, example[0]) for v in value]
+        return None if any(v is None for v in items) else items
+    if isinstance(example, dict):
+        if not isinstance(value, dict) or any(k not in value for k in example): return None
+        return value
+    return value
+
+# Coerces near-misses in place (numeric strings, a lone string for a list) and
+# returns the (section, field) pairs that are still missing or the wrong type
+def invalid_fields(data, known=None):
+    bad = []
+    for section, name, example in template_fields(known):
+        block = data.get(section)
+        if not isinstance(block, dict):
+            bad.append((section, name))
+            continue
+        if name not in block:
+            bad.append((section, name))
+            continue
+        value = _coerce(block[name], example)
+        if value is None:
+            bad.append((section, name))
+        else:
+            block[name] = value
+    return bad
+
+def merge_fields(data, repaired, fields):
+    for section, name in fields:
+        block = repaired.get(section)
+        if isinstance(block, dict) and name in block:
+            target = data.get(section)
+            if not isinstance(target, dict):
+                target = data[section] = {}
+            target[name] = block[name]
+    return data
+
+# --- CONTENT RULES (THE PROMPT'S HARD LIMITS, CHECKED LOCALLY) ---
+WTE_WORDS = (100, 120)
+WTE_MAX_CHARS = 800
+HIGHLIGHT_COUNT = 4
+HIGHLIGHT_WORDS = (10, 12)
+SELLING_POINT_COUNT = (3, 5)
+
+# Case-sensitive "us" so "US$50" / "the US" are not read as first person
+_FIRST_PERSON = re.compile(r"\b(?:[Ww]e|us|[Oo]urs?)\b")
+# Thai / kana / CJK are written without spaces, so word counts mean nothing there
+# (Korean puts spaces between words and is counted like Latin text)
+_UNSPACED = re.compile(r"[฀-๿぀-ヿ㐀-䶿一-鿿]")
+
+def parse_selling_points(text):
+    return [t.strip() for t in text.replace("\n", " ").split(",") if t.strip()]
+
+def word_count(text):
+    return len(str(text).split())
+
+def _counts_words(text):
+    return not _UNSPACED.search(str(text))
+
+# Fixes that need no model: trailing full stops, selling point spelling /
+# unknown tags / duplicates, more than 4 highlights when the first 4 comply
+def apply_local_fixes(data, allowed_selling_points):
+    info = data.get("basic_info")
+    if not isinstance(info, dict): return data
+    if isinstance(info.get("highlights"), list):
+        info["highlights"] = [h.rstrip(".") if isinstance(h, str) else h for h in info["highlights"]]
+        head = info["highlights"][:HIGHLIGHT_COUNT]
+        if len(info["highlights"]) > HIGHLIGHT_COUNT and not _highlight_problems(head):
+            info["highlights"] = head
+    if isinstance(info.get("what_to_expect"), str):
+        info["what_to_expect"] = info["what_to_expect"].rstrip().rstrip(".")
+    if isinstance(info.get("selling_points"), list):
+        canonical = {p.lower(): p for p in allowed_selling_points}
+        kept = []
+        for tag in info["selling_points"]:
+            tag = canonical.get(str(tag).strip().lower())
+            if tag and tag not in kept: kept.append(tag)
+        info["selling_points"] = kept[:SELLING_POINT_COUNT[1]]
+    return data
+
+def _highlight_problems(highlights):
+    problems = []
+    if len(highlights) != HIGHLIGHT_COUNT:
+        problems.append(f"has {len(highlights)} highlights, needs exactly {HIGHLIGHT_COUNT}")
+    for i, h in enumerate(highlights, 1):
+        if not isinstance(h, str): continue
+        n = word_count(h)
+        if _counts_words(h) and not HIGHLIGHT_WORDS[0] <= n <= HIGHLIGHT_WORDS[1]:
+            problems.append(f"highlight {i} has {n} words, needs {HIGHLIGHT_WORDS[0]}-{HIGHLIGHT_WORDS[1]}")
+    return problems
+
+# {(section, field): reason} for every rule the summary breaks
+def rule_violations(data, allowed_selling_points):
+    info = data.get("basic_info") if isinstance(data, dict) else None
+    if not isinstance(info, dict): return {}
+    found = {}
+
+    wte = info.get("what_to_expect")
+    if isinstance(wte, str) and wte.strip():
+        problems = []
+        n = word_count(wte)
+        if _counts_words(wte) and not WTE_WORDS[0] <= n <= WTE_WORDS[1]:
+            problems.append(f"{n} words, needs {WTE_WORDS[0]}-{WTE_WORDS[1]}")
+        if len(wte) >= WTE_MAX_CHARS:
+            problems.append(f"{len(wte)} characters, needs under {WTE_MAX_CHARS}")
+        if _FIRST_PERSON.search(wte):
+            problems.append('uses "we"/"us"/"our" instead of "The operator"')
+        if problems: found[("basic_info", "what_to_expect")] = "; ".join(problems)
+
+    highlights = info.get("highlights")
+    if isinstance(highlights, list):
+        problems = _highlight_problems(highlights)
+        if problems: found[("basic_info", "highlights")] = "; ".join(problems)
+
+    points = info.get("selling_points")
+    if isinstance(points, list):
+        allowed = {p.lower() for p in allowed_selling_points}
+        unknown = [p for p in points if str(p).strip().lower() not in allowed]
+        problems = []
+        if not SELLING_POINT_COUNT[0] <= len(points) <= SELLING_POINT_COUNT[1]:
+            problems.append(f"has {len(points)} tags, needs {SELLING_POINT_COUNT[0]}-{SELLING_POINT_COUNT[1]}")
+        if unknown:
+            problems.append("not in the list: " + ", ".join(map(str, unknown)))
+        if problems: found[("basic_info", "selling_points")] = "; ".join(problems)
+    return found
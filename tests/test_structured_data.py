@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from structured_data import parse_amount, extract_structured, strip_site_suffix
+from summary_schema import invalid_fields
+
+@pytest.mark.parametrize("text, expected", [
+    ("45", 45.0),
+    ("USD 45.99 pp", 45.99),
+    ("1,200.50", 1200.5),
+    ("USD 1,234,567", 1234567.0),
+    ("12,50", 12.5),
+    ("1.200,50", 1200.5),
+    ("EUR 1.234.567,89", 1234567.89),
+    ("EUR 1.200", 1200.0),
+    ("Rp 1.200.000", 1200000.0),
+    ("1 200,00", 1200.0),
+    ("1\u00a0200,00", 1200.0),
+    ("1\u2009200 €", 1200.0),
+    ("1\u202f200\u202f000 ₫", 1200000.0),
+    ("1.5", 1.5),
+    ("1.2345", 1.2345),
+    ("-3,5", -3.5),
+    ("no price", None),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+def _offer_page(offer):
+    ld = json.dumps({"@type": "Product", "name": "Tour", "offers": dict(offer, priceCurrency="IDR")})
+    return {"ld_json": [ld], "meta": {}, "microdata": {}}
+
+def test_structured_price_keeps_thousands():
+    assert extract_structured(_offer_page({"price": "1.200.000"}))["price"] == 1200000.0
+
+def test_structured_price_keeps_free_offer():
+    assert extract_structured(_offer_page({"price": 0, "lowPrice": 99}))["price"] == 0.0
+
+def test_summary_price_coerced_from_text():
+    data = {"pricing": {"adult_price": "Rp 1.200.000", "child_price": "1 200,00"}}
+    invalid_fields(data)
+    assert data["pricing"]["adult_price"] == 1200000.0
+    assert data["pricing"]["child_price"] == 1200.0
+
+@pytest.mark.parametrize("title, site_name, url, expected", [
+    ("Louvre Tour - Acme Tours", "Acme Tours", "", "Louvre Tour"),
+    ("Louvre Tour – GetYourGuide", "", "https://www.getyourguide.com/paris/louvre", "Louvre Tour"),
+    ("Ha Long Bay - Full Day Cruise", "Acme", "https://acme.example/", "Ha Long Bay - Full Day Cruise"),
+    ("Louvre Tour", "Acme", "", "Louvre Tour"),
+])
+def test_strip_site_suffix(title, site_name, url, expected):
+    assert strip_site_suffix(title, site_name, url) == expected
+
+def test_og_title_site_suffix_dropped():
+    page = {"ld_json": [], "microdata": {}, "url": "https://www.acmetours.com/louvre",
+            "meta": {"og:title": "Louvre Skip-the-Line Tour - Acme Tours"}}
+    assert extract_structured(page)["name"] == "Louvre Skip-the-Line Tour"
@@ -0,0 +1,154 @@
+import io
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from image_probe import download_capped, MAX_HASH_BYTES
+from lazy_deps import lazy, available
+
+Image = lazy("PIL.Image")
+HAS_PIL = available("PIL")
+
+DEFAULT_THUMB_DIR = os.path.join(".cache", "thumbs")
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+THUMB_SIZE = (320, 200)
+THUMB_QUALITY = 80
+
+# --- ON-DISK THUMBNAIL + ORIGINAL CACHE FOR SCRAPED IMAGES ---
+# Each remote image is downloaded once and kept as <sha1(url)>.orig next to a
+# small <sha1(url)>.jpg preview. The preview grid is served from the previews
+# (no browser ever pulls the remote original), duplicate detection hashes
+# the previews, and the resize pipeline reads the cached original.
+# Files are evicted least-recently-used (mtime is bumped on every read)
+# once the directory grows past max_bytes.
+class ThumbnailCache:
+    def __init__(self, root=DEFAULT_THUMB_DIR, max_bytes=DEFAULT_MAX_BYTES, thumb_size=THUMB_SIZE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.thumb_size = thumb_size
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._path_locks = {}  # path -> [lock, waiters]; dropped when the last waiter is done
+        self._bytes = sum(os.path.getsize(os.path.join(root, f)) for f in os.listdir(root) if not f.endswith(".tmp"))
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url, suffix):
+        return os.path.join(self.root, hashlib.sha1(url.encode("utf-8")).hexdigest() + suffix)
+
+    # One writer per cache file, so two threads never share a .tmp or rename a half-written one
+    @contextmanager
+    def _path_lock(self, path):
+        with self._lock:
+            entry = self._path_locks.get(path)
+            if entry is None:
+                entry = self._path_locks[path] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0: del self._path_locks[path]
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try: os.utime(path)
+        except OSError: pass
+        return data
+
+    def _write(self, path, data):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            try: old = os.path.getsize(path)
+            except OSError: old = 0
+            os.replace(tmp, path)
+            self._bytes += len(data) - old
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict(keep=path)
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".tmp") or path == keep: continue
+            try: entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError: pass
+        entries.sort()
+        with self._lock:
+            for _, size, path in entries:
+                if self._bytes <= self.max_bytes * 0.9: break
+                try: os.remove(path)
+                except OSError: continue
+                self._bytes -= size
+
+    # Raises like download_capped when the image cannot be fetched, and ValueError
+    # when it is larger than MAX_HASH_BYTES (a cut-off body is not a usable image)
+    def original(self, url):
+        path = self._path(url, ".orig")
+        data = self._read(path)
+        if data is not None:
+            self.hits += 1
+            return data
+        with self._path_lock(path):
+            data = self._read(path)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+            data = download_capped(url)
+            if len(data) >= MAX_HASH_BYTES:
+                raise ValueError(f"image is larger than {MAX_HASH_BYTES // (1024 * 1024)} MB")
+            self._write(path, data)
+            return data
+
+    def thumbnail(self, url):
+        path = self._path(url, ".jpg")
+        data = self._read(path)
+        if data is not None:
+            return data
+        with self._path_lock(path):
+            data = self._read(path)
+            if data is not None:
+                return data
+            data = self._make_thumbnail(self.original(url))
+            self._write(path, data)
+            return data
+
+    def _make_thumbnail(self, original):
+        img = Image.open(io.BytesIO(original))
+        img.draft("RGB", (self.thumb_size[0] * 2, self.thumb_size[1] * 2))
+        if img.mode != "RGB":
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3])
+            img = background
+        img.thumbnail(self.thumb_size, Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=THUMB_QUALITY)
+        return buf.getvalue()
+
+    # url -> preview bytes, or None where the image could not be fetched/decoded
+    def prefetch(self, urls, workers=6):
+        urls = list(urls)
+        if not urls or not HAS_PIL:
+            return {}
+        def safe_thumb(url):
+            try: return self.thumbnail(url)
+            except Exception: return None
+        with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as pool:
+            return dict(zip(urls, pool.map(safe_thumb, urls)))
+
+    def stats(self):
+        with self._lock:
+            return {"bytes": self._bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
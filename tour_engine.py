@@ -0,0 +1,1035 @@
+import io
+import os
+import json
+import time
+import random
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_deps import lazy, available
+from key_scheduler import KeyScheduler, RateLimited, retry_hint_seconds, run_with_rotation, is_rate_limit_error
+from fetcher import get_fetcher, read_capped, TLS_DEFAULT, TLS_LEGACY
+from html_extract import PageExtractor, sniff_encoding
+from structured_data import extract_structured, prefill_summary, merge_prefilled
+from gemini_cache import GeminiCache, DEFAULT_CACHE_PATH, make_key, normalize_text
+from summary_planner import estimate_tokens, plan_document, merge_partials
+from json_stream import SectionStreamParser
+from summary_schema import (
+    SUMMARY_FIELD_TEMPLATES, summary_response_schema, parse_summary_tolerant, invalid_fields, merge_fields,
+    parse_selling_points, apply_local_fixes, rule_violations,
+)
+from pdf_engine import extract_pdf, HAS_PYPDF, HAS_PDFPLUMBER
+from image_probe import rank_image_candidates
+from perf import span, timed, observe, incr
+from thumb_cache import ThumbnailCache, DEFAULT_THUMB_DIR
+from gemini_clients import GeminiClientPool
+from model_router import ModelRouter
+
+# Scrape / PDF / Gemini core shared by the Streamlit app and the headless CLI.
+# Nothing in here touches Streamlit: settings come from whatever mapping was
+# passed to configure() (st.secrets in the app), then environment variables.
+
+# Heavy clients load on first use (see lazy_deps)
+bs4 = lazy("bs4")
+whois = lazy("whois")
+Image = lazy("PIL.Image")
+HAS_WHOIS = available("whois")
+
+# --- SETTINGS & KEYS ---
+_settings = None
+
+def configure(settings):
+    global _settings
+    _settings = settings
+
+def get_setting(name, default=None):
+    try:
+        if _settings is not None and name in _settings:
+            return _settings[name]
+    except Exception:
+        pass
+    return os.environ.get(name, default)
+
+def get_all_keys():
+    keys = get_setting("GEMINI_KEYS")
+    if keys:
+        # Environment variables carry the list as "key1,key2"
+        return [k.strip() for k in keys.split(",") if k.strip()] if isinstance(keys, str) else list(keys)
+    single = get_setting("GEMINI_API_KEY")
+    return [single] if single else []
+
+# --- SHARED KEY SCHEDULER (ONE INSTANCE ACROSS ALL SESSIONS) ---
+_shared_lock = threading.Lock()
+_shared_scheduler = None
+_shared_cache = None
+_shared_thumbs = None
+_shared_clients = None
+_shared_router = None
+
+def get_key_scheduler(keys):
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = KeyScheduler(
+                [],
+                requests_per_minute=float(get_setting("GEMINI_KEY_RPM", 60)),
+                max_in_flight=int(get_setting("GEMINI_KEY_MAX_IN_FLIGHT", 2)),
+            )
+    _shared_scheduler.update_keys(list(keys))
+    get_client_pool().retain(keys)
+    get_model_router().forget(keys)
+    return _shared_scheduler
+
+# One Gemini client per key instead of genai.configure (see gemini_clients)
+def get_client_pool():
+    global _shared_clients
+    with _shared_lock:
+        if _shared_clients is None:
+            _shared_clients = GeminiClientPool()
+        return _shared_clients
+
+def gemini_model(api_key, model_name, generation_config=None):
+    return get_client_pool().model(api_key, model_name, generation_config)
+
+# --- PERSISTENT RESPONSE CACHE (SURVIVES RESTARTS) ---
+# Bump a version whenever its prompt template changes so stale answers are not served.
+PROMPT_VERSIONS = {"summary": "summary-v3", "repair": "repair-v1", "rules": "rules-v1", "caption": "caption-v1", "grammar": "grammar-v1", "merchant": "merchant-v5", "whois": "whois-v1"}
+CACHE_TTLS = {"summary": 7 * 86400, "repair": 7 * 86400, "rules": 7 * 86400, "caption": 30 * 86400, "grammar": 30 * 86400, "merchant": 3 * 86400, "whois": 14 * 86400}
+WHOIS_FAILURE_TTL = 86400  # lookups that failed are retried the next day, not on every audit
+WHOIS_TIMEOUT = 10  # seconds per registrar socket (python-whois >= 0.9); an abandoned lookup ends soon after
+
+def get_response_cache():
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = GeminiCache(
+                get_setting("GEMINI_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(get_setting("GEMINI_CACHE_MAX_MB", 200)) * 1024 * 1024,
+            )
+        return _shared_cache
+
+# --- SCRAPED IMAGE CACHE (ORIGINALS + PREVIEW THUMBNAILS) ---
+def get_thumb_cache():
+    global _shared_thumbs
+    with _shared_lock:
+        if _shared_thumbs is None:
+            _shared_thumbs = ThumbnailCache(
+                get_setting("THUMB_CACHE_DIR", DEFAULT_THUMB_DIR),
+                max_bytes=int(get_setting("THUMB_CACHE_MAX_MB", 500)) * 1024 * 1024,
+            )
+        return _shared_thumbs
+
+def cache_key(kind, model_name, lang, payload):
+    return make_key(kind, PROMPT_VERSIONS[kind], model_name, lang, payload)
+
+# --- SCHEDULED SINGLE-SHOT CALLS (CAPTION / REWRITE / EMAIL) ---
+# These helpers return an error string instead of raising, so turn their
+# failure text back into outcomes the scheduler can learn from.
+def run_scheduled(keys, call, failure_prefix):
+    def attempt(key):
+        result = call(key)
+        if isinstance(result, str) and result.startswith(failure_prefix):
+            if "429" in result or "quota" in result.lower():
+                raise RateLimited(result, retry_hint_seconds(result))
+            raise RuntimeError(result)
+        return result
+
+    result, last_error = run_with_rotation(get_key_scheduler(keys), attempt)
+    return result if result is not None else f"{failure_prefix}: {last_error}"
+
+# --- IMPROVED MERCHANT RISK LOGIC (V5 - AUTO-RETRY & MATH RULES) ---
+# --- WHOIS DOMAIN AGE (CACHED PER DOMAIN) ---
+# Registrars rate-limit hard, and bulk screening hits the same domains over
+# and over, so creation dates go through the persistent response cache.
+def whois_domain(url):
+    netloc = urllib.parse.urlparse(url if "://" in url else "http://" + url).netloc.lower()
+    return netloc.split("@")[-1].split(":")[0].removeprefix("www.")
+
+def domain_age_years(url):
+    domain = whois_domain(url)
+    if not HAS_WHOIS or not domain:
+        return "Unknown"
+    ck = make_key("whois", PROMPT_VERSIONS["whois"], "", "", domain)
+    cached = get_response_cache().get("whois", ck)
+    if cached:
+        created = json.loads(cached).get("created")
+    else:
+        created = None
+        try:
+            with span("merchant.whois_lookup"):
+                w = whois.whois(domain, timeout=WHOIS_TIMEOUT)
+            c_date = w.creation_date[0] if isinstance(w.creation_date, list) else w.creation_date
+            created = c_date.replace(tzinfo=None).isoformat() if c_date else None
+        except Exception: pass
+        get_response_cache().set("whois", ck, json.dumps({"created": created}),
+                                 CACHE_TTLS["whois"] if created else WHOIS_FAILURE_TTL)
+    if not created:
+        return "Unknown"
+    return (datetime.now() - datetime.fromisoformat(created)).days // 365
+
+# --- MERCHANT SITE FETCHING (CONCURRENT, UNDER ONE DEADLINE) ---
+ABOUT_KEYWORDS = ['about', 'who-we-are', 'story', 'company', 'legal']  # preference order
+MAX_ABOUT_LINKS = 4
+MERCHANT_PAGE_TIMEOUT = 15
+AUDIT_FAN_OUT = 1 + MAX_ABOUT_LINKS  # WHOIS + every About candidate
+
+# One attempt only: the audit deadline, not the fetcher's retry policy, bounds it
+@timed("merchant.fetch_page")
+def _fetch_soup(url, timeout):
+    res = get_fetcher().get(url, timeout=max(1, timeout), client="cloudscraper", tls_profile=TLS_DEFAULT, retries=0)
+    return res.status_code, bs4.BeautifulSoup(res.content, 'html.parser')
+
+def _visible_text(soup):
+    for s in soup(["script", "style", "noscript"]): s.extract()
+    return soup.get_text(separator=' ')[:15000]
+
+def about_links(soup, base_url, limit=MAX_ABOUT_LINKS):
+    found = []
+    for link in soup.find_all('a', href=True):
+        href = link['href'].lower()
+        rank = next((i for i, w in enumerate(ABOUT_KEYWORDS) if w in href), None)
+        if rank is None: continue
+        target = urllib.parse.urljoin(base_url, link['href']).split('#')[0]
+        if target.rstrip('/') != base_url.rstrip('/') and target not in [t for _, t in found]:
+            found.append((rank, target))
+    found.sort(key=lambda f: f[0])  # stable: page order within a keyword
+    return [t for _, t in found[:limit]]
+
+# set_stage(label) is optional progress reporting for batch runs.
+# Each audit has its own small pool, so bulk screening never queues one
+# audit's fetches behind another's. WHOIS runs alongside the homepage fetch and every About candidate is
+# fetched in parallel; the site phase as a whole is capped by
+# MERCHANT_FETCH_DEADLINE seconds, after which whatever arrived is used.
+# MERCHANT_AUDIT_DEADLINE caps the whole audit: the model call gets what is
+# left of it as its request timeout, and no new call starts once it is spent.
+@timed("merchant.total")
+def validate_merchant_risk(text, url, keys, set_stage=None):
+    if not keys: return {"error": "No API keys found."}
+    set_stage = set_stage or (lambda label: None)
+    started = time.monotonic()
+    deadline = started + float(get_setting("MERCHANT_FETCH_DEADLINE", 20))
+    remaining = lambda: deadline - time.monotonic()
+    audit_deadline = started + float(get_setting("MERCHANT_AUDIT_DEADLINE", 60))
+    
+    scraped_content = text
+    inferred_name = ""
+    # Not a context manager: a lookup that overruns the deadline is abandoned,
+    # not waited for (WHOIS still lands in the cache)
+    pool = ThreadPoolExecutor(max_workers=AUDIT_FAN_OUT, thread_name_prefix="audit")
+    whois_future = pool.submit(domain_age_years, url) if url else None
+    
+    # 1. Automatic "About Us" and Merchant Name Hunting
+    if url:
+        set_stage("Fetching site")
+        try:
+            status_code, soup = _fetch_soup(url, min(MERCHANT_PAGE_TIMEOUT, remaining()))
+            
+            title = soup.find('title')
+            if title:
+                inferred_name = title.get_text().split('|')[0].split('-')[0].strip()
+            else:
+                inferred_name = urllib.parse.urlparse(url).netloc.replace("www.", "").split('.')[0].capitalize()
+
+            if not text:
+                candidates = about_links(soup, url)
+                futures = [pool.submit(_fetch_soup, c, min(MERCHANT_PAGE_TIMEOUT, remaining())) for c in candidates]
+                homepage_text = _visible_text(soup)
+                # Best About page = first by keyword preference that answered with real text
+                for fut in futures:
+                    try:
+                        code, about_soup = fut.result(timeout=max(0, remaining()))
+                    except Exception:
+                        continue
+                    about_text = _visible_text(about_soup)
+                    if code == 200 and len(about_text.split()) >= 50:
+                        scraped_content = about_text
+                        break
+                else:
+                    scraped_content = homepage_text
+                for fut in futures: fut.cancel()
+        except:
+            pass
+
+    # 2. Whois Check (already running since the start of the audit)
+    domain_years = "Unknown"
+    if whois_future is not None:
+        with span("merchant.whois_wait"):
+            try: domain_years = whois_future.result(timeout=max(0, remaining()))
+            except Exception: pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    # 3. Gemini Prompt with Advanced Vetting Logic
+    prompt = f"""
+    Analyze this merchant for Klook/GYG onboarding.
+    URL: {url}
+    CONTENT: {scraped_content[:10000]}
+    
+    TASK:
+    1. Categories - Find ALL offerings and classify them STRICTLY into:
+       - 'approve_categories_found': Only use "Attraction tickets", "Recurring shows", "Theme park", "Water park", "Transportation pass".
+       - 'red_flag_categories_found': Only use "Food tours", "Dining experiences", "Private tours", "Walking tours", "Bus/Car/Boat tours", "Hiking & trekking", "ATV & All Wheel Drive", "Air tours", "ATV/All Wheel Drive tours", "Bicycle tours", "Food tours", "Food coupons", "Hop-on Hop-off bus", "Kayaking tours", "Multiday tours", "Outlet tours", "Private transfers", "Railway tours", "Shore excursions", "Ski tours", "Spa/Beauty", "Wifi & SIM".
+       - 'other_categories_found': List ANY other activities they offer not listed above.
+    2. Assess legitimacy (1-100) and provide a 'score_reason'.
+    3. Make a final decision ('Approved' or 'Rejected').
+    4. Provide a 'status_reason' explaining the Approved/Rejected decision.
+    
+    Return JSON:
+    {{
+        "merchant_name": "Extracted Name",
+        "legitimacy_score": 1-100,
+        "score_reason": "Explain why this score was given...",
+        "preferred_categories_found": ["Category 1"],
+        "red_flag_categories_found": ["Category 2"],
+        "other_categories_found": ["Category 3"],
+        "status": "Approved" or "Rejected",
+        "status_reason": "Explain why approved or rejected based on categories...",
+        "red_flags": ["General concern 1"],
+        "strengths": ["Positive 1"],
+        "summary": "Overview"
+    }}
+    """
+    
+    # 4. ROTATION LOOP (Scheduler hands out the healthiest key until one works)
+    set_stage("AI audit")
+    def audit_with_key(key):
+        model_name = get_working_model_name(key, "merchant")
+        ck = cache_key("merchant", model_name, "", prompt)
+        cached = get_response_cache().get("merchant", ck)
+        if cached: return json.loads(cached)
+
+        # Out of time is not the key's fault, so it comes back as a result rather than an error
+        left = audit_deadline - time.monotonic()
+        if left <= 0:
+            return {"error": "Merchant audit deadline passed before the AI audit could run."}
+        model = gemini_model(key, model_name, {"response_mime_type": "application/json"})
+        
+        with span("gemini.merchant"), routed(key, model_name, "merchant"):
+            response = model.generate_content(prompt, request_options={"timeout": left})
+        
+        # Bulletproof JSON Parsing
+        clean_json = response.text.strip()
+        if clean_json.startswith("```json"): clean_json = clean_json[7:]
+        if clean_json.endswith("```"): clean_json = clean_json[:-3]
+        
+        parsed = json.loads(clean_json.strip())
+        get_response_cache().set("merchant", ck, clean_json.strip(), CACHE_TTLS["merchant"])
+        return parsed
+
+    with span("merchant.ai"):
+        res_data, last_error = run_with_rotation(get_key_scheduler(keys), audit_with_key)
+    if res_data is None:
+        return {"error": f"AI Audit Failed on all keys. Last Error: {last_error}", "merchant_name": inferred_name}
+    if "error" in res_data:
+        return {**res_data, "merchant_name": inferred_name}
+
+    res_data["domain_age"] = domain_years
+    
+    if not res_data.get("merchant_name"): 
+        res_data["merchant_name"] = inferred_name
+        
+    # --- STRICT RULE: MATH-BASED APPROVAL ---
+    pref_list = res_data.get("preferred_categories_found", [])
+    red_list = res_data.get("red_flag_categories_found", [])
+    
+    if not isinstance(pref_list, list): pref_list = []
+    if not isinstance(red_list, list): red_list = []
+    
+    pref_count = len(pref_list)
+    red_count = len(red_list)
+    ai_reason = res_data.get("status_reason", "")
+    
+    if pref_count > red_count:
+        res_data["status"] = "Approved"
+        res_data["status_reason"] = f"Rule Auto-Approval: Found {pref_count} preferred vs {red_count} red-flag verticals. (AI notes: {ai_reason})"
+    elif red_count > pref_count:
+        res_data["status"] = "Rejected"
+        res_data["status_reason"] = f"Rule Auto-Rejection: Found {red_count} red-flag vs {pref_count} preferred verticals. (AI notes: {ai_reason})"
+    else:
+        res_data["status_reason"] = f"Tie-Breaker (AI Decision): Equal categories found ({pref_count}). Reason: {ai_reason}"
+
+    return res_data
+
+# --- SCRAPER (ROBUST + HIGH RES IMAGES) ---
+MAX_HTML_BYTES = 4 * 1024 * 1024
+MAX_PAGE_TEXT_CHARS = 400000
+MAX_IMAGES = 15
+MAX_IMAGE_CANDIDATES = 30  # collected, then probed and ranked down to MAX_IMAGES
+
+@timed("scrape.total")
+def extract_data_from_url(url):
+    user_agents = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0'
+    ]
+    
+    headers = {
+        'User-Agent': random.choice(user_agents),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Referer': 'https://www.google.com/'
+    }
+
+    try:
+        # Pooled sessions: keep-alive, TLS reuse and cloudscraper clearance survive between calls
+        fetcher = get_fetcher()
+        with span("scrape.connect"):
+            try:
+                response = fetcher.get(url, headers=headers, timeout=30, client="cloudscraper", tls_profile=TLS_LEGACY, stream=True)
+            except Exception:
+                response = fetcher.get(url, headers=headers, timeout=30, client="requests", tls_profile=TLS_DEFAULT, verify=False, stream=True)
+
+        try:
+            if response.status_code == 403:
+                return None, "⛔ **Access Denied (403):** This website has a strong firewall. Please copy the text manually and use the **'✍🏻 Text Summary'** tab."
+                
+            if response.status_code != 200: 
+                return None, f"ERROR: Status Code {response.status_code}"
+
+            # Stream the body under a hard byte cap and parse as it arrives; once the text
+            # budget and the image list are both full we stop reading the rest of the page
+            extractor = PageExtractor(url, text_budget=MAX_PAGE_TEXT_CHARS, max_images=MAX_IMAGE_CANDIDATES)
+            started = time.perf_counter()
+            encoding = None
+            for chunk in read_capped(response, MAX_HTML_BYTES):
+                if encoding is None:
+                    encoding = sniff_encoding(response.headers.get('Content-Type', ''), chunk)
+                if extractor.feed(chunk, encoding) and len(extractor.images) >= MAX_IMAGE_CANDIDATES:
+                    break
+        finally:
+            response.close()
+
+        page = extractor.close()
+        observe("scrape.download_parse", time.perf_counter() - started)
+
+        # schema.org JSON-LD / OpenGraph / microdata: exact name, price, duration and hero images
+        with span("scrape.structured"):
+            structured = extract_structured(page)
+        images = list(page["images"])
+        for img in reversed(structured.get("images", [])):
+            if img in images: images.remove(img)
+            images.insert(0, img)
+
+        # Header probes: keep only photos that fill 1280x800, largest first (duplicates are
+        # dropped by the Photo tab from its previews, so nothing full-size is downloaded here)
+        with span("scrape.image_probe", candidates=len(images)):
+            images, image_report = rank_image_candidates(images, limit=MAX_IMAGES)
+        return {"text": page["text"], "images": images, "image_report": image_report, "structured": structured}, None
+
+    except Exception as e: 
+        return None, f"CONNECTION ERROR: {str(e)}\n\n💡 Tip: This site might be blocking bots. Try pasting the text manually in the 'Text Summary' tab."
+
+# --- ROBUST PDF READER ---
+# Long documents are chunked by the summary planner, so this is only a memory guard
+MAX_DOCUMENT_CHARS = 1000000
+
+# Returns (text, report); on failure text is the error message and report is None
+@timed("pdf.extract")
+def extract_text_from_pdf(uploaded_file, page_ranges=""):
+    if not HAS_PYPDF and not HAS_PDFPLUMBER:
+        return "⚠️ Error reading PDF. Please install 'pypdf' or 'pdfplumber'.", None
+    try:
+        report = extract_pdf(uploaded_file, MAX_DOCUMENT_CHARS, page_ranges)
+    except ValueError:
+        return "⚠️ Error reading PDF: page range should look like '1-5, 8, 12-'.", None
+    except Exception as e:
+        return f"⚠️ Error reading PDF.\nDetails: {str(e)}", None
+
+    if len(report["text"]) <= 10:
+        return "⚠️ Error reading PDF: no text found (scanned images?).", None
+    return report["text"], report
+
+# --- SMART MODEL FINDER (LATENCY / ERROR AWARE, SEE model_router) ---
+# Each key's model list is fetched once (warm_up_keys does all keys at
+# startup, concurrently); after that every call picks the fastest healthy
+# model for its feature and reports back how the call went.
+WARMUP_WORKERS = 8
+
+def get_model_router():
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter()
+        return _shared_router
+
+def get_working_model_name(api_key, feature="summary"):
+    router = get_model_router()
+    if router.models_for(api_key) is None:
+        router.set_models(api_key, _list_model_names(api_key))
+    return router.choose(api_key, feature)
+
+@timed("gemini.model_lookup")
+def _list_model_names(api_key):
+    try:
+        models = get_client_pool().list_models(api_key)
+        return [m.name for m in models if 'generateContent' in m.supported_generation_methods]
+    except Exception:
+        return []
+
+# Lists the models of every key in parallel; returns {key: [model names]}
+@timed("gemini.warmup")
+def warm_up_keys(keys, workers=WARMUP_WORKERS):
+    router = get_model_router()
+    cold = [k for k in dict.fromkeys(keys) if router.models_for(k) is None]
+    if cold:
+        with ThreadPoolExecutor(max_workers=min(workers, len(cold))) as pool:
+            for key, names in zip(cold, pool.map(_list_model_names, cold)):
+                router.set_models(key, names)
+    return {k: router.models_for(k) for k in keys}
+
+# A 429 / quota error says the key is busy, not that the model is slow or
+# broken; the key scheduler cools the key down, the router does not count it.
+@contextmanager
+def routed(api_key, model_name, feature):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if not is_rate_limit_error(e):
+            get_model_router().record(api_key, model_name, feature, time.perf_counter() - started, False)
+        raise
+    get_model_router().record(api_key, model_name, feature, time.perf_counter() - started, True)
+
+def sanitize_text(text):
+    if not text: return ""
+    text = text.encode('utf-8', 'ignore').decode('utf-8')
+    return text.replace("\\", "\\\\")[:95000]
+
+# --- KLOOK SELLING POINTS LIST ---
+SELLING_POINTS_LIST = """
+Interactive, Romantic, Customizable, Guided, Private, Skip-the-line, Small Group, VIP, All Inclusive, 
+Architecture, Canal, Cultural, Historical, Movie, Museum, Music, Religious Site, Pilgrimage, Spiritual, Temple, UNESCO site, Local Village, Old Town, 
+TV, Movie and TV, Heritage, Downtown, City Highlights, Downtown Highlights, 
+Alpine Route, Coral Reef, Desert, Glacier, Mangrove, Marine Life, Mountain, Rainforest, Safari, Sand Dune, Volcano, Waterfall, River, 
+Cherry Blossom, Fireflies, Maple Leaf, Northern Lights, Stargazing, National Park, Nature, Wildlife, Sunrise, Sunset, 
+Dolphin Watching, Whale Watching, Canyon, Flower Viewing, Tulip, Lavender, Spring, Summer, Autumn, Winter, Coastal, Beachfront, 
+Bar Hopping, Dining, Wine Tasting, Cheese, Chocolate, Food, Gourmet, Street Food, Brewery, Distillery, Whiskey, Seafood, Local Food, Late Night Food, 
+ATV, Bouldering, Diving, Fishing, Fruit Picking, Hiking, Island Hopping, Kayaking, Night Fishing, Ski, Snorkeling, Trekking, Caving, 
+Sports, Stadium, Horse Riding, Parasailing, 
+Transfers, Transfers With Tickets, Boat, Catamaran, Charter, Cruise, Ferry, Helicopter, Hop-On Hop-Off Bus, Limousine, Open-top Bus, Speedboat, Yacht, Walking, Bus, Bike, Electric Bike, River Cruise, Longtail Boat, Hot Air Balloon, 
+Hot Spring, Beach, Yoga, Meditation, 
+City, Countryside, Night, Shopping, Sightseeing, Photography, Self-guided, Shore Excursion, Adventure, Discovery, Backstreets, Hidden Gems
+"""
+SELLING_POINTS = parse_selling_points(SELLING_POINTS_LIST)
+
+# --- SUMMARY JSON CONTRACT ---
+# Field templates, response schema and validation live in summary_schema
+def build_summary_structure(known=None):
+    known = known or {}
+    sections = []
+    for section, fields in SUMMARY_FIELD_TEMPLATES.items():
+        skip = known.get(section, {})
+        kept = [f'            "{name}": {example}' for name, example in fields if name not in skip]
+        if kept:
+            sections.append(f'        "{section}": {{\n' + ",\n".join(kept) + "\n        }")
+    return "    {\n" + ",\n".join(sections) + "\n    }"
+
+# --- GEMINI CALLS (UPDATED PROMPT) ---
+# part: (index, total) when the text is one chunk of a longer document
+def build_summary_prompt(target_lang="English", prefilled=None, part=None):
+    known_pricing = (prefilled or {}).get("pricing", {})
+    if "adult_price" in known_pricing and "currency" in known_pricing:
+        pricing_rules = """**PRICING EXTRACTION:**
+    - Look for Child and Infant prices. Extract as numbers.
+    - Extract child age range if specified (e.g., "0-15", "4-12"). If not found, return "N/A"."""
+    else:
+        pricing_rules = """**PRICING EXTRACTION:**
+    - Look for Adult, Child, and Infant prices. Extract as numbers.
+    - Extract child age range if specified (e.g., "0-15", "4-12"). If not found, return "N/A".
+    - Detect Currency Code."""
+
+    # Known fields buy exact values, not tokens: the page text still goes in full (the
+    # rest of the summary is read from it), and the known-values block costs about what
+    # the dropped structure lines save (~+/-30 tokens on a ~1,400-token prompt)
+    known_block = ""
+    if prefilled:
+        known_block = f"""**ALREADY KNOWN (from the page's structured data):** {json.dumps(prefilled)}
+    These fields are filled in afterwards; do NOT return them, but keep the rest consistent with them.
+    """
+
+    part_block = ""
+    if part:
+        part_block = f"""**PARTIAL DOCUMENT:** The input is part {part[0] + 1} of {part[1]} of one long document; the parts are merged afterwards.
+    Only extract what THIS part states. For anything not in this part, return "To be confirmed", 0.0 or an empty list. Never guess from context.
+    """
+    
+    return f"""
+    You are a content specialist for Klook.
+    **TASK:** Convert tour text into strict JSON.
+    **OUTPUT LANGUAGE:** {target_lang}
+    
+    **CRITICAL RULE - ROMAN CHARACTERS ONLY:**
+    If translating to English, you MUST use strict ASCII/Roman characters (A-Z).
+    - Remove accents: 'ñ' -> 'n', 'é' -> 'e'.
+    
+    **CRITICAL ACCURACY RULES:**
+    1. **NO HALLUCINATION:** If pickup info or duration is not in the text, return "To be confirmed".
+    2. **STRICT LENGTH:** 'what_to_expect' MUST be between **100-120 words** AND strictly **UNDER 800 characters**. Count both.
+    3. **NO FULL STOP:** The 'what_to_expect' paragraph MUST NOT end with a full stop (period).
+    4. **POINT OF VIEW (CRITICAL):** NEVER use first-person pronouns ("we", "us", "our") when referring to the tour provider. Always replace them with "The operator" (e.g., change "We offer pick-ups" to "The operator offers pick-ups").
+    
+    **HIGHLIGHTS RULES (STRICT):**
+    - **LENGTH:** Each bullet point must be **STRICTLY 10-12 words long**.
+    - **QUANTITY:** Generate exactly 4 bullet points.
+    - **NO FULL STOP:** Do NOT end highlights with a full stop/period.
+    - Must be specific to the activity.
+    
+    **SELLING POINTS:**
+    - Select EXACTLY 3-5 tags from the list below. Do NOT invent new ones.
+    - List: {SELLING_POINTS_LIST}
+    
+**SETTINGS DATA (CRITICAL - READ CAREFULLY):**
+    - 'group_type': If the tour is private, return 'Private'. If it is a shared/public tour, look at 'max_pax'. If max_pax is 20 or below, return 'Join-in (small group)'. If max_pax is 21 or above, return 'Join-in (big group)'.
+    - 'min_pax': Look for explicit minimum booking requirements. If not explicitly stated, default to "1".
+    - 'max_pax': Look for explicit maximum capacity limits. If not explicitly stated, return "20".
+    
+    **ITINERARY & TIMING:**
+    - **Start Time:** If a range is given (e.g., "Pickup 7:00am - 8:00am"), extract the **START** time (e.g., "07:00"). Do NOT average them.
+    - **Format:** Use HH:MM format (24-hour clock).
+    
+    {pricing_rules}
+    {known_block}
+    {part_block}
+    **REQUIRED JSON STRUCTURE:**
+{build_summary_structure(prefilled)}
+    **INPUT TEXT:**
+    """
+
+# on_section(name, value) is called as each top-level section finishes
+# streaming in, so the UI can show it before the whole response is done
+def call_gemini_json_summary(text, api_key, target_lang="English", prefilled=None, part=None, on_section=None):
+    model_name = get_working_model_name(api_key)
+    if not model_name: return "Error: No available Gemini models found."
+
+    cache_payload = text + ("\n" + json.dumps(prefilled, sort_keys=True) if prefilled else "")
+    if part: cache_payload += f"\npart {part[0]}/{part[1]}"
+    ck = cache_key("summary", model_name, target_lang, cache_payload)
+    cached = get_response_cache().get("summary", ck)
+    if cached:
+        if on_section:
+            for name, value in SectionStreamParser().feed(cached): on_section(name, value)
+        return cached
+
+    # The schema keeps the answer to the basic_info / klook_itinerary / pricing contract
+    model = gemini_model(api_key, model_name, {"response_mime_type": "application/json",
+                                               "response_schema": summary_response_schema(prefilled)})
+    intro_prompt = build_summary_prompt(target_lang, prefilled, part)
+
+    try:
+        with span("gemini.summary", streamed=bool(on_section), part=part), routed(api_key, model_name, "summary"):
+            if on_section:
+                parser = SectionStreamParser()
+                for chunk in model.generate_content(intro_prompt + sanitize_text(text), stream=True):
+                    for name, value in parser.feed(chunk.text): on_section(name, value)
+                response_text = parser.text
+            else:
+                response_text = model.generate_content(intro_prompt + sanitize_text(text)).text
+        # Only a complete, valid answer is replayed; one with gaps would replay the gaps
+        # (and their repair calls) on every hit, so it is left to be generated again
+        parsed = parse_summary_tolerant(response_text)
+        if parsed and not invalid_fields(parsed, prefilled):
+            get_response_cache().set("summary", ck, response_text, CACHE_TTLS["summary"])
+        return response_text
+    except Exception as e:
+        if is_rate_limit_error(e): return f"429_LIMIT: {str(e)}"
+        return f"AI Error: {str(e)}"
+
+# --- FIELD-LEVEL REPAIR ---
+# When the summary comes back cut off or with fields missing / of the wrong
+# type, only those fields are asked for again: a short prompt, a schema with
+# just those fields, and the fields already extracted for consistency. The
+# source text is still sent (the answers come from it), but the reply is a
+# few fields instead of the whole summary.
+def build_repair_prompt(fields, target_lang="English", partial=None):
+    wanted = {}
+    for section, name in fields:
+        example = dict(SUMMARY_FIELD_TEMPLATES[section])[name]
+        wanted.setdefault(section, []).append(f'"{name}": {example}')
+    structure = "\n".join(f'    "{section}": {{ {", ".join(items)} }}' for section, items in wanted.items())
+    rules = []
+    if ("basic_info", "what_to_expect") in fields:
+        rules.append("- 'what_to_expect': 100-120 words, under 800 characters, no final full stop, never \"we\"/\"our\" (say \"The operator\").")
+    if ("basic_info", "highlights") in fields:
+        rules.append("- 'highlights': exactly 4 bullet points of 10-12 words each, no full stops.")
+    if ("basic_info", "selling_points") in fields:
+        rules.append(f"- 'selling_points': 3-5 tags, only from this list: {' '.join(SELLING_POINTS_LIST.split())}")
+    rules.append("- Anything the text does not state: \"To be confirmed\", 0.0 or an empty list.")
+    known = f"\n**ALREADY EXTRACTED (keep consistent, do not repeat):** {json.dumps(partial, ensure_ascii=False)}\n" if partial else ""
+    rules_text = "\n    ".join(rules)
+    return f"""
+    You are a content specialist for Klook. A previous answer missed some fields of a tour summary.
+    **TASK:** Return strict JSON with ONLY these fields, in {target_lang}, Roman characters only:
+{structure}
+    {rules_text}
+    {known}
+    **INPUT TEXT:**
+    """
+
+def call_gemini_field_repair(text, api_key, fields, target_lang="English", partial=None):
+    model_name = get_working_model_name(api_key, "repair")
+    # The prompt shows the valid part of the summary, so a different partial is a different request
+    ck = cache_key("repair", model_name, target_lang,
+                   text + "\n" + json.dumps(sorted(fields)) + "\n" + json.dumps(partial, sort_keys=True))
+    cached = get_response_cache().get("repair", ck)
+    if cached: return json.loads(cached)
+
+    model = gemini_model(api_key, model_name, {"response_mime_type": "application/json",
+                                               "response_schema": summary_response_schema(fields=set(fields))})
+    with span("gemini.repair", fields=len(fields)), routed(api_key, model_name, "repair"):
+        response = model.generate_content(build_repair_prompt(fields, target_lang, partial) + sanitize_text(text))
+    repaired = parse_summary_tolerant(response.text)
+    if not repaired:
+        raise RuntimeError("AI Error: repair answer was not JSON")
+    if not [f for f in invalid_fields(repaired) if f in fields]:
+        get_response_cache().set("repair", ck, json.dumps(repaired), CACHE_TTLS["repair"])
+    return repaired
+
+# Fills what invalid_fields reports, in place; returns the fields still invalid
+@timed("summary.repair")
+def repair_summary_fields(d, text, keys, lang="English", prefilled=None):
+    bad = invalid_fields(d, prefilled)
+    if not bad: return []
+    incr("summary.repair_fields", len(bad))
+    partial = {s: {k: v for k, v in block.items() if (s, k) not in bad} for s, block in d.items() if isinstance(block, dict)}
+    repaired, _ = run_with_rotation(get_key_scheduler(keys), lambda key: call_gemini_field_repair(text, key, bad, lang, partial))
+    if repaired:
+        merge_fields(d, repaired, bad)
+    return invalid_fields(d, prefilled)
+
+# --- CONTENT RULES (LOCAL CHECK, TARGETED REWRITES WITHIN A RETRY BUDGET) ---
+# Word / character counts, the highlight count and the selling-point list are
+# checked right after generation. Fields that break a rule are rewritten from
+# a compact context (the summary's own facts plus the opening of the source
+# text, not all of it), each with the reason it failed; a rewrite is only kept if it passes, and the
+# loop stops after SUMMARY_RULE_RETRIES rounds.
+RULE_SOURCE_CHARS = 3000
+RULE_CONTEXT_FIELDS = {
+    "basic_info": ["city_country", "main_attractions", "duration", "group_type"],
+    "inclusions": ["included"],
+}
+
+def rule_context(d):
+    context = {}
+    for section, names in RULE_CONTEXT_FIELDS.items():
+        block = d.get(section)
+        if isinstance(block, dict):
+            context[section] = {n: block[n] for n in names if n in block}
+    segments = (d.get("klook_itinerary") or {}).get("segments")
+    if isinstance(segments, list):
+        context["stops"] = [f"{s.get('name', '')}: {s.get('details', '')}" for s in segments if isinstance(s, dict)][:12]
+    return context
+
+# rejected: {(section, field): (value, reason)} from the previous round's rewrite that
+# still broke a rule, so a retry tells the model what went wrong instead of repeating itself
+def build_rule_fix_prompt(violations, d, target_lang="English", source=None, rejected=None):
+    info = d.get("basic_info", {})
+    lines = []
+    for field, reason in violations.items():
+        name = field[1]
+        lines.append(f'    - "{name}" is currently {json.dumps(info.get(name), ensure_ascii=False)}\n      Problem: {reason}')
+        if rejected and field in rejected:
+            value, why = rejected[field]
+            lines.append(f'      Your last rewrite {json.dumps(value, ensure_ascii=False)} was rejected: {why}')
+    rules = []
+    if ("basic_info", "what_to_expect") in violations:
+        rules.append('- "what_to_expect": ONE paragraph, 100-120 words AND under 800 characters, no final full stop, never "we"/"us"/"our" (say "The operator").')
+    if ("basic_info", "highlights") in violations:
+        rules.append('- "highlights": exactly 4 bullet points, each 10-12 words, no full stops, specific to the activity.')
+    if ("basic_info", "selling_points") in violations:
+        rules.append(f'- "selling_points": 3-5 tags copied exactly from this list: {", ".join(SELLING_POINTS)}')
+    rules_text = "\n    ".join(rules)
+    problems = "\n".join(lines)
+    return f"""
+    You are a content specialist for Klook. Rewrite ONLY the fields below so they follow the rules. Keep the facts; do not invent new ones.
+    **OUTPUT LANGUAGE:** {target_lang} (Roman characters only if English)
+    **FIELDS TO FIX:**
+{problems}
+    **RULES:**
+    {rules_text}
+    **TOUR FACTS:** {json.dumps(rule_context(d), ensure_ascii=False)}
+    **SOURCE EXCERPT:** {sanitize_text(source)[:RULE_SOURCE_CHARS]}
+    Return strict JSON: {{"basic_info": {{ ...only the fixed fields... }}}}
+    """
+
+# Only rewrites that pass every rule are cached, so a retry never replays a rejected one
+def call_gemini_rule_fix(violations, d, api_key, target_lang="English", source=None, rejected=None):
+    model_name = get_working_model_name(api_key, "rules")
+    prompt = build_rule_fix_prompt(violations, d, target_lang, source, rejected)
+    ck = cache_key("rules", model_name, target_lang, prompt)
+    cached = get_response_cache().get("rules", ck)
+    if cached: return json.loads(cached)
+
+    model = gemini_model(api_key, model_name, {"response_mime_type": "application/json",
+                                               "response_schema": summary_response_schema(fields=set(violations))})
+    with span("gemini.rules", fields=len(violations)), routed(api_key, model_name, "rules"):
+        response = model.generate_content(prompt)
+    fixed = parse_summary_tolerant(response.text)
+    if not fixed:
+        raise RuntimeError("AI Error: rule fix answer was not JSON")
+    if not check_rule_fix(d, fixed, violations)[1]:
+        get_response_cache().set("rules", ck, json.dumps(fixed), CACHE_TTLS["rules"])
+    return fixed
+
+# Merges a rewrite into a copy of d; returns (candidate, violations the rewritten fields still have)
+def check_rule_fix(d, fixed, violations):
+    candidate = json.loads(json.dumps(d))
+    merge_fields(candidate, fixed, list(violations))
+    invalid_fields(candidate)
+    apply_local_fixes(candidate, SELLING_POINTS)
+    still = rule_violations(candidate, SELLING_POINTS)
+    return candidate, {f: r for f, r in still.items() if f in violations}
+
+# Fixes d in place; returns {(section, field): reason} for what still breaks a rule
+@timed("summary.rules")
+def enforce_summary_rules(d, keys, lang="English", source=None, retries=None):
+    retries = int(get_setting("SUMMARY_RULE_RETRIES", 2)) if retries is None else retries
+    apply_local_fixes(d, SELLING_POINTS)
+    violations = rule_violations(d, SELLING_POINTS)
+    rejected = {}
+    for _ in range(retries):
+        if not violations or not keys: break
+        incr("summary.rule_fix_fields", len(violations))
+        fixed, _ = run_with_rotation(get_key_scheduler(keys),
+                                     lambda key: call_gemini_rule_fix(violations, d, key, lang, source, rejected))
+        if not fixed: break
+        candidate, still = check_rule_fix(d, fixed, violations)
+        for field in violations:
+            if field in still:
+                rejected[field] = (candidate[field[0]].get(field[1]), still[field])
+            else:
+                d[field[0]][field[1]] = candidate[field[0]][field[1]]
+                rejected.pop(field, None)
+        violations = rule_violations(d, SELLING_POINTS)
+    if violations: incr("summary.rule_violations_left", len(violations))
+    return violations
+
+# --- REGENERATE DESCRIPTION ONLY ---
+def regenerate_description_only(text, api_key, lang="English"):
+    model_name = get_working_model_name(api_key, "rewrite")
+    model = gemini_model(api_key, model_name)
+    
+    prompt = f"""
+    Write a 'What to Expect' summary for this tour.
+    **CRITICAL RULES:**
+    1. STRICTLY 100-120 words AND strictly UNDER 800 characters. Count carefully.
+    2. Do NOT end with a full stop/period.
+    3. Language: {lang}
+    4. Text only. No JSON.
+    5. POINT OF VIEW: NEVER use "we", "us", or "our". Always replace them with "The operator".
+    
+    **INPUT TEXT:**
+    {sanitize_text(text)}
+    """
+    try:
+        with span("gemini.rewrite"), routed(api_key, model_name, "rewrite"):
+            response = model.generate_content(prompt)
+        return response.text.strip()
+    except Exception as e: return f"Error regenerating description: {str(e)}"
+
+# --- GRAMMAR CHECKER FUNCTION (UPDATED FOR ERROR LISTING) ---
+@timed("grammar.total")
+def fix_grammar_american(text, keys):
+    if not keys: return {"error": "AI Error: No API keys found."}
+    
+    prompt = f"""
+    Act as a professional editor.
+    Task: Correct the grammar, spelling, and punctuation of the following text.
+    Standard: American English.
+    Constraint: Keep the original tone and meaning.
+    
+    Return strict JSON in this format:
+    {{
+        "corrected_text": "The full corrected text here.",
+        "errors_found": [
+            {{"original": "wrong word or phrase", "correction": "right word", "reason": "Why it was changed"}}
+        ]
+    }}
+    
+    Input Text:
+    {text}
+    """
+    
+    def fix_with_key(key):
+        model_name = get_working_model_name(key, "grammar")
+        ck = cache_key("grammar", model_name, "American English", text)
+        cached = get_response_cache().get("grammar", ck)
+        if cached: return json.loads(cached)
+
+        # Force JSON output so we can separate the text and the error list
+        model = gemini_model(key, model_name, {"response_mime_type": "application/json"})
+        
+        with span("gemini.grammar"), routed(key, model_name, "grammar"):
+            response = model.generate_content(prompt)
+        
+        clean_json = response.text.strip()
+        if clean_json.startswith("```json"): clean_json = clean_json[7:]
+        if clean_json.endswith("```"): clean_json = clean_json[:-3]
+        
+        parsed = json.loads(clean_json.strip())
+        get_response_cache().set("grammar", ck, clean_json.strip(), CACHE_TTLS["grammar"])
+        return parsed
+
+    res_data, last_error = run_with_rotation(get_key_scheduler(keys), fix_with_key)
+    if res_data is not None:
+        # Remove trailing period if present (matching your previous logic)
+        if res_data.get("corrected_text", "").endswith("."):
+            res_data["corrected_text"] = res_data["corrected_text"][:-1]
+        return res_data
+            
+    return {"error": f"AI Error: All keys exhausted. Last error: {last_error}"}
+
+# --- EMAIL DRAFTER ---
+def call_gemini_email_draft(json_data, api_key):
+    model_name = get_working_model_name(api_key, "email")
+    model = gemini_model(api_key, model_name)
+    prompt = f"Draft a concise GAP ANALYSIS email. Request MISSING info only. Data: {json.dumps(json_data)}"
+    try:
+        with span("gemini.email"), routed(api_key, model_name, "email"):
+            response = model.generate_content(prompt)
+        return response.text
+    except Exception as e: return f"Error generating email: {str(e)}"
+
+# --- CAPTION GENERATOR ---
+def call_gemini_caption(image_bytes, api_key, context_str=""):
+    # Reverting back to the smart finder since you are on the Paid Tier!
+    model_name = get_working_model_name(api_key, "caption")
+    prompt = f"Social media caption (10-12 words, experiential verb start, NO full stop, no emojis). Context: '{context_str}'"
+
+    # Keyed by image hash + context, so re-processing the same photo is free
+    ck = cache_key("caption", model_name, normalize_text(context_str), image_bytes)
+    cached = get_response_cache().get("caption", ck)
+    if cached: return cached
+
+    model = gemini_model(api_key, model_name)
+    
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        with span("gemini.caption"), routed(api_key, model_name, "caption"):
+            response = model.generate_content([prompt, img])
+        get_response_cache().set("caption", ck, response.text, CACHE_TTLS["caption"])
+        return response.text
+        
+    except Exception as e: 
+        # 4. Stop failing silently! Print the exact error so we can debug if it happens again.
+        return f"Caption Failed: {str(e)}"
+
+# --- SMART ROTATION (FIXED ERROR EXPOSURE) ---
+@timed("summary.rotation")
+def smart_rotation_wrapper(text, keys, lang="English", prefilled=None, part=None, on_section=None):
+    if not keys: return "⚠️ No API keys found."
+    
+    def summarize_with_key(key):
+        result = call_gemini_json_summary(text, key, lang, prefilled, part, on_section)
+        
+        # Only the sentinel prefixes count: a summary can itself contain "429" or "Error"
+        # Quota errors cool this key down (honoring the retry hint) and rotate on
+        if result.startswith("429_LIMIT"):
+            raise RateLimited(result, retry_hint_seconds(result))
+        
+        # Any other AI error (like 404) counts towards the key's circuit breaker
+        if result.startswith(("AI Error", "Error:")):
+            raise RuntimeError(result)
+        return result
+
+    result, last_error = run_with_rotation(get_key_scheduler(keys), summarize_with_key)
+    
+    # If all keys fail, it will now tell you EXACTLY why!
+    if result is None:
+        return f"⚠️ AI Failed. Last Error: {last_error}"
+        
+    # SUCCESS! Process the JSON
+    try:
+        # Malformed or cut-off JSON keeps every section that can still be read
+        d = parse_summary_tolerant(result)
+        if d is None: return result
+        
+        # Fields read from the page's structured data win over the model's guesses
+        if prefilled: merge_prefilled(d, prefilled)
+
+        # Re-request only the missing / invalid fields, then rewrite the ones that break
+        # a content rule (chunks of a long document are checked after the merge instead)
+        if part:
+            apply_local_fixes(d, SELLING_POINTS)
+        else:
+            repair_summary_fields(d, text, keys, lang, prefilled)
+            enforce_summary_rules(d, keys, lang, text)
+        
+        return json.dumps(d)
+    except: 
+        pass
+    
+    return result
+
+# --- TOKEN-BUDGETED SUMMARY (MAP-REDUCE FOR LONG DOCUMENTS) ---
+# Inputs that fit one request go straight through smart_rotation_wrapper.
+# Longer ones are split at section boundaries, every chunk is extracted
+# concurrently through the key scheduler, and the partial JSON is merged
+# back into the summary schema. Returns (result, plan) where plan carries
+# the token counts for the status line.
+def plan_summary(text, lang="English", prefilled=None):
+    prompt_tokens = estimate_tokens(build_summary_prompt(lang, prefilled))
+    return plan_document(text or "", int(get_setting("SUMMARY_CHUNK_TOKENS", 20000)), prompt_tokens)
+
+def describe_plan(plan):
+    line = f"🧮 ~{plan['input_tokens']:,} input tokens + ~{plan['prompt_tokens']:,} prompt tokens"
+    if plan["mode"] == "single":
+        return line + " → 1 request"
+    sizes = " / ".join(f"{t:,}" for t in plan["chunk_tokens"])
+    return line + f" → {len(plan['chunks'])} parallel requests ({sizes}), ~{plan['total_request_tokens']:,} tokens sent"
+
+@timed("summary.document")
+def summarize_document(text, keys, lang="English", prefilled=None, plan=None, on_section=None):
+    plan = plan or plan_summary(text, lang, prefilled)
+    if plan["mode"] == "single":
+        return smart_rotation_wrapper(text, keys, lang, prefilled, on_section=on_section), plan
+
+    chunks = plan["chunks"]
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), int(get_setting("SUMMARY_MAP_WORKERS", 4))))) as pool:
+        results = list(pool.map(
+            lambda i: smart_rotation_wrapper(chunks[i], keys, lang, prefilled, (i, len(chunks))),
+            range(len(chunks)),
+        ))
+
+    partials, errors = [], []
+    for r in results:
+        try: partials.append(json.loads(r))
+        except (ValueError, TypeError): errors.append(r)
+    plan["failed_chunks"] = len(errors)
+    if not partials:
+        return errors[0], plan
+
+    merged = merge_partials(partials)
+    if prefilled: merge_prefilled(merged, prefilled)
+    enforce_summary_rules(merged, keys, lang, text)
+    return json.dumps(merged), plan
+
+# --- BATCH LINK WORKER (RUNS IN POOL THREADS, NO ST CALLS) ---
+# What summarize_document returns instead of JSON when it fails; only the
+# prefix counts, since a good summary may well mention "busy" or "error"
+SUMMARY_FAILURE_PREFIXES = ("⚠️", "429_LIMIT", "AI Error", "Error:")
+
+def summary_failed(result):
+    return not result or result.startswith(SUMMARY_FAILURE_PREFIXES)
+
+# scrape: the app passes its st.cache_data-wrapped extract_data_from_url
+def summarize_link_job(url, keys, lang, set_stage, scrape=None):
+    set_stage("Scraping")
+    data_dict, err = (scrape or extract_data_from_url)(url)
+    if err or not data_dict:
+        raise RuntimeError(err or "Scrape returned no data")
+
+    set_stage("Summarizing")
+    result, plan = summarize_document(data_dict['text'], keys, lang, prefill_summary(data_dict.get('structured'), lang))
+    if summary_failed(result):
+        raise RuntimeError(result)
+
+    product = ""
+    try:
+        product = json.loads(result).get("basic_info", {}).get("main_attractions", "")
+    except: pass
+    return {"result": result, "images": data_dict['images'], "image_report": data_dict.get('image_report', []),
+            "text": data_dict['text'], "product": product,
+            "tokens": plan["total_request_tokens"], "requests": len(plan["chunks"])}